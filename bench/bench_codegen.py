@@ -0,0 +1,122 @@
+import os, sys
+import json
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from timeit import default_timer as timer
+
+from starkware.starknet.testing.starknet import Starknet
+from starkware.starknet.services.api.contract_definition import ContractDefinition
+
+from notebook import ROOT, load_builder
+
+## crossover benchmark of RK4CairoBuilder's two code generation modes
+##
+## usage (from the repo root, with cairo-lang installed):
+##   python bench/bench_codegen.py                   # chains of 1..25 bodies (2..50 state variables)
+##   python bench/bench_codegen.py --bodies 2 5 25
+##
+## for a chain of coupled oscillators with 2*bodies state variables, both the unrolled (Dynamics)
+## and the array (felt array + recursive helpers) contract are generated, compiled and run on the
+## local Starknet testing backend; records go to bench_codegen_output.txt as json lines, together
+## with the steps and bytecode trade-off behind RK4CairoBuilder.ARRAY_MODE_MIN_MEMBERS
+
+OUTPUT_PATH = os.path.join(ROOT, 'bench_codegen_output.txt')
+
+SCALE_FP = 10000
+N_STEPS = 5
+DT_FP = 100
+
+
+def chain_spec(bodies):
+    # masses in a row, tied to each other and to two walls by identical springs
+    state = []
+    derivatives = {}
+    for i in range(bodies):
+        state += [f'x{i}', f'x{i}d']
+    for i in range(bodies):
+        left = f'x{i-1}' if i > 0 else '0'
+        right = f'x{i+1}' if i < bodies-1 else '0'
+        derivatives[f'x{i}'] = f'x{i}d'
+        derivatives[f'x{i}d'] = f'( K*({left} - x{i}) + K*({right} - x{i}) ) / M'
+    return {'name' : f'chain{bodies}', 'state' : state, 'parameters' : {'K' : 10, 'M' : 3}, 'derivatives' : derivatives}
+
+
+async def bench_mode(starknet, builder, workdir, bodies, mode):
+    spec = chain_spec(bodies)
+    cairo_path = os.path.join(workdir, f"{spec['name']}_{mode}.cairo")
+    compiled_path = os.path.join(workdir, f"{spec['name']}_{mode}_compiled.json")
+    builder.from_spec(spec, mode=mode).write_contract(cairo_path, compile=False)
+
+    time_start = timer()
+    subprocess.run(['starknet-compile', cairo_path, '--output', compiled_path], check=True)
+    compile_s = timer() - time_start
+
+    with open(compiled_path) as f:
+        contract_def = ContractDefinition.loads(f.read())
+    contract = await starknet.deploy(contract_def=contract_def)
+
+    state = [(i % 7) * SCALE_FP for i in range(2*bodies)]
+    usage = []
+    for n in (1, N_STEPS):
+        ret = await contract.query_n_steps(0, DT_FP, *state, n).call()
+        usage.append(ret.call_info.cairo_usage)
+    steps = (usage[1].n_steps - usage[0].n_steps) / (N_STEPS - 1)
+    range_check = (
+        usage[1].builtin_instance_counter.get('range_check_builtin', 0) -
+        usage[0].builtin_instance_counter.get('range_check_builtin', 0)
+    ) / (N_STEPS - 1)
+
+    return {
+        'bodies' : bodies,
+        'n_state' : 2*bodies,
+        'mode' : mode,
+        'n_steps_per_step' : steps,
+        'range_check_per_step' : range_check,
+        'bytecode_size' : len(contract_def.program.data),
+        'compile_s' : compile_s,
+        'traj' : ret.result.traj
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Unrolled vs array code generation crossover benchmark.')
+    parser.add_argument('--bodies', type=int, nargs='+', default=[1, 2, 5, 10, 25])
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    builder = load_builder()
+    starknet = await Starknet.empty()
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for bodies in args.bodies:
+            pair = [await bench_mode(starknet, builder, workdir, bodies, mode) for mode in ('unrolled', 'array')]
+            assert pair[0]['traj'] == pair[1]['traj'], f'modes disagree for {bodies} bodies'
+            for r in pair:
+                del r['traj']
+                records.append(r)
+                print(f"  n_state={r['n_state']:<4} {r['mode']:9s} steps/step={r['n_steps_per_step']:<9} "
+                      f"range_check/step={r['range_check_per_step']:<7} bytecode={r['bytecode_size']:<7} compile={r['compile_s']:.1f}s")
+
+    with open(args.output, 'w') as f:
+        for r in records:
+            f.write(json.dumps(r) + '\n')
+    print(f'> {len(records)} records written to {args.output}')
+
+    crossover = [
+        r['n_state'] for r in records if r['mode'] == 'array' and r['n_steps_per_step'] < next(
+            u['n_steps_per_step'] for u in records if u['mode'] == 'unrolled' and u['n_state'] == r['n_state'])
+    ]
+    if crossover:
+        print(f'> the array form takes fewer steps from n_state={min(crossover)} on')
+    else:
+        print(f"> the unrolled form takes fewer steps up to n_state={max(r['n_state'] for r in records)}")
+    for u, a in zip(records[0::2], records[1::2]):
+        print(f"  n_state={u['n_state']:<4} array/unrolled: steps x{a['n_steps_per_step']/u['n_steps_per_step']:.2f}, "
+              f"bytecode x{a['bytecode_size']/u['bytecode_size']:.2f}")
+    print(f'> RK4CairoBuilder.ARRAY_MODE_MIN_MEMBERS = {builder.ARRAY_MODE_MIN_MEMBERS}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+import os, sys
+import json
+import asyncio
+import argparse
+import tempfile
+
+import numpy as np
+from starkware.starknet.testing.starknet import Starknet
+from starkware.starknet.services.api.contract_definition import ContractDefinition
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from fp_emulator import FixedPoint, integrate, reference, to_flat_traj
+from felt_codec import from_felts
+from notebook import ROOT, load_builder, load_specs, scale_arg
+
+## step cost versus trajectory error of the fixed-point formats RK4CairoBuilder can generate
+##
+## usage (from the repo root, with cairo-lang installed):
+##   python bench/bench_precision.py                                  # sho, cho, o2d at 10**4, 10**8, 2**32, 2**64
+##   python bench/bench_precision.py --systems o2d --scales 10**4 2**32 --tol 1e-4
+##
+## for every spec of the generator notebook and every SCALE_FP, the contract is generated, compiled and
+## deployed on the local Starknet testing backend, where the marginal Cairo steps per rk4 step are measured
+## (and the trajectory checked bit for bit against the emulator at that scale); the trajectory error is the
+## largest position error over T simulated seconds of the emulated run against the exact solution, for every dt.
+## Records go to bench_precision_output.txt as json lines; the summary gives, per scale, the largest dt within
+## --tol and what it costs per simulated second
+
+OUTPUT_PATH = os.path.join(ROOT, 'bench_precision_output.txt')
+
+N_STEPS = 10 # rk4 steps of the costlier query_n_steps call
+T = 5 # simulated seconds the error is taken over
+DTS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05]
+
+# initial state in real units, as in bench_rk4.py
+STATES = {'sho' : [100, 0], 'cho' : [150, 0, 800, 1000], 'o2d' : [150, 500, 200, 0]}
+
+
+async def cost_per_step(starknet, builder, workdir, name, state_fp, dt_fp):
+    """ Marginal Cairo steps per rk4 step of the contract, and its N_STEPS trajectory """
+    cairo_path = os.path.join(workdir, f'{name}_{builder.scale}.cairo')
+    builder.write_contract(cairo_path)
+    with open(os.path.splitext(cairo_path)[0] + '_compiled.json') as f:
+        contract = await starknet.deploy(contract_def=ContractDefinition.loads(f.read()))
+
+    usage = []
+    for n in (1, N_STEPS):
+        # read-only: .invoke() runs on the live state instead of a deep copy of it
+        ret = await contract.query_n_steps(0, dt_fp, *state_fp, n).invoke()
+        usage.append(ret.call_info.cairo_usage.n_steps)
+    return (usage[1] - usage[0]) / (N_STEPS - 1), from_felts(ret.result.traj).tolist()
+
+
+def position_error(name, fp, dt):
+    """ Largest position error over T seconds of rk4 at dt (rounded to the scale), and the dt actually taken """
+    state = STATES[name]
+    dt_fp = int(round(dt * fp.scale))
+    n = int(round(T / dt))
+    traj = integrate(name, dt_fp, [int(v * fp.scale) for v in state], n, fp=fp)
+    exact = reference(name, dt_fp / fp.scale, state, n)
+    positions = slice(0, len(state), 2)
+    return float(np.abs(traj[:, positions, 0].astype(float) / fp.scale - exact[:, positions, 0]).max()), dt_fp / fp.scale
+
+
+async def bench_scale(starknet, builder_cls, spec, scale, workdir, dts):
+    # rk4 alone is measured: the symplectic integrators and the storage do not change its code
+    builder = builder_cls.from_spec(dict(spec, scale=scale, symplectic=(), stateful=False))
+    fp = FixedPoint(scale, builder.range_check_bound)
+    name = spec['name']
+    state_fp = [int(v * scale) for v in STATES[name]]
+    dt_fp = int(round(0.01 * scale))
+    steps, traj = await cost_per_step(starknet, builder, workdir, name, state_fp, dt_fp)
+    assert traj == to_flat_traj(integrate(name, dt_fp, state_fp, N_STEPS, fp=fp)), f'{name} at {scale} disagrees with the emulator'
+
+    records = []
+    for dt in dts:
+        error, dt_taken = position_error(name, fp, dt)
+        records.append({
+            'system' : name,
+            'scale' : scale,
+            'range_check_bound_log2' : builder.range_check_bound.bit_length() - 1,
+            'dt' : dt_taken,
+            'n_steps_per_step' : steps,
+            'cairo_steps_per_sim_s' : steps / dt_taken,
+            'max_position_error' : error
+        })
+        print(f"  {name:4s} scale={scale:<22} dt={dt_taken:<8.4g} steps/step={steps:<7.0f} "
+              f"steps/sim s={steps / dt_taken:<9.0f} max error={error:.2e}")
+    return records
+
+
+def print_summary(records, tol):
+    print(f'> largest dt with a position error within {tol:g}, per scale:')
+    for name in sorted({r['system'] for r in records}, key=list(STATES).index):
+        best = None
+        for scale in sorted({r['scale'] for r in records if r['system'] == name}):
+            within = [r for r in records if r['system'] == name and r['scale'] == scale and r['max_position_error'] <= tol]
+            if not within:
+                print(f'  {name:4s} scale={scale:<22} none of the dts')
+                continue
+            r = max(within, key=lambda r: r['dt'])
+            print(f"  {name:4s} scale={scale:<22} dt={r['dt']:<8.4g} {r['cairo_steps_per_sim_s']:.0f} steps/sim s")
+            # the steps per rk4 step hardly depend on the scale: on a tie the smaller scale wins
+            if best is None or round(r['cairo_steps_per_sim_s']) < round(best['cairo_steps_per_sim_s']):
+                best = r
+        if best is not None:
+            print(f"  {name:4s} -> cheapest: scale={best['scale']}, dt={best['dt']:g}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Step cost versus trajectory error of the fixed-point scales.')
+    parser.add_argument('--systems', nargs='+', default=list(STATES), choices=list(STATES))
+    parser.add_argument('--scales', type=scale_arg, nargs='+', default=[10**4, 10**8, 2**32, 2**64])
+    parser.add_argument('--dts', type=float, nargs='+', default=DTS)
+    parser.add_argument('--tol', type=float, default=1e-3, help='largest acceptable position error, real units')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    builder_cls, specs = load_builder(), load_specs()
+    starknet = await Starknet.empty()
+    records = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in args.systems:
+            for scale in args.scales:
+                records += await bench_scale(starknet, builder_cls, specs[name], scale, workdir, args.dts)
+
+    with open(args.output, 'w') as f:
+        for r in records:
+            f.write(json.dumps(r) + '\n')
+    print(f'> {len(records)} records written to {args.output}')
+    print_summary(records, args.tol)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
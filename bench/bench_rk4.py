@@ -0,0 +1,210 @@
+import os, sys
+import json
+import asyncio
+import argparse
+from statistics import median
+from timeit import default_timer as timer
+
+import numpy as np
+from starkware.starknet.testing.starknet import Starknet
+from starkware.starknet.services.api.contract_definition import ContractDefinition
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from fp_emulator import ENERGY, integrate
+from felt_codec import to_felts
+
+## execution-resource benchmark of the rk4 entry points on the local Starknet testing backend
+##
+## usage (from the repo root, with cairo-lang installed):
+##   python bench/bench_rk4.py                     # run, write bench_output.txt, compare with the baseline
+##   python bench/bench_rk4.py --update-baseline   # accept the current numbers as the new baseline
+##
+## every record is one json line; per-rk4-step figures of query_n_steps are marginal costs
+## (difference between n=N and n=1 calls), so the fixed cost of the entry point is not counted in;
+## the same goes for the symplectic query_n_steps_<method> entry points, which are then compared with
+## rk4 by Cairo steps per simulated second and by the energy error of a long emulated run;
+## advance (stateful contracts) is measured the same way as an invoke, next to its one-read get_state
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+OUTPUT_PATH = os.path.join(ROOT, 'bench_output.txt')
+
+SCALE_FP = 10000
+
+N_STEPS = 20 # rk4 steps per query_n_steps call
+N_ENSEMBLE = 8 # states per query_next_given_ensemble call
+TOL_FP = 10 # error tolerance of query_n_adaptive calls
+T_ENERGY = 100 # simulated seconds of the emulated runs the energy error is taken over
+REPEAT = 3 # wall time is the median over this many calls
+
+# contract, compiled definition, dt_fp, initial state (fixed-point)
+CONTRACTS = [
+    ('sho', 'simple-harmonic-oscillator/sho_compiled.json', 100, [100*SCALE_FP, 0]),
+    ('cho', 'coupled-harmonic-oscillator/cho_compiled.json', 100, [150*SCALE_FP, 0, 800*SCALE_FP, 1000*SCALE_FP]),
+    ('o2d', 'oscillator-2d/o2d_compiled.json', 200, [150*SCALE_FP, 500*SCALE_FP, 200*SCALE_FP, 0]),
+]
+
+# counters compared against the baseline; wall time is recorded but too noisy to gate on
+GATED = ['n_steps', 'n_memory_holes', 'range_check']
+
+# fixed-point integrators: rk4 behind query_n_steps, the symplectic ones behind query_n_steps_<method>
+METHODS = {'rk4' : 'query_n_steps', 'verlet' : 'query_n_steps_verlet', 'yoshida4' : 'query_n_steps_yoshida4'}
+
+
+def usage_of(ret):
+    usage = ret.call_info.cairo_usage
+    return {
+        'n_steps' : usage.n_steps,
+        'n_memory_holes' : usage.n_memory_holes,
+        'range_check' : usage.builtin_instance_counter.get('range_check_builtin', 0)
+    }
+
+
+async def measure(invoke, kind='call'):
+    wall = []
+    for _ in range(REPEAT):
+        time_start = timer()
+        ret = await getattr(invoke(), kind)()
+        wall.append(timer() - time_start)
+    return usage_of(ret), median(wall)
+
+
+def energy_error(name, method, dt_fp, state):
+    """ Largest relative energy error over T_ENERGY simulated seconds, and its growth from the first to the second half """
+    traj = integrate(name, dt_fp, state, int(T_ENERGY * SCALE_FP / dt_fp), method=method)
+    energy = ENERGY[name](*[traj[:, i, 0].astype(float) / SCALE_FP for i in range(len(state))])
+    rel = np.abs(energy - energy[0]) / energy[0]
+    half = len(rel) // 2
+    return {'energy_rel_err_max' : float(rel.max()), 'energy_rel_err_drift' : float(rel[half:].max() - rel[:half].max())}
+
+
+def print_comparison(records):
+    print(f'> integrators at the benchmark dt, energy error over {T_ENERGY} simulated seconds:')
+    print(f"  {'':4s} {'method':24s} {'steps/step':>10s} {'steps/sim s':>12s} {'vs rk4':>7s} {'max dE/E':>9s} {'drift':>9s}")
+    rk4 = {r['contract'] : r for r in records if r['entry_point'] == METHODS['rk4']}
+    for r in records:
+        if 'cairo_steps_per_sim_s' not in r:
+            continue
+        ratio = r['cairo_steps_per_sim_s'] / rk4[r['contract']]['cairo_steps_per_sim_s']
+        print(f"  {r['contract']:4s} {r['entry_point']:24s} {r['n_steps_per_step']:>10.0f} {r['cairo_steps_per_sim_s']:>12.0f} "
+              f"{ratio:>6.2f}x {r['energy_rel_err_max']:>9.2e} {r['energy_rel_err_drift']:>+9.1e}")
+
+
+async def bench_contract(starknet, name, path, dt_fp, state):
+    with open(os.path.join(ROOT, path)) as f:
+        contract_def = ContractDefinition.loads(f.read())
+    entry_points = {e['name'] for e in contract_def.abi if e['type'] == 'function'}
+    constructor_calldata = [0, dt_fp] + to_felts(state) if 'get_state' in entry_points else None
+    contract = await starknet.deploy(contract_def=contract_def, constructor_calldata=constructor_calldata)
+    records = []
+
+    usage, wall = await measure(lambda: contract.query_next_given_coordinates(0, dt_fp, *state))
+    records.append({'contract' : name, 'entry_point' : 'query_next_given_coordinates', 'n' : 1, **usage, 'wall_s' : wall})
+
+    for method, entry_point in METHODS.items():
+        if entry_point not in entry_points:
+            continue
+        query = getattr(contract, entry_point)
+        usage_1, _ = await measure(lambda: query(0, dt_fp, *state, 1))
+        usage_n, wall = await measure(lambda: query(0, dt_fp, *state, N_STEPS))
+        per_step = {f'{k}_per_step' : (usage_n[k] - usage_1[k]) / (N_STEPS - 1) for k in GATED}
+        records.append({
+            'contract' : name, 'entry_point' : entry_point, 'n' : N_STEPS, **usage_n, **per_step, 'wall_s' : wall,
+            'cairo_steps_per_sim_s' : per_step['n_steps_per_step'] * SCALE_FP / dt_fp,
+            **energy_error(name, method, dt_fp, state)
+        })
+
+    if 'query_next_given_ensemble' in entry_points:
+        states = to_felts(np.repeat(state, N_ENSEMBLE))
+        usage, wall = await measure(lambda: contract.query_next_given_ensemble(0, dt_fp, states))
+        per_state = {f'{k}_per_step' : usage[k] / N_ENSEMBLE for k in GATED}
+        records.append({'contract' : name, 'entry_point' : 'query_next_given_ensemble', 'n' : N_ENSEMBLE, **usage, **per_state, 'wall_s' : wall})
+
+    if 'query_n_adaptive' in entry_points:
+        # marginal cost per call-visible step; rejected attempts (if any) are paid within these
+        usage_1, _ = await measure(lambda: contract.query_n_adaptive(0, dt_fp, *state, TOL_FP, 1))
+        usage_n, wall = await measure(lambda: contract.query_n_adaptive(0, dt_fp, *state, TOL_FP, N_STEPS))
+        per_step = {f'{k}_per_step' : (usage_n[k] - usage_1[k]) / (N_STEPS - 1) for k in GATED}
+        records.append({'contract' : name, 'entry_point' : 'query_n_adaptive', 'n' : N_STEPS, **usage_n, **per_step, 'wall_s' : wall})
+
+    if 'advance' in entry_points:
+        # storage reads and writes are paid once per transaction, so the marginal cost is rk4's
+        usage_1, _ = await measure(lambda: contract.advance(1), kind='invoke')
+        usage_n, wall = await measure(lambda: contract.advance(N_STEPS), kind='invoke')
+        per_step = {f'{k}_per_step' : (usage_n[k] - usage_1[k]) / (N_STEPS - 1) for k in GATED}
+        records.append({'contract' : name, 'entry_point' : 'advance', 'n' : N_STEPS, **usage_n, **per_step, 'wall_s' : wall})
+
+        usage, wall = await measure(lambda: contract.get_state())
+        records.append({'contract' : name, 'entry_point' : 'get_state', 'n' : 1, **usage, 'wall_s' : wall})
+
+    return records
+
+
+def compare(records, baseline, tolerance):
+    """ Lines describing every gated counter that grew by more than `tolerance` (relative) """
+    regressions = []
+    for r in records:
+        key = f"{r['contract']}.{r['entry_point']}"
+        if key not in baseline:
+            print(f'  {key}: no baseline')
+            continue
+        for k, v in r.items():
+            if not any(k.startswith(g) for g in GATED):
+                continue
+            ref = baseline[key].get(k)
+            if ref is None:
+                continue
+            status = 'ok'
+            if v > ref * (1 + tolerance) + 1e-9:
+                status = 'REGRESSION'
+                regressions.append(f'{key} {k}: {ref} -> {v}')
+            elif v < ref:
+                status = 'improved'
+            print(f'  {key:45s} {k:26s} {ref:>12} -> {v:<12} {status}')
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Cairo execution-resource benchmark of the rk4 contracts.')
+    parser.add_argument('--update-baseline', action='store_true', help='write the current numbers to bench/baseline.json')
+    parser.add_argument('--tolerance', type=float, default=0.0, help='allowed relative growth of the gated counters')
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    starknet = await Starknet.empty()
+    records = []
+    for name, path, dt_fp, state in CONTRACTS:
+        records += await bench_contract(starknet, name, path, dt_fp, state)
+        print(f'> {name} done.')
+
+    with open(args.output, 'w') as f:
+        for r in records:
+            f.write(json.dumps(r) + '\n')
+    print(f'> {len(records)} records written to {args.output}')
+    print_comparison(records)
+
+    if args.update_baseline:
+        baseline = {
+            f"{r['contract']}.{r['entry_point']}" : {k : v for k, v in r.items() if any(k.startswith(g) for g in GATED)}
+            for r in records
+        }
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f'> baseline updated: {BASELINE_PATH}')
+        return 0
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    regressions = compare(records, baseline, args.tolerance)
+    if regressions:
+        print('> regressions against the baseline:')
+        for line in regressions:
+            print(f'  {line}')
+        return 1
+    print('> no regression against the baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
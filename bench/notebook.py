@@ -0,0 +1,43 @@
+import os
+import ast
+import json
+
+import sympy
+
+## RK4CairoBuilder and the contract SPECS live in the generator notebook; the benchmarks and tools
+## take them from there rather than from a copy
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+NOTEBOOK_PATH = os.path.join(ROOT, 'script', 'generator-script-for-rk4.ipynb')
+
+
+def _code_cells():
+    with open(NOTEBOOK_PATH) as f:
+        return [''.join(cell['source']) for cell in json.load(f)['cells'] if cell['cell_type'] == 'code']
+
+
+def load_builder():
+    """ RK4CairoBuilder, from a run of the cell that defines it """
+    namespace = {'sympy' : sympy}
+    for source in _code_cells():
+        if 'class RK4CairoBuilder' in source:
+            exec(source, namespace)
+            return namespace['RK4CairoBuilder']
+    raise RuntimeError(f'RK4CairoBuilder not found in {NOTEBOOK_PATH}')
+
+
+def load_specs():
+    """ SPECS, a literal, read out of the cell that writes the contracts (without running it) """
+    for source in _code_cells():
+        if 'SPECS = {' not in source:
+            continue
+        for node in ast.parse(source).body:
+            if isinstance(node, ast.Assign) and getattr(node.targets[0], 'id', None) == 'SPECS':
+                return ast.literal_eval(node.value)
+    raise RuntimeError(f'SPECS not found in {NOTEBOOK_PATH}')
+
+
+def scale_arg(text):
+    """ argparse type of a SCALE_FP: 10000, 10**8 or 2**32 """
+    base, _, exponent = text.partition('**')
+    return int(base) ** int(exponent) if exponent else int(base)
@@ -0,0 +1,134 @@
+import os, sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from fp_emulator import ENERGY, FixedPoint, METHODS, RangeCheckError, integrate, reference
+from notebook import ROOT, load_builder, load_specs, scale_arg
+
+## how large can dt get? accuracy sweep of the fixed-point integrators over dt x SCALE_FP
+##
+## usage (from the repo root; numpy and sympy only, no cairo-lang needed):
+##   python bench/sweep_dt.py                                       # sho, cho, o2d; rk4; default grids
+##   python bench/sweep_dt.py --systems o2d --tol 1e-2 --energy-tol 1e-4 --workers 8
+##   python bench/sweep_dt.py --method yoshida4 --scales 10**4 2**32 --dts 0.01 0.02 0.05 0.1
+##
+## every (system, SCALE_FP, dt) run is the bit-exact emulation of the contract generated at that scale
+## (RANGE_CHECK_BOUND as RK4CairoBuilder derives it), compared over T simulated seconds with the exact
+## solution: largest position error (real units) and largest relative energy error. Runs are spread over
+## a process pool; records go to sweep_dt_output.txt as json lines, and the summary recommends, per system,
+## the largest dt within the tolerances (fewest contract steps, hence calls, per simulated second)
+
+OUTPUT_PATH = os.path.join(ROOT, 'sweep_dt_output.txt')
+
+T = 10 # simulated seconds of every run
+DTS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1]
+SCALES = [10**4, 10**8, 2**32, 2**64]
+
+# initial state in real units, as in bench_rk4.py
+STATES = {'sho' : [100, 0], 'cho' : [150, 0, 800, 1000], 'o2d' : [150, 500, 200, 0]}
+
+
+def run(task):
+    """ One sweep point: errors of `method` on `system` at (scale, bound, dt) against the exact solution """
+    system, method, scale, bound, dt, t_end = task
+    state = STATES[system]
+    dt_fp = int(round(dt * scale))
+    record = {'system' : system, 'method' : method, 'scale' : scale, 'dt' : dt_fp / scale}
+    if dt_fp == 0:
+        return dict(record, status='dt below the scale')
+
+    n = int(round(t_end / dt))
+    try:
+        traj = integrate(system, dt_fp, [int(v * scale) for v in state], n, fp=FixedPoint(scale, bound), method=method)
+    except RangeCheckError:
+        # the state outgrew RANGE_CHECK_BOUND: the contract call would fail
+        return dict(record, status='range check')
+    traj = traj[:, :, 0].astype(float) / scale
+    exact = reference(system, dt_fp / scale, state, n)[:, :, 0]
+
+    positions = slice(0, len(state), 2)
+    energy = ENERGY[system](*traj.T)
+    energy_0 = ENERGY[system](*np.asarray(state, dtype=float))
+    return dict(
+        record,
+        status='ok',
+        max_position_error=float(np.abs(traj[:, positions] - exact[:, positions]).max()),
+        max_energy_rel_error=float(np.abs(energy - energy_0).max() / energy_0)
+    )
+
+
+def within(r, tol, energy_tol):
+    return r['status'] == 'ok' and r['max_position_error'] <= tol and (energy_tol is None or r['max_energy_rel_error'] <= energy_tol)
+
+
+def print_table(records):
+    print(f"  {'':4s} {'scale':>22s} {'dt':>8s} {'max |dx|':>10s} {'max dE/E':>10s}")
+    for r in records:
+        if r['status'] != 'ok':
+            print(f"  {r['system']:4s} {r['scale']:>22} {r['dt']:>8.4g} {r['status']:>21s}")
+            continue
+        print(f"  {r['system']:4s} {r['scale']:>22} {r['dt']:>8.4g} {r['max_position_error']:>10.2e} {r['max_energy_rel_error']:>10.2e}")
+
+
+def recommend(records, tol, energy_tol):
+    """ Per system, the record of the largest dt within the tolerances (smallest scale on a tie), or None """
+    best = {}
+    for r in records:
+        if not within(r, tol, energy_tol):
+            continue
+        current = best.get(r['system'])
+        # dt of the scales that cannot take dt exactly is a hair off; compare to 0.01% for the tie
+        if current is None or r['dt'] > current['dt'] * 1.0001 or (r['dt'] >= current['dt'] * 0.9999 and r['scale'] < current['scale']):
+            best[r['system']] = r
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy sweep of the fixed-point integrators over dt and SCALE_FP.')
+    parser.add_argument('--systems', nargs='+', default=list(STATES), choices=list(STATES))
+    parser.add_argument('--method', default='rk4', choices=list(METHODS))
+    parser.add_argument('--scales', type=scale_arg, nargs='+', default=SCALES)
+    parser.add_argument('--dts', type=float, nargs='+', default=DTS)
+    parser.add_argument('--t-end', type=float, default=T, help='simulated seconds of every run')
+    parser.add_argument('--tol', type=float, default=1e-3, help='largest acceptable position error, real units')
+    parser.add_argument('--energy-tol', type=float, default=None, help='largest acceptable relative energy error')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--output', default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    # the bound of the contract each scale would be generated with
+    builder, specs = load_builder(), load_specs()
+    tasks = []
+    for system in args.systems:
+        for scale in args.scales:
+            bound = builder.from_spec(dict(specs[system], scale=scale)).range_check_bound
+            tasks += [(system, args.method, scale, bound, dt, args.t_end) for dt in args.dts]
+
+    print(f'> {len(tasks)} runs of {args.method} over {args.t_end:g} simulated seconds on {args.workers} workers')
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        records = list(pool.map(run, tasks))
+
+    with open(args.output, 'w') as f:
+        for r in records:
+            f.write(json.dumps(r) + '\n')
+    print(f'> {len(records)} records written to {args.output}')
+    print_table(records)
+
+    energy = f' and a relative energy error within {args.energy_tol:g}' if args.energy_tol is not None else ''
+    print(f'> largest dt with a position error within {args.tol:g}{energy}:')
+    best = recommend(records, args.tol, args.energy_tol)
+    for system in args.systems:
+        r = best.get(system)
+        if r is None:
+            print(f'  {system:4s} none of the dts; try smaller ones or a finer scale')
+        else:
+            print(f"  {system:4s} dt={r['dt']:g} at SCALE_FP={r['scale']} ({1/r['dt']:.0f} steps per simulated second, "
+                  f"max |dx|={r['max_position_error']:.2e}, max dE/E={r['max_energy_rel_error']:.2e})")
+
+
+if __name__ == '__main__':
+    main()
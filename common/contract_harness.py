@@ -0,0 +1,99 @@
+import os
+import fcntl
+import hashlib
+import subprocess
+import tempfile
+
+from starkware.starknet.testing.starknet import Starknet
+from starkware.starknet.services.api.contract_definition import ContractDefinition
+
+from trajectory_file import TrajectoryWriter
+
+## shared set-up of the contract tests: every test module deploys its contract once, from the
+## <name>_compiled.json next to <name>.cairo; starknet-compile only runs again when the source no
+## longer matches the hash recorded in <name>_compiled.sha256 (written by the generator notebook too).
+## pytest-xdist workers that find a stale contract at the same time take turns on a lock file and
+## replace the compiled files atomically, so a reader never sees half of one
+##
+## usage (from the repo root, with cairo-lang and pytest-xdist installed; one worker per contract):
+##   python -m pytest -n 3 --dist loadfile simple-harmonic-oscillator coupled-harmonic-oscillator oscillator-2d
+## with RK4_RECORD_DIR set, the tests also save the trajectories they get from the contracts there as .rk4t files
+##   RK4_RECORD_DIR=oscillator-2d/sim python -m pytest oscillator-2d -k rk4_trajectory
+
+
+def source_hash(cairo_path):
+    with open(cairo_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _recorded_hash(hash_path):
+    try:
+        with open(hash_path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _compile(cairo_path, compiled_path, abi_path):
+    # same command as RK4CairoBuilder.write_contract; outputs go to temporary files first
+    directory = os.path.dirname(compiled_path)
+    tmp_compiled = tempfile.NamedTemporaryFile(dir=directory, suffix='.json', delete=False).name
+    tmp_abi = tempfile.NamedTemporaryFile(dir=directory, suffix='.json', delete=False).name
+    try:
+        subprocess.run(['starknet-compile', cairo_path, '--output', tmp_compiled, '--abi', tmp_abi], check=True)
+        os.replace(tmp_compiled, compiled_path)
+        os.replace(tmp_abi, abi_path)
+    finally:
+        for path in (tmp_compiled, tmp_abi):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def load_contract_definition(cairo_path):
+    """ ContractDefinition of cairo_path, recompiled first if the source changed since the last compilation """
+    cairo_path = os.path.abspath(cairo_path)
+    base = os.path.splitext(cairo_path)[0]
+    compiled_path, hash_path = f'{base}_compiled.json', f'{base}_compiled.sha256'
+    digest = source_hash(cairo_path)
+
+    lock_path = os.path.join(tempfile.gettempdir(), f'rk4-{hashlib.sha256(cairo_path.encode()).hexdigest()[:16]}.lock')
+    with open(lock_path, 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if _recorded_hash(hash_path) != digest or not os.path.exists(compiled_path):
+            _compile(cairo_path, compiled_path, f'{base}_contract_abi.json')
+            with open(hash_path + '.tmp', 'w') as f:
+                f.write(digest + '\n')
+            os.replace(hash_path + '.tmp', hash_path)
+        with open(compiled_path) as f:
+            return ContractDefinition.loads(f.read())
+
+
+async def deploy(cairo_path, constructor_calldata=None):
+    """ Fresh Starknet testing state with the contract of cairo_path deployed on it """
+    starknet = await Starknet.empty()
+    return await starknet.deploy(contract_def=load_contract_definition(cairo_path), constructor_calldata=constructor_calldata)
+
+
+async def view(invocation):
+    """
+    Result of a @view invocation, e.g. await view(contract.query_n_steps(...)).
+
+    Runs it with .invoke() on the live state: read-only functions leave it unchanged, while .call()
+    would first deep-copy the whole state, programs included (~10 s per call for these contracts).
+    """
+    return await invocation.invoke()
+
+
+def record(name, cairo_path, scale, dt_fp, states, fields, function='query_n_steps'):
+    """
+    Save `states` (t first) to $RK4_RECORD_DIR/<name>.rk4t when RK4_RECORD_DIR is set; returns the path, or None.
+    The contract is identified by its file name and source hash.
+    """
+    directory = os.environ.get('RK4_RECORD_DIR')
+    if not directory:
+        return None
+    path = os.path.join(directory, f'{name}.rk4t')
+    contract = {'name' : os.path.basename(cairo_path), 'source_sha256' : source_hash(cairo_path)}
+    with TrajectoryWriter(path, contract, scale, dt_fp, states[0], fields=fields, function=function) as writer:
+        writer.extend(states[1:])
+    return path
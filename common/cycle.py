@@ -0,0 +1,122 @@
+import numpy as np
+from timeit import default_timer as timer
+
+from ring_buffer import StateRing
+
+## exact-cycle detection for the GUIs: the contracts' state is integer fixed-point and
+## the dynamics do not depend on t, so once a state repeats exactly the orbit cycles
+## from there on and can be played from memory instead of being queried again
+
+
+class CycleDetector:
+    """
+    Brent's algorithm run online over a stream of states (tuples of ints, without t).
+
+    The tortoise is kept at power-of-two distances behind the newest state and compared
+    by hash first, then exactly. Only the states since the tortoise are buffered, so
+    memory is bounded by `max_period`; longer cycles are not looked for.
+    """
+
+    def __init__(self, max_period=1 << 16):
+        self.max_period = max_period
+        self.cycle = None # (period, n_vars) int array once proven
+        self._tortoise = None
+        self._tortoise_hash = None
+        self._since_tortoise = []
+        self._power = 1
+
+    @property
+    def active(self):
+        return self.cycle is None and self._power <= self.max_period
+
+    @property
+    def period(self):
+        return None if self.cycle is None else len(self.cycle)
+
+    @property
+    def nbytes(self):
+        return 0 if self.cycle is None else self.cycle.nbytes
+
+    def push(self, state):
+        """ Feed the next state; True once a cycle is proven """
+        if not self.active:
+            return self.cycle is not None
+
+        state = tuple(state)
+        if self._tortoise is None:
+            self._tortoise, self._tortoise_hash = state, hash(state)
+            return False
+
+        self._since_tortoise.append(state)
+        if hash(state) == self._tortoise_hash and state == self._tortoise:
+            self.cycle = self._compact(self._since_tortoise)
+            self._since_tortoise = []
+            return True
+
+        if len(self._since_tortoise) == self._power:
+            self._tortoise, self._tortoise_hash = state, hash(state)
+            self._since_tortoise = []
+            self._power *= 2
+        return False
+
+    @staticmethod
+    def _compact(states):
+        try:
+            return np.array(states, dtype=np.int64)
+        except OverflowError:
+            return np.array(states, dtype=object)
+
+
+class CyclicSource:
+    """
+    Wraps a TrajectoryFetcher: states come from the fetcher until a cycle is proven,
+    then the fetcher is stopped and the cycle is played from memory, t advancing by dt_fp.
+    With `scale`, the cycle is played through a two-slot StateRing, so that its states are
+    ring_buffer.Samples too (with rows in real units), like the fetcher's.
+
+    `cycle_proven` is True from the get() that proved the cycle until the next one, for the
+    caller to report it.
+    """
+
+    def __init__(self, fetcher, dt_fp, max_period=1 << 16, scale=None):
+        self.fetcher = fetcher
+        self.dt_fp = dt_fp
+        self.scale = scale
+        self.detector = CycleDetector(max_period)
+        self._replay = None
+        self._last = None
+        self._played = 0
+        self._time_proven = None
+        self.cycle_proven = False
+
+    def get(self, timeout=None):
+        self.cycle_proven = False
+        if self.detector.cycle is not None:
+            cycle = self.detector.cycle
+            nxt = (self._last[0] + self.dt_fp,) + tuple(int(e) for e in cycle[self._played % len(cycle)])
+            self._played += 1
+            self._last = nxt
+            if self._replay is None:
+                return nxt
+            self._replay.put([nxt])
+            return self._replay.get()
+
+        state = self.fetcher.get(timeout=timeout)
+        if state is None:
+            return None
+        self._last = state
+        if self.detector.push(state[1:]):
+            self.fetcher.stop()
+            self._time_proven = timer()
+            if self.scale is not None:
+                self._replay = StateRing(2, len(state), scale=self.scale, dtype=self.detector.cycle.dtype)
+            self.cycle_proven = True
+        return state
+
+    def report(self):
+        if self._time_proven is None:
+            return 'no cycle proven'
+        return (
+            f'{self.detector.period}-step cycle played from memory for {timer()-self._time_proven:.1f} s '
+            f'({self._played} states, {self.detector.nbytes} bytes, no contract calls)'
+        )
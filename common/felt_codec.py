@@ -0,0 +1,78 @@
+import numpy as np
+
+## batch conversion between signed fixed-point values and felts (integers mod P);
+## replaces per-element `% PRIME` / `PRIME_HALF` comparisons: values that fit in int64
+## (every state the contracts produce) take a NumPy path, anything else falls back
+## to object arrays of Python ints with the same results
+
+PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
+PRIME_HALF = PRIME//2
+
+# P = 2**251 + 17*2**192 + 1, so a felt P+v (v < 0) ends in the 64-bit word v+1 and its upper three words
+# are those of P, or of P - 2**64 when v+1 borrowed (v < -1)
+_P_HIGH = [(PRIME >> s) & (2**64-1) for s in (192, 128, 64)]
+_P_HIGH_BORROW = [((PRIME - 2**64) >> s) & (2**64-1) for s in (192, 128, 64)]
+_INT64_MAX = 2**63 - 1
+
+
+def to_fp(values, scale):
+    """ Reals -> fixed-point integers, truncated towards zero like int(v * scale) """
+    a = np.asarray(values, dtype=float) * scale
+    if a.size and np.abs(a).max() <= _INT64_MAX:
+        return np.trunc(a).astype(np.int64)
+    return np.array([int(v) for v in a.reshape(-1)], dtype=object).reshape(a.shape)
+
+
+def to_felts(values, scale=None):
+    """
+    Signed integers (or reals, with `scale`) -> list of felts in [0, P), flattened;
+    the calldata form of the testing framework and of the StarkNet client
+    """
+    a = to_fp(values, scale) if scale is not None else np.asarray(values)
+    if a.dtype.kind in 'iu':
+        felts = a.reshape(-1).tolist()
+        for i in np.flatnonzero(a.reshape(-1) < 0).tolist():
+            felts[i] += PRIME
+        return felts
+    return [int(v) % PRIME for v in a.reshape(-1).tolist()]
+
+
+def _words(hex_felts):
+    # '0x'-prefixed hex strings -> (m, 4) big-endian 64-bit words, in one bytes.fromhex over the whole batch
+    padded = ''.join([s[2:].zfill(64) for s in hex_felts])
+    return np.frombuffer(bytes.fromhex(padded), dtype='>u8').reshape(-1, 4)
+
+
+def _from_hex(hex_felts):
+    w = _words(hex_felts)
+    high = w[:, :3]
+    low = w[:, 3].astype(np.int64) # wraps modulo 2**64
+    positive = (high == 0).all(axis=1) & (low >= 0)
+    negative = (
+        ((high == _P_HIGH).all(axis=1) & (low == 0)) |
+        ((high == _P_HIGH_BORROW).all(axis=1) & (low < 0) & (low != -2**63))
+    )
+    if not (positive | negative).all():
+        return None
+    return np.where(negative, low - 1, low)
+
+
+def from_felts(felts, scale=None):
+    """
+    Felts (ints or hex strings, as the gateway returns them) -> signed integers, values above P/2
+    being negative; an int64 array when they fit, an object array otherwise. With `scale`, reals.
+    """
+    felts = list(felts)
+    a = None
+    if felts and isinstance(felts[0], str):
+        a = _from_hex(felts)
+        if a is None:
+            felts = [int(e, 16) for e in felts]
+    if a is None:
+        a = np.array(felts, dtype=object)
+        a = np.where(a > PRIME_HALF, a - PRIME, a)
+        if len(a) == 0 or (a.min() >= -2**63 and a.max() <= _INT64_MAX):
+            a = a.astype(np.int64)
+    if scale is not None:
+        return a / scale if a.dtype != object else np.array([v / scale for v in a.tolist()])
+    return a
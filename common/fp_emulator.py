@@ -0,0 +1,433 @@
+import numpy as np
+
+## bit-exact emulator of the contracts' fixed-point arithmetic and rk4 / adaptive / symplectic integrators,
+## vectorized over arrays of initial conditions
+##
+## each state variable is a 1-D array (one entry per initial condition) so a whole
+## ensemble advances in one numpy operation; values stay in int64 while the operands
+## are small enough and fall back to object arrays of python ints otherwise, so
+## results match the contract bit for bit either way
+
+PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
+PRIME_HALF = PRIME//2
+SCALE_FP = 10000
+RANGE_CHECK_BOUND = 2 ** 64
+
+INT64_SAFE = 2 ** 59 # headroom for the sums of up to 8 products in rk4
+
+
+class RangeCheckError(ArithmeticError):
+    """ Raised where the contract's signed_div_rem would fail its range check """
+    pass
+
+
+def _max_abs(a):
+    return int(np.max(np.abs(a))) if np.size(a) else 0
+
+
+def _to_array(a):
+    try:
+        return np.asarray(a, dtype=np.int64)
+    except OverflowError:
+        return np.asarray(a, dtype=object)
+
+
+def _to_object(a):
+    # python ints throughout, numpy integer scalars included
+    return np.asarray(a).astype(object)
+
+
+def _as_int(a):
+    # felt -> signed integer, as in starkware.cairo.common.math_utils.as_int
+    a = a % PRIME
+    return np.where(a > PRIME_HALF, a - PRIME, a)
+
+
+class FixedPoint:
+    """
+    mul_fp / div_fp / mul_fp_ul / div_fp_ul with the contract's truncation.
+
+    signed_div_rem(value, div, bound) floors the signed value of the felt and requires
+    -bound <= q < bound; products that leave the int64 range are computed on python ints
+    and wrapped at PRIME the same way felt multiplication does.
+    """
+
+    def __init__(self, scale=SCALE_FP, bound=RANGE_CHECK_BOUND):
+        self.scale = scale
+        self.bound = bound
+
+    def _mul(self, a, b):
+        if _max_abs(a) * _max_abs(b) < INT64_SAFE:
+            return _to_array(a) * _to_array(b)
+        product = _to_object(a) * _to_object(b)
+        if _max_abs(product) > PRIME_HALF:
+            product = _as_int(product) # felt wrap-around
+        return product
+
+    def _in_bound(self, q):
+        if q.dtype != object and self.bound >= 2 ** 63:
+            return True # int64 cannot reach the bound
+        return not (np.any(q < -self.bound) or np.any(q >= self.bound))
+
+    def signed_div_rem(self, value, div):
+        if _max_abs(div) >= 2 ** 63 or np.asarray(value).dtype == object:
+            value = _to_object(value)
+        q = np.asarray(np.floor_divide(value, div))
+        if not self._in_bound(q):
+            raise RangeCheckError(f'signed_div_rem quotient out of [-{self.bound}, {self.bound})')
+        r = value - q*div
+        if q.dtype == object and _max_abs(q) < INT64_SAFE:
+            q = q.astype(np.int64)
+        return q, r
+
+    def asarray(self, a):
+        return _to_array(a)
+
+    def mul_fp(self, a, b):
+        c, _ = self.signed_div_rem(self._mul(a, b), self.scale)
+        return c
+
+    def div_fp(self, a, b):
+        c, _ = self.signed_div_rem(self._mul(a, self.scale), b)
+        return c
+
+    def mul_fp_ul(self, a, b_ul):
+        return self._mul(a, b_ul)
+
+    def div_fp_ul(self, a, b_ul):
+        c, _ = self.signed_div_rem(a, b_ul)
+        return c
+
+
+class Real:
+    """
+    The operations of FixedPoint on floats, without truncation: the integrators run on it give the
+    exact-arithmetic trajectory that fixed-point ones are measured against (state and dt in real units)
+    """
+
+    scale = 1
+
+    def asarray(self, a):
+        return np.asarray(a, dtype=float)
+
+    def _mul(self, a, b):
+        return np.multiply(a, b)
+
+    def signed_div_rem(self, value, div):
+        return np.divide(value, div), 0
+
+    def mul_fp(self, a, b):
+        return np.multiply(a, b)
+
+    def div_fp(self, a, b):
+        return np.divide(a, b)
+
+    mul_fp_ul = mul_fp
+    div_fp_ul = div_fp
+
+
+### problem-specific evaluation functions (the force laws of the contract specs; the generated
+### evals fold the integer constants, which gives the same values bit for bit)
+
+def eval_sho(fp, state):
+    x, xd = state
+
+    K = 150 * fp.scale
+    M = 10 * fp.scale
+
+    x_diff = xd
+    k_div_m = fp.div_fp(K, M)
+    xd_diff = fp.mul_fp(-k_div_m, x)
+
+    return [x_diff, xd_diff]
+
+
+def eval_cho(fp, state):
+    x1, x1d, x2, x2d = state
+
+    K1 = 17 * fp.scale
+    K2 = 10 * fp.scale
+    K3 = 15 * fp.scale
+    M1 = 1 * fp.scale
+    M2 = 2 * fp.scale
+    W = 1000 * fp.scale
+
+    # a1 = ( -k1x1 + k2(x2-x1) ) /m1
+    k1x1 = fp.mul_fp(K1, x1)
+    k2x2mx1 = fp.mul_fp(K2, x2-x1)
+    v1_diff = fp.div_fp(k2x2mx1 - k1x1, M1)
+
+    # a2 = ( -k2(x2-x1) + k3(W-x2) ) /m2
+    k3Wmx2 = fp.mul_fp(K3, W-x2)
+    v2_diff = fp.div_fp(k3Wmx2 - k2x2mx1, M2)
+
+    return [x1d, v1_diff, x2d, v2_diff]
+
+
+def eval_o2d(fp, state):
+    x, xd, y, yd = state
+
+    K1 = 6 * fp.scale
+    K2 = 10 * fp.scale
+    K3 = 13 * fp.scale
+    K4 = 15 * fp.scale
+    M = 2 * fp.scale
+    W = 600 * fp.scale
+
+    # ax = ( -k1*x + k2*(W-x) + k3*(W-x) -k4*x )/m
+    Wmx = W-x
+    nominator_x = -fp.mul_fp(K1, x) + fp.mul_fp(K2, Wmx) + fp.mul_fp(K3, Wmx) - fp.mul_fp(K4, x)
+    vx_diff = fp.div_fp(nominator_x, M)
+
+    # ay = ( -k1*y -k2*y + k3*(W-y) + k4*(W-y) )/m (G is declared but not applied in the contract)
+    Wmy = W-y
+    nominator_y = -fp.mul_fp(K1, y) - fp.mul_fp(K2, y) + fp.mul_fp(K3, Wmy) + fp.mul_fp(K4, Wmy)
+    vy_diff = fp.div_fp(nominator_y, M)
+
+    return [xd, vx_diff, yd, vy_diff]
+
+
+SYSTEMS = {
+    'sho' : eval_sho,
+    'cho' : eval_cho,
+    'o2d' : eval_o2d
+}
+
+
+# total energy (kinetic + springs, real units) of the same systems
+def energy_sho(x, xd, K=150, M=10):
+    return 0.5*M*xd**2 + 0.5*K*x**2
+
+def energy_cho(x1, x1d, x2, x2d, K1=17, K2=10, K3=15, M1=1, M2=2, W=1000):
+    return 0.5*M1*x1d**2 + 0.5*M2*x2d**2 + 0.5*K1*x1**2 + 0.5*K2*(x2-x1)**2 + 0.5*K3*(W-x2)**2
+
+def energy_o2d(x, xd, y, yd, K1=6, K2=10, K3=13, K4=15, M=2, W=600):
+    # the four springs pull towards (0,0), (W,0), (W,W) and (0,W), separately along x and y
+    return (0.5*M*(xd**2 + yd**2) + 0.5*K1*(x**2 + y**2) + 0.5*K2*((W-x)**2 + y**2)
+            + 0.5*K3*((W-x)**2 + (W-y)**2) + 0.5*K4*(x**2 + (W-y)**2))
+
+ENERGY = {'sho' : energy_sho, 'cho' : energy_cho, 'o2d' : energy_o2d}
+
+
+### integrators
+
+def rk4(fp, eval_fn, dt, state):
+    """ One rk4 step, with the same truncations as the contracts' generated rk4 """
+    k1 = [fp.mul_fp(e, dt) for e in eval_fn(fp, state)]
+
+    k2_state = [s + fp.div_fp_ul(k, 2) for s, k in zip(state, k1)]
+    k2 = [fp.mul_fp(e, dt) for e in eval_fn(fp, k2_state)]
+
+    k3_state = [s + fp.div_fp_ul(k, 2) for s, k in zip(state, k2)]
+    k3 = [fp.mul_fp(e, dt) for e in eval_fn(fp, k3_state)]
+
+    k4_state = [s + k for s, k in zip(state, k3)]
+    k4 = [fp.mul_fp(e, dt) for e in eval_fn(fp, k4_state)]
+
+    k_sum = [
+        (a + fp.mul_fp_ul(b, 2)) + (fp.mul_fp_ul(c, 2) + d)
+        for a, b, c, d in zip(k1, k2, k3, k4)
+    ]
+    return [s + fp.div_fp_ul(k, 6) for s, k in zip(state, k_sum)]
+
+
+### Dormand-Prince 5(4): the contracts' adaptive step (dopri_step), same tableau and truncations
+
+# stage k (k = 2..7) evaluates at state + sum_j DOPRI_A[k-2][j] * k_j; the last row is the 5th-order
+# solution, so k7 is the derivative at the new state
+DOPRI_A = [
+    [(1, 5)],
+    [(3, 40), (9, 40)],
+    [(44, 45), (-56, 15), (32, 9)],
+    [(19372, 6561), (-25360, 2187), (64448, 6561), (-212, 729)],
+    [(9017, 3168), (-355, 33), (46732, 5247), (49, 176), (-5103, 18656)],
+    [(35, 384), (0, 1), (500, 1113), (125, 192), (-2187, 6784), (11, 84)],
+]
+# 5th- minus 4th-order weights over k1..k7: the local error estimate
+DOPRI_E = [(71, 57600), (0, 1), (-71, 16695), (71, 1920), (-17253, 339200), (22, 525), (-1, 40)]
+
+# step size control: dt_nxt = dt * f for the largest f of the ladder with 0.9 * (tol/err)^(1/5) >= f,
+# i.e. err * (10p)^5 <= tol * (9q)^5 for f = p/q; 1/5 when none qualifies
+DOPRI_FACTORS = [(5, 1), (4, 1), (3, 1), (2, 1), (3, 2), (5, 4), (1, 1), (4, 5), (3, 5), (2, 5)]
+DOPRI_FACTOR_MIN = (1, 5)
+
+
+def _combination(fp, coefficients, ks):
+    # sum(c_j * k_j) over a common denominator, the unrounded k's carrying an extra SCALE_FP; truncated once
+    den = int(np.lcm.reduce([q for _, q in coefficients]))
+    num = 0
+    for (p, q), k in zip(coefficients, ks):
+        if p != 0:
+            num = num + fp._mul(k, p * (den // q))
+    c, _ = fp.signed_div_rem(num, den * fp.scale)
+    return c
+
+
+def dopri(fp, eval_fn, dt, state):
+    """ One Dormand-Prince step: (5th-order state, largest absolute error component per state) """
+    ks = [[fp._mul(e, dt) for e in eval_fn(fp, state)]]
+    for row in DOPRI_A:
+        stage = [s + _combination(fp, row, [k[i] for k in ks]) for i, s in enumerate(state)]
+        ks.append([fp._mul(e, dt) for e in eval_fn(fp, stage)])
+
+    err = [np.abs(_combination(fp, DOPRI_E, [k[i] for k in ks])) for i in range(len(state))]
+    return stage, np.max(np.stack(err), axis=0)
+
+
+def dopri_dt_nxt(fp, dt, err, tol):
+    p, q = DOPRI_FACTOR_MIN
+    dt_nxt = np.floor_divide(dt * p, q)
+    for p, q in reversed(DOPRI_FACTORS):
+        ok = fp._mul(err, (10*p) ** 5) <= fp._mul(tol, (9*q) ** 5)
+        dt_nxt = np.where(ok, np.floor_divide(dt * p, q), dt_nxt)
+    return np.maximum(dt_nxt, 1)
+
+
+def dopri_step(fp, eval_fn, dt, state, tol):
+    """
+    Adaptive step as in the contracts' query_next_adaptive: the step is accepted if err <= tol
+    (or dt is already the smallest fixed-point step); a rejected step leaves the state as is.
+    Returns (accepted, dt_nxt, err, state_nxt).
+    """
+    stage, err = dopri(fp, eval_fn, dt, state)
+    accepted = (err <= tol) | (dt == 1)
+    state_nxt = [np.where(accepted, a, s) for a, s in zip(stage, state)]
+    return accepted, dopri_dt_nxt(fp, dt, err, tol), err, state_nxt
+
+
+def integrate_adaptive(system, dt_fp, state, tol_fp, n, t_fp=0, fp=None):
+    """
+    Run n accepted adaptive steps of `system` from the scalar `state`, as query_n_adaptive does.
+
+    Returns (traj, dt_nxt, n_rejected) with traj a list of n tuples (t_fp, *state).
+    """
+    fp = fp or FixedPoint()
+    eval_fn = SYSTEMS[system]
+
+    state = [np.atleast_1d(_to_array(s)) for s in state]
+    dt = np.atleast_1d(_to_array(dt_fp))
+    traj = []
+    n_rejected = 0
+    while len(traj) < n:
+        accepted, dt_nxt, _, state = dopri_step(fp, eval_fn, dt, state, tol_fp)
+        if accepted[0]:
+            t_fp += int(dt[0])
+            traj.append((t_fp,) + tuple(int(s[0]) for s in state))
+        else:
+            n_rejected += 1
+        dt = dt_nxt
+    return traj, int(dt[0]), n_rejected
+
+
+### symplectic integrators: state laid out as (q1, v1, q2, v2, ...) with q' = v and v' = a(q)
+
+YOSHIDA_W1 = 135120719 # 1/(2 - 2^(1/3)) over YOSHIDA_DEN, as in the contracts
+YOSHIDA_DEN = 10 ** 8
+
+
+def verlet(fp, eval_fn, dt, state):
+    """ One velocity Verlet (kick-drift-kick) step, with the same truncations as the contracts' verlet """
+    diff = eval_fn(fp, state)
+    drift = []
+    for i in range(0, len(state), 2):
+        v_half = state[i+1] + fp.signed_div_rem(fp._mul(diff[i+1], dt), 2 * fp.scale)[0]
+        drift += [state[i] + fp.mul_fp(v_half, dt), v_half]
+
+    diff = eval_fn(fp, drift)
+    state_nxt = []
+    for i in range(0, len(state), 2):
+        state_nxt += [drift[i], drift[i+1] + fp.signed_div_rem(fp._mul(diff[i+1], dt), 2 * fp.scale)[0]]
+    return state_nxt
+
+
+def yoshida4(fp, eval_fn, dt, state):
+    """ One 4th-order Yoshida step: verlet substeps of w1*dt, (1-2*w1)*dt, w1*dt """
+    dt_outer, _ = fp.signed_div_rem(fp._mul(dt, YOSHIDA_W1), YOSHIDA_DEN)
+    dt_inner = dt - 2 * dt_outer
+    for sub_dt in (dt_outer, dt_inner, dt_outer):
+        state = verlet(fp, eval_fn, sub_dt, state)
+    return state
+
+
+METHODS = {
+    'rk4' : rk4,
+    'verlet' : verlet,
+    'yoshida4' : yoshida4
+}
+
+
+def integrate(system, dt_fp, state, n, fp=None, method='rk4'):
+    """
+    Run n steps of `method` ('rk4', 'verlet' or 'yoshida4') of `system` ('sho', 'cho' or 'o2d')
+    from `state`, a sequence of state variables each given as a scalar or an array over
+    initial conditions.
+
+    Returns an array of shape (n+1, n_vars, n_ic), starting with the initial state. With fp=Real(),
+    dt_fp and state are in real units and the run is the float reference.
+    """
+    fp = fp or FixedPoint()
+    eval_fn = SYSTEMS[system]
+    step = METHODS[method]
+
+    state = [np.atleast_1d(fp.asarray(s)) for s in state]
+    n_ic = max(len(s) for s in state)
+    state = [np.broadcast_to(s, (n_ic,)).copy() for s in state]
+
+    traj = [np.stack(state)]
+    for _ in range(n):
+        state = step(fp, eval_fn, dt_fp, state)
+        traj.append(np.stack(state))
+    return np.stack(traj)
+
+
+### exact reference: the force laws of the specs are affine in the state, x' = A x + b
+
+def _expm(m):
+    # matrix exponential by scaling and squaring of a Taylor series
+    squarings = max(0, int(np.ceil(np.log2(max(np.abs(m).sum(axis=1).max(), 1.0)))) + 1)
+    m = m / 2**squarings
+    term = np.eye(len(m))
+    out = term.copy()
+    for k in range(1, 20):
+        term = term @ m / k
+        out = out + term
+    for _ in range(squarings):
+        out = out @ out
+    return out
+
+
+def reference(system, dt, state, n):
+    """
+    Exact trajectory of `system` from the scalar `state` (real units) at t = 0, dt, ..., n*dt, shaped like
+    integrate's; one step is the matrix exponential of the augmented affine system. ValueError if the
+    force law is not affine.
+    """
+    eval_fn = SYSTEMS[system]
+    n_vars = len(state)
+    def derivative(x):
+        return np.array([float(d[0]) for d in eval_fn(Real(), [np.array([v]) for v in x])])
+
+    b = derivative(np.zeros(n_vars))
+    A = np.stack([derivative(np.eye(n_vars)[i]) - b for i in range(n_vars)], axis=1)
+    probe = np.linspace(1.0, 2.0, n_vars)
+    if not np.allclose(derivative(probe), A @ probe + b):
+        raise ValueError(f'{system} is not affine in its state')
+
+    augmented = np.zeros((n_vars+1, n_vars+1))
+    augmented[:n_vars, :n_vars] = A
+    augmented[:n_vars, n_vars] = b
+    step = _expm(augmented * dt)
+    x = np.append(np.asarray(state, dtype=float), 1.0)
+    traj = [x[:n_vars]]
+    for _ in range(n):
+        x = step @ x
+        traj.append(x[:n_vars])
+    return np.stack(traj)[:, :, np.newaxis]
+
+
+def to_flat_traj(traj, ic=0):
+    """
+    Trajectory of initial condition `ic` laid out like query_n_steps' return value
+    ([q1_1, q1d_1, ..., q1_2, ...], without the initial state)
+    """
+    return [int(e) for e in traj[1:, :, ic].reshape(-1)]
@@ -0,0 +1,113 @@
+from timeit import default_timer as timer
+
+from metrics import LatencyHistogram, Metrics
+
+## wall-clock pacing of the render loops: simulated time runs at a fixed rate of wall time (times
+## the playback speed) from wherever playback started, frames are paced by pygame.time.Clock, and
+## each frame shows the simulated time of the moment it is drawn. A slow frame therefore does not
+## slow the motion down: the frames it delayed are skipped and the next one catches up
+##
+## usage:
+##   scheduler = FrameScheduler(PLAYBACK_S, FRAME_RATE, metrics=metrics)
+##   scheduler.start(t)
+##   while True:
+##       t = scheduler.frame() # waits for the next frame
+##       ... draw the state at simulated time t, or scheduler.hold(t_last) if it has not arrived yet
+
+SPEEDS = (0.25, 0.5, 1, 2, 4, 8, 16)
+
+
+class FrameScheduler:
+    """
+    Maps wall time to simulated time: `playback_s` wall seconds per simulated second at speed 1,
+    `speed` from SPEEDS[0] to SPEEDS[-1]. frame() paces frames at up to `frame_rate` per second with
+    `clock` (a pygame.time.Clock by default) and returns the simulated time to draw.
+
+    Frame times (between successive frame() calls) go into a histogram for stats() and report(),
+    and, with a metrics.Metrics, into its 'frame' histogram and 'frames_skipped' counter.
+    """
+
+    def __init__(self, playback_s, frame_rate=60, speed=1, clock=None, metrics=None, timer=timer):
+        if clock is None:
+            import pygame # only the GUIs pace a display
+            clock = pygame.time.Clock()
+        self.playback_s = playback_s
+        self.frame_rate = frame_rate
+        self.clock = clock
+        self.metrics = metrics
+        self.timer = timer
+        self.frame_times = LatencyHistogram()
+        self.frames = 0
+        self.skipped = 0
+        self._check_speed(speed)
+        self.speed = speed
+        self._t0 = 0.0
+        self._wall0 = timer()
+        self._last_frame = None
+
+    @staticmethod
+    def _check_speed(speed):
+        if not SPEEDS[0] <= speed <= SPEEDS[-1]:
+            raise ValueError(f'playback speed {speed}x is outside {SPEEDS[0]}x to {SPEEDS[-1]}x')
+
+    def start(self, t):
+        """ Simulated time t is now """
+        self._t0 = t
+        self._wall0 = self.timer()
+
+    def sim_time(self, now=None):
+        now = self.timer() if now is None else now
+        return self._t0 + (now - self._wall0) * self.speed / self.playback_s
+
+    def set_speed(self, speed):
+        """ Change the playback speed from the current simulated time on """
+        self._check_speed(speed)
+        self.start(self.sim_time())
+        self.speed = speed
+
+    def faster(self):
+        self.set_speed(min([s for s in SPEEDS if s > self.speed], default=self.speed))
+        return self.speed
+
+    def slower(self):
+        self.set_speed(max([s for s in SPEEDS if s < self.speed], default=self.speed))
+        return self.speed
+
+    def hold(self, t):
+        """ Stop simulated time at t until it is released, e.g. while the state after t is on its way """
+        if self.sim_time() > t:
+            self.start(t)
+
+    def frame(self):
+        """ Wait for the next frame and return the simulated time it shows """
+        self.clock.tick(self.frame_rate)
+        now = self.timer()
+        if self._last_frame is not None:
+            interval = now - self._last_frame
+            # frames the schedule had room for in the interval but that were not drawn
+            skipped = max(round(interval * self.frame_rate) - 1, 0)
+            self.frame_times.observe(interval)
+            self.skipped += skipped
+            if self.metrics is not None:
+                self.metrics.observe('frame', interval)
+                self.metrics.count('frames_skipped', skipped)
+        self._last_frame = now
+        self.frames += 1
+        return self.sim_time(now)
+
+    def stats(self):
+        """ Frames drawn and skipped, and frame time quantiles (seconds) since the start """
+        return {
+            'frames' : self.frames,
+            'skipped' : self.skipped,
+            **{f'p{round(q*100)}_s' : self.frame_times.quantile(q) for q in Metrics.QUANTILES},
+            'max_s' : self.frame_times.max if self.frame_times.count else None,
+            'speed' : self.speed
+        }
+
+    def report(self):
+        stats = self.stats()
+        line = f"{stats['frames']} frames, {stats['skipped']} skipped at {stats['speed']:g}x"
+        if stats['p50_s'] is not None:
+            line += f"; frame time p50/p95/p99 {stats['p50_s']*1e3:.1f}/{stats['p95_s']*1e3:.1f}/{stats['p99_s']*1e3:.1f} ms"
+        return line
@@ -0,0 +1,62 @@
+import numpy as np
+
+## frames between trajectory states: every state carries the velocities as well as the positions,
+## so the cubic Hermite spline through two consecutive states matches both of them in position and
+## in slope, and the GUIs draw frames at the display rate whatever dt the contract integrates with.
+## The spline is exact for motion up to cubic in t and its error falls as dt^4, like rk4's own step
+##
+## usage:
+##   interpolator = HermiteInterpolator(positions=[1, 3], velocities=[2, 4]) # (t, x, xd, y, yd)
+##   interpolator.push(state.real)
+##   x, y = interpolator.at(t) # t between the last two states pushed
+
+
+def hermite(p0, v0, p1, v1, h, s):
+    """
+    Cubic Hermite interpolation at s in [0, 1] of a step of length h from position p0 with
+    velocity v0 to p1 with v1 (scalars or arrays)
+    """
+    s2 = s * s
+    s3 = s2 * s
+    return (2*s3 - 3*s2 + 1) * p0 + (s3 - 2*s2 + s) * h * v0 + (3*s2 - 2*s3) * p1 + (s3 - s2) * h * v1
+
+
+class HermiteInterpolator:
+    """
+    Positions at any simulated time between the last two states pushed.
+
+    States are rows in real units, t first (e.g. Sample.real); `positions` and `velocities` are the
+    indices of the coordinates and of their time derivatives, in the same order. push() copies what it
+    needs, so the ring can reuse a Sample's slot right after.
+    """
+
+    def __init__(self, positions, velocities):
+        if len(positions) != len(velocities):
+            raise ValueError('one velocity per position')
+        self._positions = list(positions)
+        self._velocities = list(velocities)
+        self._prev = None
+        self._next = None
+
+    def push(self, state):
+        """ Make `state` the end of the current segment and the last one its start """
+        state = np.asarray(state, dtype=float)
+        self._prev = self._next
+        self._next = (float(state[0]), state[self._positions], state[self._velocities])
+
+    @property
+    def t0(self):
+        return (self._prev or self._next)[0]
+
+    @property
+    def t1(self):
+        return self._next[0]
+
+    def at(self, t):
+        """ Positions at simulated time t, clamped to [t0, t1]; the last state's until two are known """
+        t1, p1, v1 = self._next
+        if self._prev is None or t1 <= self._prev[0]:
+            return p1.copy()
+        t0, p0, v0 = self._prev
+        h = t1 - t0
+        return hermite(p0, v0, p1, v1, h, min(max((t - t0) / h, 0.0), 1.0))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import hashlib
+import threading
+
+from starkware.cairo.common.cairo_function_runner import CairoFunctionRunner
+from starkware.cairo.lang.vm.utils import RunResources
+from starkware.starknet.core.os import os_utils
+from starkware.starknet.core.os.syscall_utils import SysCallHandlerBase
+from starkware.starknet.services.api.contract_definition import ContractDefinition, EntryPointType
+
+from starknet_client import StarkNetCallError, StarkNetClient
+
+## the compiled contracts run in-process: the same calls as StarkNetClient, answered by the Cairo VM
+## of cairo-lang from <name>_compiled.json instead of by the alpha network, e.g. for developing
+## and load-testing without a deployment. Every call runs the function's entry point as the StarkNet
+## testing backend does (same layout, builtins, hint locals and secure-run checks), so results are
+## those of the deployed contract; storage (the shared trajectory of --shared) lives in a dict
+##
+## usage:
+##   client = LocalClient('../o2d_compiled.json', constructor_inputs=[t_fp, dt_fp, x_fp, xd_fp, y_fp, yd_fp])
+##   ret = client.call('query_n_steps', [t_fp, dt_fp, x_fp, xd_fp, y_fp, yd_fp, N])
+
+MAX_STEPS = 10**8 # Cairo steps per call
+
+
+class _StorageSysCallHandler(SysCallHandlerBase):
+    """ storage_read / storage_write against a dict; the other system calls are not used by the contracts """
+
+    def __init__(self):
+        super().__init__()
+        self.storage = {}
+
+    def _read_and_validate_syscall_request(self, syscall_name, segments, syscall_ptr):
+        return self._read_syscall_request(syscall_name=syscall_name, segments=segments, syscall_ptr=syscall_ptr)
+
+    def _call_contract(self, segments, syscall_ptr):
+        raise StarkNetCallError('call_contract is not supported by the local backend')
+
+    def _get_caller_address(self, segments, syscall_ptr):
+        return 0
+
+    def _get_tx_signature(self, segments, syscall_ptr):
+        return []
+
+    def _storage_read(self, address):
+        return self.storage.get(address, 0)
+
+    def _storage_write(self, address, value):
+        self.storage[address] = value
+
+    def _allocate_segment(self, segments):
+        return segments.add()
+
+
+class LocalClient(StarkNetClient):
+    """
+    StarkNetClient whose calls run the compiled program in a local Cairo VM.
+
+    The program is loaded once from `compiled_path`; the ABI is the one compiled into it unless
+    `abi_path` is given. `constructor_inputs` (ABI order, as for call) initialise the storage like
+    a deployment would. invoke() runs an @external function and applies its storage writes once it
+    returns; a failing run leaves the storage as it was, and views never change it.
+    Caching, lookup/replay, metrics and result decoding are those of StarkNetClient; contract_hash
+    defaults to a digest of the compiled program, so cached results are shared with any client that
+    passes the same hash.
+    """
+
+    def __init__(self, compiled_path, abi_path=None, cache=None, contract_hash=None, metrics=None,
+                 constructor_inputs=None, max_steps=MAX_STEPS):
+        with open(compiled_path, 'rb') as f:
+            compiled_bytes = f.read()
+        self.contract_definition = ContractDefinition.loads(compiled_bytes.decode())
+        if abi_path is None:
+            abi_bytes = json.dumps(self.contract_definition.abi).encode()
+        else:
+            with open(abi_path, 'rb') as f:
+                abi_bytes = f.read()
+
+        self._setup(0, abi_bytes, contract_hash or hashlib.sha256(compiled_bytes).hexdigest(), cache, metrics)
+        self.max_steps = max_steps
+
+        self.storage = {}
+        self._syscall_handler = _StorageSysCallHandler() # loads the StarkNet OS program: once per client
+        self._lock = threading.Lock() # the fetcher thread and the GUI share the handler
+        self._offsets = {
+            e.selector : e.offset for e in self.contract_definition.entry_points_by_type[EntryPointType.EXTERNAL]
+        }
+        constructors = self.contract_definition.entry_points_by_type.get(EntryPointType.CONSTRUCTOR, [])
+        if constructors:
+            self._run(constructors[0].offset, self._constructor_calldata(constructor_inputs or []), commit=True)
+        elif constructor_inputs:
+            raise ValueError(f'{compiled_path} has no constructor')
+
+    def _constructor_calldata(self, inputs):
+        abi = self.contract_definition.abi
+        constructor = next(e for e in abi if e['type'] == 'constructor')
+        if len(inputs) != len(constructor['inputs']):
+            raise ValueError(f"constructor expects {len(constructor['inputs'])} inputs, got {len(inputs)}.")
+        return self._to_calldata(constructor['inputs'], inputs)
+
+    def _run(self, offset, calldata, commit=False):
+        """ Return data of the entry point at `offset` (hex felts, as the gateway returns them) """
+        runner = CairoFunctionRunner(program=self.contract_definition.program, layout='all')
+        os_context = os_utils.prepare_os_context(runner)
+        with self._lock:
+            self._syscall_handler.storage = dict(self.storage)
+            self._execute(runner, offset, os_context, calldata)
+            if commit:
+                self.storage = self._syscall_handler.storage
+        retdata_size, retdata_ptr = runner.get_return_values(2)
+        return [hex(v) for v in runner.memory.get_range(retdata_ptr, retdata_size)]
+
+    def _execute(self, runner, offset, os_context, calldata):
+        try:
+            runner.run_from_entrypoint(
+                offset,
+                os_context,
+                len(calldata),
+                calldata,
+                hint_locals={'syscall_handler' : self._syscall_handler},
+                static_locals={
+                    '__find_element_max_size' : 2**20,
+                    '__squash_dict_max_size' : 2**20,
+                    '__keccak_max_size' : 2**20
+                },
+                run_resources=RunResources(steps=self.max_steps),
+                verify_secure=True
+            )
+        except Exception as e:
+            raise StarkNetCallError(f'local run failed: {e}') from e
+
+    def _run_function(self, function, calldata, commit=False):
+        selector = self._functions[function][0]
+        if selector not in self._offsets:
+            raise StarkNetCallError(f'{function} is not an entry point of the compiled program')
+        return self._run(self._offsets[selector], calldata, commit)
+
+    def _call_remote(self, function, calldata):
+        return self._run_function(function, calldata)
+
+    async def _call_remote_async(self, function, calldata):
+        # the VM would hold the event loop for the whole run: a worker thread runs it instead
+        return await asyncio.get_running_loop().run_in_executor(None, self._run_function, function, calldata)
+
+    def _invoke_remote(self, function, calldata):
+        # no sequencer: the transaction is accepted as soon as it has run
+        self._run_function(function, calldata, commit=True)
+        return {'code' : 'TRANSACTION_ACCEPTED'}
+
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import math
+import threading
+from contextlib import contextmanager
+from timeit import default_timer as timer
+
+## lightweight instrumentation for the GUIs: latency histograms (contract calls, decoding, frame
+## rendering), throughput counters (steps, frames) and gauges (fetch queue depth), snapshotted every
+## `interval` seconds to json lines and/or a Prometheus text file; plus a sampled logger that takes
+## the place of a print per batch, so that stdout stops costing time in long sessions
+##
+## usage:
+##   metrics = Metrics([JsonLinesExporter('metrics.jsonl'), PrometheusExporter('rk4.prom')], interval=10)
+##   with metrics.time('render'):
+##       update_figures(...)
+##   metrics.count('frames')
+##   metrics.set_gauge('queue_depth', fetcher.queue_depth())
+##   metrics.tick() # once per frame: exports when the interval is up
+
+
+class LatencyHistogram:
+    """
+    Latencies in fixed log-spaced buckets, BUCKETS_PER_DECADE per decade from MIN_S up: constant
+    memory and O(1) observe. Quantiles are read off the cumulative counts as the upper edge of their
+    bucket, i.e. at most ~12% high.
+    """
+
+    MIN_S = 1e-5
+    DECADES = 7 # up to 100 s; slower observations land in the last bucket
+    BUCKETS_PER_DECADE = 20
+
+    def __init__(self):
+        self.buckets = [0] * (self.DECADES * self.BUCKETS_PER_DECADE + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, seconds):
+        if seconds <= self.MIN_S:
+            return 0
+        return min(int(math.log10(seconds / self.MIN_S) * self.BUCKETS_PER_DECADE) + 1, len(self.buckets) - 1)
+
+    def _upper_edge(self, index):
+        return self.MIN_S * 10 ** (index / self.BUCKETS_PER_DECADE)
+
+    def observe(self, seconds):
+        self.buckets[self._index(seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(self._upper_edge(index), self.max)
+        return self.max
+
+
+class Metrics:
+    """
+    Thread-safe registry of named histograms, counters and gauges (the fetcher thread and the render
+    loop both record into it).
+
+    A snapshot holds, per histogram, the count, p50/p95/p99 and max of the observations since the
+    previous snapshot, and the running count and sum; per counter, the running total and its rate over
+    the window (e.g. steps_per_s, frames_per_s); and the latest value of every gauge.
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, exporters=(), interval=10.0, clock=timer):
+        self.exporters = list(exporters)
+        self.interval = interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._window = {} # histogram name -> LatencyHistogram since the last snapshot
+        self._totals = {} # histogram name -> (count, sum) since start
+        self._counters = {}
+        self._counters_at_snapshot = {}
+        self._gauges = {}
+        self._start = self._last_snapshot = clock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self._window:
+                self._window[name] = LatencyHistogram()
+            self._window[name].observe(seconds)
+            count, total = self._totals.get(name, (0, 0.0))
+            self._totals[name] = (count + 1, total + seconds)
+
+    @contextmanager
+    def time(self, name):
+        """ Observe the wall time of the with-block under `name` """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - start)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self):
+        """ Current figures (see the class docstring); starts a new window """
+        with self._lock:
+            now = self.clock()
+            elapsed = max(now - self._last_snapshot, 1e-9)
+            histograms = {}
+            for name, (count, total) in self._totals.items():
+                window = self._window.get(name, LatencyHistogram())
+                histograms[name] = {
+                    'count' : count,
+                    'sum_s' : total,
+                    'window_count' : window.count,
+                    **{f'p{round(q*100)}_s' : window.quantile(q) for q in self.QUANTILES},
+                    'max_s' : window.max if window.count else None
+                }
+            counters = {}
+            for name, total in self._counters.items():
+                counters[name] = total
+                counters[f'{name}_per_s'] = (total - self._counters_at_snapshot.get(name, 0)) / elapsed
+            snapshot = {
+                'time' : now - self._start,
+                'window_s' : elapsed,
+                'histograms' : histograms,
+                'counters' : counters,
+                'gauges' : dict(self._gauges)
+            }
+            self._window = {}
+            self._counters_at_snapshot = dict(self._counters)
+            self._last_snapshot = now
+        return snapshot
+
+    def tick(self):
+        """ Export a snapshot if `interval` seconds went by since the last one; cheap otherwise """
+        if self.clock() - self._last_snapshot >= self.interval:
+            self.export()
+
+    def export(self):
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.write(snapshot)
+        return snapshot
+
+    def close(self):
+        """ Export a last snapshot, close the exporters and return the snapshot """
+        snapshot = self.export()
+        for exporter in self.exporters:
+            exporter.close()
+        return snapshot
+
+
+def summary(snapshot):
+    """ One human-readable line of a snapshot """
+    parts = []
+    for name, h in snapshot['histograms'].items():
+        if h['window_count']:
+            parts.append(f"{name} p50/p95/p99 {h['p50_s']*1e3:.1f}/{h['p95_s']*1e3:.1f}/{h['p99_s']*1e3:.1f} ms")
+    for name, value in snapshot['counters'].items():
+        if name.endswith('_per_s'):
+            parts.append(f'{name} {value:.1f}')
+    for name, value in snapshot['gauges'].items():
+        parts.append(f'{name} {value}')
+    return '; '.join(parts)
+
+
+class JsonLinesExporter:
+    """ One json line per snapshot, appended to `path` ('-' for stdout) """
+
+    def __init__(self, path):
+        self._file = sys.stdout if path == '-' else open(path, 'a')
+
+    def write(self, snapshot):
+        self._file.write(json.dumps(snapshot) + '\n')
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class PrometheusExporter:
+    """
+    The latest snapshot as a Prometheus text file (e.g. for node_exporter's textfile collector),
+    replaced atomically: histograms as summaries, counters as counters, rates and gauges as gauges.
+    """
+
+    def __init__(self, path, prefix='rk4_'):
+        self.path = path
+        self.prefix = prefix
+
+    def render(self, snapshot):
+        p = self.prefix
+        lines = []
+        for name, h in snapshot['histograms'].items():
+            metric = f'{p}{name}_seconds'
+            lines.append(f'# TYPE {metric} summary')
+            for q in Metrics.QUANTILES:
+                value = h[f'p{round(q*100)}_s']
+                lines.append(f'{metric}{{quantile="{q}"}} {"NaN" if value is None else repr(value)}')
+            lines.append(f"{metric}_sum {h['sum_s']!r}")
+            lines.append(f"{metric}_count {h['count']}")
+        for name, value in snapshot['counters'].items():
+            if name.endswith('_per_s'):
+                metric = f'{p}{name[:-len("_per_s")]}_per_second'
+                lines.append(f'# TYPE {metric} gauge')
+            else:
+                metric = f'{p}{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+            lines.append(f'{metric} {value!r}')
+        for name, value in snapshot['gauges'].items():
+            lines.append(f'# TYPE {p}{name} gauge')
+            lines.append(f'{p}{name} {value!r}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, snapshot):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render(snapshot))
+        os.replace(tmp_path, self.path)
+
+    def close(self):
+        pass
+
+
+class SampledLogger:
+    """
+    print() for hot paths: per key, at most one line every `interval` seconds goes out; the lines
+    dropped in between are counted and the count is added to the next line that does.
+    """
+
+    def __init__(self, interval=5.0, stream=None, clock=timer):
+        self.interval = interval
+        self.stream = stream
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._last = {}
+        self._dropped = {}
+
+    def log(self, message, key=None):
+        with self._lock:
+            now = self.clock()
+            last = self._last.get(key)
+            if last is not None and now - last < self.interval:
+                self._dropped[key] = self._dropped.get(key, 0) + 1
+                return False
+            dropped = self._dropped.pop(key, 0)
+            self._last[key] = now
+        suffix = f' ({dropped} similar lines skipped)' if dropped else ''
+        print(message + suffix, file=self.stream or sys.stdout)
+        return True
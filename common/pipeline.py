@@ -0,0 +1,77 @@
+import threading
+
+from ring_buffer import StateRing
+
+## producer/consumer pipeline for the GUIs: a worker thread keeps fetching
+## batches of states from the contract into a bounded queue while the main
+## thread animates whatever has arrived, so network time and rendering overlap;
+## states wait in a preallocated ring, so memory stays flat however long it runs
+
+
+class TrajectoryFetcher(threading.Thread):
+    """
+    Background producer of states.
+
+    fetch_batch(state, n) must return the n states following `state` (a list of tuples,
+    each in the same layout as `state`), or none at the end of the trajectory. The first batch is small so that animation can
+    start right away; batch size then doubles up to `batch_size`. At most `max_queued`
+    states wait in the ring (a ring_buffer.StateRing), which throttles fetching when
+    rendering is the bottleneck; get() hands them out as ring_buffer.Samples, with rows in
+    real units as well when `scale` is given.
+    With a metrics.Metrics as `metrics`, fetched states are counted as 'steps' and every
+    fetch_batch is timed as 'fetch'.
+    """
+
+    def __init__(self, fetch_batch, state, batch_size, first_batch_size=10, max_queued=None, metrics=None, scale=None):
+        super().__init__(daemon=True)
+        self.fetch_batch = fetch_batch
+        self.state = state
+        self.batch_size = batch_size
+        self.first_batch_size = min(first_batch_size, batch_size)
+        self.samples = StateRing(max_queued or 2*batch_size, len(state), scale=scale)
+        self.metrics = metrics
+        self._stop_event = threading.Event()
+        self._error = None
+
+    def run(self):
+        n = self.first_batch_size
+        try:
+            while not self._stop_event.is_set():
+                if self.metrics is None:
+                    states = self.fetch_batch(self.state, n)
+                else:
+                    with self.metrics.time('fetch'):
+                        states = self.fetch_batch(self.state, n)
+                    self.metrics.count('steps', len(states))
+                if not states:
+                    return # the source ran out, e.g. the end of a replayed recording
+                if not self._put(states):
+                    return
+                self.state = states[-1]
+                n = min(n*2, self.batch_size)
+        except Exception as e:
+            self._error = e
+
+    def _put(self, states):
+        # blocking put that still notices stop()
+        while not self._stop_event.is_set():
+            states = states[self.samples.put(states, timeout=0.1):]
+            if not states:
+                return True
+        return False
+
+    def get(self, timeout=None):
+        """
+        Next state, or None if nothing arrived within `timeout` seconds.
+        Re-raises in the caller's thread if the producer died.
+        """
+        sample = self.samples.get(timeout=timeout)
+        if sample is None and self._error is not None:
+            raise self._error
+        return sample
+
+    def queue_depth(self):
+        return len(self.samples)
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,110 @@
+import pygame
+
+## shared renderer for the oscillator scenes: the background is built once,
+## fonts and rendered text are cached, springs are blitted from a pre-rendered
+## circle sprite, and only the rectangles touched by a frame are pushed to the display
+
+
+def gradient_background(size, top_color, bottom_color):
+    """ Vertical gradient from <top_color> to <bottom_color>, built once """
+    color_rect = pygame.Surface( (2,2) )
+    pygame.draw.line( color_rect, top_color,    (0,0), (1,0) ) # top color line
+    pygame.draw.line( color_rect, bottom_color, (0,1), (1,1) ) # bottom color line
+    return pygame.transform.smoothscale( color_rect, size ).convert() # stretch
+
+
+class SceneRenderer:
+    """
+    Draws frames over a static background.
+
+    Per frame: begin_frame() restores the background under whatever the previous frame
+    drew, draw_spring()/draw_ball() draw the new frame, end_frame() pushes the union of
+    old and new rectangles with pygame.display.update(rects).
+    """
+
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self._fonts = {}
+        self._texts = {}
+        self._sprites = {}
+        self._prev_rects = []
+        self._rects = []
+        self._message = None # (surface, rect)
+
+        self.full_redraw()
+
+    def full_redraw(self):
+        self.screen.blit(self.background, (0,0))
+        if self._message is not None:
+            self.screen.blit(*self._message)
+        pygame.display.flip()
+
+    def font(self, path, size):
+        key = (path, size)
+        if key not in self._fonts:
+            self._fonts[key] = pygame.font.Font(path, size)
+        return self._fonts[key]
+
+    def text(self, message, font_path, size, color):
+        key = (message, font_path, size, color)
+        if key not in self._texts:
+            self._texts[key] = self.font(font_path, size).render(message, 1, color)
+        return self._texts[key]
+
+    def set_message(self, message, font_path, size, color, center):
+        if self._message is not None:
+            old_rect = self._message[1]
+            self.screen.blit(self.background, old_rect, old_rect)
+            self._rects.append(old_rect)
+        surface = self.text(message, font_path, size, color)
+        rect = surface.get_rect(center=center)
+        self._message = (surface, rect)
+        self.screen.blit(surface, rect)
+        self._rects.append(rect)
+        pygame.display.update(self._rects)
+        self._rects = []
+
+    def _circle_sprite(self, radius, color, width):
+        key = (radius, color, width)
+        if key not in self._sprites:
+            r = int(round(radius))
+            sprite = pygame.Surface( (2*r+2, 2*r+2), pygame.SRCALPHA )
+            pygame.draw.circle(sprite, color, (r+1, r+1), r, width)
+            self._sprites[key] = sprite
+        return self._sprites[key]
+
+    def begin_frame(self):
+        for rect in self._prev_rects:
+            self.screen.blit(self.background, rect, rect)
+
+    def draw_spring(self, first_xy, last_xy, n_circle, radius, color):
+        # n_circle outlined circles evenly spaced from first_xy to last_xy, in one blits() call
+        sprite = self._circle_sprite(radius, color, 1)
+        offset = sprite.get_width()/2
+        xdelta = (last_xy[0]-first_xy[0]) / (n_circle-1)
+        ydelta = (last_xy[1]-first_xy[1]) / (n_circle-1)
+        positions = [
+            (first_xy[0] + i*xdelta - offset, first_xy[1] + i*ydelta - offset)
+            for i in range(n_circle)
+        ]
+        self.screen.blits([(sprite, pos) for pos in positions], doreturn=False)
+
+        rect = sprite.get_rect(topleft=positions[0]).union(sprite.get_rect(topleft=positions[-1]))
+        self._rects.append(rect.inflate(2,2)) # blit positions are truncated, rects are not
+
+    def draw_ball(self, center, radius, color):
+        rect = pygame.draw.circle(self.screen, color, center, radius, 0)
+        self._rects.append(rect)
+
+    def end_frame(self):
+        # redraw the message if a restored or drawn region ran over it
+        if self._message is not None:
+            surface, rect = self._message
+            if rect.collidelist(self._prev_rects + self._rects) != -1:
+                self.screen.blit(surface, rect)
+                self._rects.append(rect)
+
+        pygame.display.update(self._prev_rects + self._rects)
+        self._prev_rects = self._rects
+        self._rects = []
@@ -0,0 +1,118 @@
+import threading
+import numpy as np
+
+## fixed-capacity storage of trajectory states for long sessions: states live in
+## preallocated numpy arrays (fixed-point as int64, real units as float64) that are
+## written in place, so memory stays the same however long the animation runs
+
+
+class Sample:
+    """
+    One state of a StateRing, without a copy: `fp` is its fixed-point row and `real` the
+    same row in real units (fp / scale), both views into the ring, for rendering.
+
+    It also reads as the tuple of Python ints the GUIs unpack (`t_fp, x_fp, xd_fp = sample`).
+    The views are valid until the next get() from the ring that handed it out.
+    """
+
+    __slots__ = ('fp', 'real')
+
+    def __init__(self, fp, real):
+        self.fp = fp
+        self.real = real
+
+    def __len__(self):
+        return len(self.fp)
+
+    def __iter__(self):
+        return iter(self.fp.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self.fp[index].tolist())
+        return int(self.fp[index])
+
+    def __eq__(self, other):
+        try:
+            return tuple(self) == tuple(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f'Sample{tuple(self)}'
+
+
+class StateRing:
+    """
+    Bounded single-producer single-consumer FIFO of states (sequences of `n_vars` ints).
+
+    put() writes whole batches into the preallocated arrays, blocking while the ring is full;
+    get() hands out the oldest state as a Sample. The slot of the last Sample handed out is
+    only reused after the next get(), so its views never change under the consumer.
+    With `scale`, every state is also kept in real units, converted once per batch on put().
+    `dtype=object` takes fixed-point values beyond int64 (the float rows stay float64).
+    """
+
+    __slots__ = ('capacity', 'n_vars', 'scale', '_fp', '_real', '_written', '_read', '_held', '_cond')
+
+    def __init__(self, capacity, n_vars, scale=None, dtype=np.int64):
+        if capacity < 2:
+            raise ValueError('capacity must be at least 2 (one slot stays with the consumer)')
+        self.capacity = capacity
+        self.n_vars = n_vars
+        self.scale = scale
+        self._fp = np.zeros((capacity, n_vars), dtype=dtype)
+        self._real = np.zeros((capacity, n_vars)) if scale is not None else None
+        self._written = 0 # states put since start; slot = count % capacity
+        self._read = 0
+        self._held = 0 # 1 while a Sample handed out still points into the ring
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        """ States waiting to be read """
+        with self._cond:
+            return self._written - self._read
+
+    @property
+    def nbytes(self):
+        return self._fp.nbytes + (0 if self._real is None else self._real.nbytes)
+
+    def _free(self):
+        return self.capacity - (self._written - self._read) - self._held
+
+    def put(self, states, timeout=None):
+        """
+        Append as many of `states` as fit, waiting up to `timeout` seconds for room;
+        returns how many were written (the caller retries with the rest).
+        """
+        with self._cond:
+            if not self._free():
+                self._cond.wait_for(self._free, timeout)
+            n = min(len(states), self._free())
+            done = 0
+            while done < n:
+                # contiguous run up to the end of the arrays, then wrap around
+                start = (self._written + done) % self.capacity
+                stop = min(start + n - done, self.capacity)
+                block = states[done:done + stop - start]
+                self._fp[start:stop] = block
+                if self._real is not None:
+                    np.divide(self._fp[start:stop], self.scale, out=self._real[start:stop], casting='unsafe')
+                done += stop - start
+            self._written += n
+            if n:
+                self._cond.notify_all()
+            return n
+
+    def get(self, timeout=None):
+        """ Oldest state as a Sample, or None if nothing arrived within `timeout` seconds """
+        with self._cond:
+            if self._held:
+                self._held = 0
+                self._cond.notify_all()
+            if self._written == self._read and not self._cond.wait_for(lambda: self._written > self._read, timeout):
+                return None
+            slot = self._read % self.capacity
+            self._read += 1
+            self._held = 1
+        return Sample(self._fp[slot], None if self._real is None else self._real[slot])
@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+from collections import namedtuple
+from contextlib import nullcontext
+
+import requests
+from Crypto.Hash import keccak
+
+from felt_codec import PRIME, from_felts, to_felts
+from trajectory_cache import make_key
+
+## in-process client for calling @view functions of a deployed contract;
+## replaces forking `starknet call` once per query: the ABI is parsed once,
+## the HTTP connection is kept alive and calldata is encoded right here;
+## @external functions (advance of the stateful contracts) are sent as transactions with invoke
+
+MASK_250 = 2**250 - 1
+
+ALPHA_FEEDER_GATEWAY_URL = 'https://alpha3.starknet.io/feeder_gateway'
+ALPHA_GATEWAY_URL = 'https://alpha3.starknet.io/gateway'
+TIMEOUT_S = 30 # per request: a stalled gateway fails the call rather than hanging its caller
+
+
+class StarkNetCallError(Exception):
+    pass
+
+
+def get_selector_from_name(func_name):
+    # starknet_keccak: keccak256 truncated to 250 bits so that it fits in a felt
+    digest = keccak.new(digest_bits=256, data=func_name.encode('ascii')).digest()
+    return int.from_bytes(digest, 'big') & MASK_250
+
+
+def pack_ensemble(states):
+    """
+    Struct-of-arrays calldata for query_next_given_ensemble:
+    [(x, xd, y, yd), ...] -> [x_1..x_m, xd_1..xd_m, y_1..y_m, yd_1..yd_m]
+    """
+    return [state[i] for i in range(len(states[0])) for state in states]
+
+
+def unpack_ensemble(flat, n_vars):
+    """ Inverse of pack_ensemble: list of m state tuples of n_vars entries each """
+    m = len(flat) // n_vars
+    return [tuple(flat[i*m + j] for i in range(n_vars)) for j in range(m)]
+
+
+class StarkNetClient:
+    """
+    Calls @view functions of one deployed contract over a pooled HTTP session.
+
+    Example:
+        client = StarkNetClient(CONTRACT_ADDRESS, 'o2d_contract_abi.json')
+        ret = client.call('query_n_steps', [t_fp, dt_fp, x_fp, xd_fp, y_fp, yd_fp, N])
+        ret.traj # list of signed ints
+
+    Inputs are given positionally in ABI order; a felt* argument takes a list and its
+    preceding *_len argument is filled in automatically. Negative inputs are sent mod P
+    and results above P/2 come back negative (felt_codec, one batch per call).
+
+    With a TrajectoryCache as `cache`, results are looked up by (contract_hash, function,
+    calldata) before going to the network. contract_hash defaults to a digest of the
+    address and the ABI; pass the hash of the compiled program to share entries between
+    deployments of the same code. Views of the stored state (UNCACHED) always go to the network.
+
+    A request that takes longer than `timeout` seconds, or cannot reach the gateway, raises
+    StarkNetCallError like a rejected one.
+
+    With a metrics.Metrics as `metrics`, the latency of every remote call ('call', 'invoke') and
+    of every result decoding ('decode') is recorded.
+    """
+
+    # views whose result depends on contract storage rather than on the calldata alone
+    UNCACHED = frozenset(['get_state'])
+
+    def __init__(self, address, abi_path, feeder_gateway_url=ALPHA_FEEDER_GATEWAY_URL, pool_size=4,
+                 cache=None, contract_hash=None, gateway_url=ALPHA_GATEWAY_URL, metrics=None, timeout=TIMEOUT_S):
+        if isinstance(address, str):
+            address = int(address, 16)
+        with open(abi_path, 'rb') as f:
+            abi_bytes = f.read()
+        contract_hash = contract_hash or hashlib.sha256(hex(address).encode('ascii') + abi_bytes).hexdigest()
+        self._setup(address, abi_bytes, contract_hash, cache, metrics)
+
+        self.url = f'{feeder_gateway_url}/call_contract?blockId=null'
+        self.invoke_url = f'{gateway_url}/add_transaction'
+        self.timeout = timeout
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._async_session = None
+
+    def _setup(self, address, abi_bytes, contract_hash, cache, metrics):
+        """ State of every client, whichever transport answers its calls (LocalClient runs them in-process) """
+        self.address = address
+        self.cache = cache
+        self.metrics = metrics
+        self.remote_calls = 0
+        self.contract_hash = contract_hash
+        self._load_abi(abi_bytes)
+
+    def _load_abi(self, abi_bytes):
+        abi = json.loads(abi_bytes)
+        self._struct_sizes = {e['name'] : e['size'] for e in abi if e['type'] == 'struct'}
+        self._functions = {}
+        for e in abi:
+            if e['type'] != 'function':
+                continue
+            inputs = [i for i in e['inputs'] if not self._is_len_of_next(i, e['inputs'])]
+            outputs = e['outputs']
+            ret_tuple = namedtuple(f"{e['name']}_return_type", [o['name'] for o in outputs if not self._is_len_of_next(o, outputs)])
+            self._functions[e['name']] = (get_selector_from_name(e['name']), inputs, outputs, ret_tuple)
+
+    @staticmethod
+    def _is_len_of_next(entry, entries):
+        i = entries.index(entry)
+        return i+1 < len(entries) and entries[i+1]['type'] == 'felt*' and entry['name'] == entries[i+1]['name'] + '_len'
+
+    def encode_calldata(self, function, inputs):
+        _, abi_inputs, _, _ = self._functions[function]
+        if len(inputs) != len(abi_inputs):
+            raise ValueError(f'{function} expects {len(abi_inputs)} inputs, got {len(inputs)}.')
+        return self._to_calldata(abi_inputs, inputs)
+
+    @staticmethod
+    def _to_calldata(abi_inputs, inputs):
+        calldata = []
+        for entry, value in zip(abi_inputs, inputs):
+            if entry['type'] == 'felt*':
+                calldata.append(len(value))
+                calldata.extend(value)
+            elif entry['type'] == 'felt':
+                calldata.append(value)
+            else:
+                calldata.extend(value) # struct / tuple given as a flat sequence
+        return to_felts(calldata)
+
+    def decode_result(self, function, result):
+        _, _, abi_outputs, ret_tuple = self._functions[function]
+        it = iter(from_felts(result).tolist())
+
+        values = []
+        for entry in abi_outputs:
+            if self._is_len_of_next(entry, abi_outputs):
+                continue
+            if entry['type'] == 'felt':
+                values.append(next(it))
+            elif entry['type'] == 'felt*':
+                values.append([next(it) for _ in range(next(it))])
+            else:
+                values.append(tuple(next(it) for _ in range(self._size_of(entry['type']))))
+        return ret_tuple(*values)
+
+    def _size_of(self, typ):
+        if typ.startswith('('):
+            return sum(self._size_of(t.strip()) for t in typ[1:-1].split(','))
+        return self._struct_sizes.get(typ, 1)
+
+    def _request_body(self, function, calldata, **fields):
+        selector = self._functions[function][0]
+        return json.dumps({
+            'calldata' : [str(e) for e in calldata],
+            'contract_address' : hex(self.address),
+            'entry_point_selector' : hex(selector),
+            'signature' : [],
+            **fields
+        })
+
+    def _timed(self, name):
+        return self.metrics.time(name) if self.metrics is not None else nullcontext()
+
+    def _decode(self, function, result):
+        with self._timed('decode'):
+            return self.decode_result(function, result)
+
+    def _cache_key(self, function, calldata):
+        return make_key(self.contract_hash, function, calldata)
+
+    def _cached(self, function):
+        return self.cache is not None and function not in self.UNCACHED
+
+    def lookup(self, function, inputs):
+        """ Cached result of a call, or None; never goes to the network """
+        if not self._cached(function):
+            return None
+        result = self.cache.get(self._cache_key(function, self.encode_calldata(function, inputs)))
+        return None if result is None else self._decode(function, result)
+
+    def call(self, function, inputs):
+        calldata = self.encode_calldata(function, inputs)
+        if self._cached(function):
+            key = self._cache_key(function, calldata)
+            result = self.cache.get(key)
+            if result is not None:
+                return self._decode(function, result)
+
+        self.remote_calls += 1
+        with self._timed('call'):
+            result = self._call_remote(function, calldata)
+
+        if self._cached(function):
+            self.cache.put(key, result)
+        return self._decode(function, result)
+
+    def _post(self, url, function, body):
+        try:
+            response = self._session.post(url, data=body, timeout=self.timeout)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise StarkNetCallError(f'{function} failed: {e}') from e
+        if response.status_code != 200:
+            raise StarkNetCallError(f'{function} failed ({response.status_code}): {response.text}')
+        return response.json()
+
+    def _call_remote(self, function, calldata):
+        return self._post(self.url, function, self._request_body(function, calldata))['result']
+
+    async def call_async(self, function, inputs):
+        calldata = self.encode_calldata(function, inputs)
+        if self._cached(function):
+            key = self._cache_key(function, calldata)
+            result = self.cache.get(key)
+            if result is not None:
+                return self._decode(function, result)
+
+        self.remote_calls += 1
+        with self._timed('call'):
+            result = await self._call_remote_async(function, calldata)
+
+        if self._cached(function):
+            self.cache.put(key, result)
+        return self._decode(function, result)
+
+    async def _call_remote_async(self, function, calldata):
+        import aiohttp # only needed by asyncio callers
+
+        if self._async_session is None:
+            self._async_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        try:
+            async with self._async_session.post(self.url, data=self._request_body(function, calldata)) as response:
+                text = await response.text()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            raise StarkNetCallError(f'{function} failed: {e!r}') from e
+        if response.status != 200:
+            raise StarkNetCallError(f'{function} failed ({response.status}): {text}')
+        return json.loads(text)['result']
+
+    def invoke(self, function, inputs):
+        """
+        Send an @external function as an INVOKE_FUNCTION transaction, e.g. advance(n) of a stateful
+        contract; returns the gateway's answer (code, transaction_hash). The state changes once the
+        transaction is accepted, so readers poll get_state rather than wait on it here.
+        """
+        calldata = self.encode_calldata(function, inputs)
+        with self._timed('invoke'):
+            return self._invoke_remote(function, calldata)
+
+    def _invoke_remote(self, function, calldata):
+        return self._post(self.invoke_url, function, self._request_body(function, calldata, type='INVOKE_FUNCTION'))
+
+    def replay(self, state, dt_fp, n, function='query_next_given_coordinates'):
+        """
+        Up to n states following `state` = (t_fp, var_1, ..., var_k) that can be chained
+        from cached single-step results, without any remote call. Stops at the first miss.
+        """
+        states = []
+        while len(states) < n:
+            t_fp = state[0]
+            nxt = self.lookup(function, [t_fp, dt_fp] + list(state[1:]))
+            if nxt is None:
+                break
+            state = (t_fp + dt_fp,) + tuple(nxt)
+            states.append(state)
+        return states
+
+    def close(self):
+        self._session.close()
+
+    async def aclose(self):
+        self.close()
+        if self._async_session is not None:
+            await self._async_session.close()
+            self._async_session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
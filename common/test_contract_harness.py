@@ -0,0 +1,39 @@
+import os
+import pytest
+
+from contract_harness import deploy, load_contract_definition, source_hash, view
+
+CONTRACT = '''%lang starknet
+%builtins range_check
+
+const FACTOR = {factor}
+
+@view
+func twice (x : felt) -> (y : felt):
+    return (FACTOR*x)
+end
+'''
+
+
+@pytest.mark.asyncio
+async def test_recompiles_only_when_the_source_changes(tmp_path):
+    cairo_path = str(tmp_path / 'twice.cairo')
+    with open(cairo_path, 'w') as f:
+        f.write(CONTRACT.format(factor=2))
+
+    load_contract_definition(cairo_path)
+    compiled_path = str(tmp_path / 'twice_compiled.json')
+    with open(str(tmp_path / 'twice_compiled.sha256')) as f:
+        assert f.read().strip() == source_hash(cairo_path)
+    assert os.path.exists(str(tmp_path / 'twice_contract_abi.json'))
+
+    # up to date: the compiled file is reused as is
+    os.utime(compiled_path, (0, 0))
+    load_contract_definition(cairo_path)
+    assert os.path.getmtime(compiled_path) == 0
+
+    with open(cairo_path, 'w') as f:
+        f.write(CONTRACT.format(factor=3))
+    contract = await deploy(cairo_path)
+    assert os.path.getmtime(compiled_path) > 0
+    assert (await view(contract.twice(7))).result.y == 21
@@ -0,0 +1,72 @@
+from cycle import CycleDetector, CyclicSource
+
+
+def _orbit(x, n):
+    states = [(x, -x)]
+    for _ in range(n):
+        x = (x*x + 1) % 1009
+        states.append((x, -x))
+    return states
+
+
+def test_detector_finds_exact_period():
+    states = _orbit(3, 2000)
+    first_seen = {}
+    for i, s in enumerate(states):
+        if s in first_seen:
+            period = i - first_seen[s]
+            break
+        first_seen[s] = i
+
+    detector = CycleDetector()
+    for i, s in enumerate(states):
+        if detector.push(s):
+            break
+    assert detector.period == period
+    # the buffer holds the states following the current one, ending with it
+    assert [tuple(e) for e in detector.cycle.tolist()] == states[i+1:i+1+period]
+    assert detector.nbytes == period * 2 * 8
+
+
+def test_detector_gives_up_beyond_max_period():
+    detector = CycleDetector(max_period=4)
+    assert not any(detector.push((i,)) for i in range(100))
+    assert not detector.active and detector.cycle is None
+
+
+def test_source_plays_cycle_without_fetching():
+    class Fetcher:
+        stopped = False
+        def __init__(self):
+            self.states = iter([(i*10, s) for i, s in enumerate([7, 1, 2, 3, 1, 2, 3, 1])])
+        def get(self, timeout=None):
+            return next(self.states)
+        def stop(self):
+            self.stopped = True
+
+    fetcher = Fetcher()
+    source = CyclicSource(fetcher, dt_fp=10)
+    got, proven = [], []
+    for _ in range(12):
+        got.append(source.get())
+        proven.append(source.cycle_proven)
+    assert fetcher.stopped
+    assert proven.count(True) == 1 # reported once
+    assert got == [(i*10, s) for i, s in enumerate([7, 1, 2, 3, 1, 2, 3, 1, 2, 3, 1, 2])]
+    assert source.report().startswith('3-step cycle')
+
+
+def test_source_plays_cycle_as_samples_with_scale():
+    class Fetcher:
+        def __init__(self):
+            self.states = iter([(i*10, s) for i, s in enumerate([7, 1, 2, 1])])
+        def get(self, timeout=None):
+            return next(self.states)
+        def stop(self):
+            pass
+
+    source = CyclicSource(Fetcher(), dt_fp=10, scale=10)
+    got = [source.get() for _ in range(6)]
+    assert got == [(i*10, s) for i, s in enumerate([7, 1, 2, 1, 2, 1])]
+    # played from memory through a ring: float rows with no conversion per frame
+    assert got[-1].real.tolist() == [5.0, 0.1]
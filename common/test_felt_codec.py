@@ -0,0 +1,32 @@
+import numpy as np
+from felt_codec import from_felts, to_felts, to_fp, PRIME
+
+
+def test_int64_round_trip_matches_mod_p():
+    values = [0, 1, -1, -2, 12345, -654321, 2**63 - 1, -2**63]
+    felts = to_felts(np.array(values))
+    assert felts == [v % PRIME for v in values]
+
+    # ints (testing framework) and '0x' hex strings (gateway) decode alike, on the int64 path
+    for encoded in [felts, [hex(e) for e in felts]]:
+        decoded = from_felts(encoded)
+        assert decoded.dtype == np.int64
+        assert decoded.tolist() == values
+
+
+def test_values_beyond_int64_fall_back_to_objects():
+    values = [2**63, -2**63 - 1, 2**200, -(PRIME//2), 7]
+    felts = to_felts(values)
+    assert felts == [v % PRIME for v in values]
+    for encoded in [felts, [hex(e) for e in felts]]:
+        decoded = from_felts(encoded)
+        assert decoded.dtype == object
+        assert decoded.tolist() == values
+
+
+def test_reals_are_truncated_like_int():
+    reals = [1.5, -2.25, 0.00009, -0.00009, 150.]
+    assert to_fp(reals, 10000).tolist() == [int(v * 10000) for v in reals]
+    felts = to_felts(reals, scale=10000)
+    assert from_felts(felts, scale=10000).tolist() == [int(v * 10000) / 10000 for v in reals]
+    assert to_felts([]) == [] and from_felts([]).tolist() == []
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from fp_emulator import (FixedPoint, RangeCheckError, Real, SYSTEMS, dopri_step, integrate, integrate_adaptive,
+                         reference, to_flat_traj, PRIME)
+
+
+def test_truncation_matches_signed_div_rem():
+    fp = FixedPoint()
+    # signed_div_rem floors the signed value, so negative results round toward -inf
+    assert fp.mul_fp(np.array([-15000, 15000, 7]), 3).tolist() == [-5, 4, 0]
+    assert fp.div_fp_ul(np.array([-7, 7]), 2).tolist() == [-4, 3]
+    assert int(fp.div_fp(150 * 10000, 10 * 10000)) == 15 * 10000
+
+
+def test_range_check_and_felt_wrap():
+    fp = FixedPoint()
+    with pytest.raises(RangeCheckError):
+        fp.mul_fp(np.array([2**70]), 10000 * 2**10)
+
+    # a product beyond PRIME/2 wraps around like a felt before the division
+    wrapped = fp._mul(np.array([PRIME//2 + 1], dtype=object), 2)
+    assert wrapped.tolist() == [(2*(PRIME//2 + 1)) - PRIME]
+
+
+def test_ensemble_matches_single_runs():
+    ics = [[150*10000, -150*10000], [500*10000, 3], [200*10000, 10**15], [0, -7]]
+    traj = integrate('o2d', 200, ics, 20)
+    assert traj.shape == (21, 4, 2)
+    for i in range(2):
+        single = integrate('o2d', 200, [ic[i] for ic in ics], 20)
+        assert to_flat_traj(traj, ic=i) == to_flat_traj(single)
+
+
+def test_adaptive_step_beats_fixed_rk4_on_o2d():
+    # o2d is linear with the same stiffness along x and y: x'' = -22 x + 6900, y'' = -22 y + 8400
+    S = 10000
+    omega = np.sqrt(22)
+    def exact(t):
+        x_eq, y_eq = 6900/22, 8400/22
+        return x_eq + (150-x_eq)*np.cos(omega*t) + 500/omega*np.sin(omega*t), y_eq + (200-y_eq)*np.cos(omega*t)
+    def max_error(rows):
+        return max(max(abs(x/S - exact(t/S)[0]), abs(y/S - exact(t/S)[1])) for t, x, _, y, _ in rows)
+
+    ic = [150*S, 500*S, 200*S, 0]
+    fixed = integrate('o2d', 200, ic, 250)
+    fixed_rows = [(i*200,) + tuple(fixed[i, :, 0].tolist()) for i in range(1, 251)]
+
+    # run 10 accepted steps at a time until t = 5 s, as the contract loops do
+    rows, dt_fp, n_rejected = [], 200, 0
+    while not rows or rows[-1][0] < 5*S:
+        t_fp, state = (rows[-1][0], list(rows[-1][1:])) if rows else (0, ic)
+        batch, dt_fp, rejected = integrate_adaptive('o2d', dt_fp, state, 10, 10, t_fp=t_fp)
+        rows += batch
+        n_rejected += rejected
+    assert len(rows) + n_rejected < len(fixed_rows) // 2
+    assert max_error(rows) < max_error(fixed_rows)
+
+
+def test_rejected_adaptive_step_keeps_state():
+    fp = FixedPoint()
+    state = [np.array([150*10000]), np.array([500*10000])]
+    accepted, dt_nxt, err, state_nxt = dopri_step(fp, SYSTEMS['sho'], np.array([5000]), state, 10)
+    assert not accepted[0] and err[0] > 10
+    assert dt_nxt[0] < 5000 and [s.tolist() for s in state_nxt] == [s.tolist() for s in state]
+
+
+def test_symplectic_energy_error_stays_bounded():
+    # sho energy 5*xd^2 + 75*x^2 over ~100 periods: verlet's error oscillates without drifting away;
+    # yoshida4's is ten times smaller at the same dt, down where fixed-point rounding dominates
+    def energy_error(method):
+        traj = integrate('sho', 200, [100*10000, 0], 5000, method=method).astype(float) / 10000
+        energy = 5*traj[:, 1, 0]**2 + 75*traj[:, 0, 0]**2
+        rel = np.abs(energy - energy[0]) / energy[0]
+        return rel[:2500].max(), rel[2500:].max()
+
+    verlet_first, verlet_second = energy_error('verlet')
+    yoshida_first, yoshida_second = energy_error('yoshida4')
+    assert verlet_second < 1.1 * verlet_first < 0.01
+    assert max(yoshida_first, yoshida_second) < verlet_first / 10
+
+
+@pytest.mark.parametrize('system, state', [('sho', [100, 0]), ('o2d', [150, 500, 200, 0])])
+def test_finer_scale_shrinks_rounding_error(system, state):
+    # against the float run at the same dt only the fixed-point rounding is left; it shrinks with the scale
+    # (the bounds being those RK4CairoBuilder derives for 10**4, 10**8 and 2**32)
+    def rounding_error(scale, bound):
+        dt_fp = int(0.002 * scale)
+        traj = integrate(system, dt_fp, [v*scale for v in state], 500, fp=FixedPoint(scale, bound))
+        reference = integrate(system, dt_fp / scale, state, 500, fp=Real())
+        return np.abs(traj.astype(float) / scale - reference).max()
+
+    coarse = rounding_error(10**4, 2**64)
+    fine = rounding_error(10**8, 2**77)
+    assert fine < coarse / 1000
+    assert rounding_error(2**32, 2**82) < fine
+
+
+def test_reference_is_exact():
+    # sho: x = 100 cos(sqrt(15) t); the float rk4 at a small dt agrees with it closely
+    exact = reference('sho', 0.01, [100, 0], 500)
+    t = 0.01 * np.arange(501)
+    assert np.abs(exact[:, 0, 0] - 100*np.cos(np.sqrt(15)*t)).max() < 1e-9
+    assert np.abs(integrate('sho', 0.01, [100, 0], 500, fp=Real()) - exact).max() < 1e-3
@@ -0,0 +1,67 @@
+import pytest
+
+from frame_scheduler import FrameScheduler
+from metrics import Metrics
+
+
+class _Clock:
+    """ pygame.time.Clock stand-in: every frame takes `frame_s` of fake wall time unless told otherwise """
+
+    def __init__(self, frame_s):
+        self.now = 0.0
+        self.frame_s = frame_s
+        self.extra = 0.0
+
+    def tick(self, framerate):
+        self.now += self.frame_s + self.extra
+        self.extra = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _scheduler(speed=1, metrics=None):
+    clock = _Clock(0.02)
+    # 2 s of wall time per simulated second, 50 frames per second
+    return FrameScheduler(2.0, frame_rate=50, speed=speed, clock=clock, metrics=metrics, timer=clock), clock
+
+
+def test_wall_time_maps_to_simulated_time():
+    scheduler, clock = _scheduler()
+    scheduler.start(10.0)
+    times = [scheduler.frame() for _ in range(5)]
+    assert times == pytest.approx([10.01, 10.02, 10.03, 10.04, 10.05])
+
+    # a slow frame does not slow the motion: the frames it took the place of are skipped
+    clock.extra = 0.06
+    assert scheduler.frame() == pytest.approx(10.09)
+    assert scheduler.skipped == 3 and scheduler.frames == 6
+    assert scheduler.stats()['max_s'] == pytest.approx(0.08)
+
+
+def test_speed_changes_keep_simulated_time_continuous():
+    metrics = Metrics(clock=lambda: 0.0)
+    scheduler, clock = _scheduler(metrics=metrics)
+    scheduler.start(0.0)
+    scheduler.frame()
+    assert scheduler.faster() == 2
+    assert scheduler.frame() == pytest.approx(0.01 + 0.02)
+    scheduler.set_speed(16)
+    assert scheduler.faster() == 16
+    assert scheduler.slower() == 8
+    with pytest.raises(ValueError):
+        scheduler.set_speed(32)
+    assert metrics.snapshot()['histograms']['frame']['count'] == 1
+
+
+def test_hold_waits_for_late_states():
+    scheduler, clock = _scheduler(speed=4)
+    scheduler.start(0.0)
+    assert scheduler.frame() == pytest.approx(0.04)
+    # the state after t = 0.02 is late: simulated time stops there and resumes from it
+    scheduler.hold(0.02)
+    assert scheduler.frame() == pytest.approx(0.06)
+    scheduler.hold(0.02)
+    scheduler.hold(0.02)
+    assert scheduler.frame() == pytest.approx(0.06)
+    assert '3 frames, 0 skipped at 4x' in scheduler.report()
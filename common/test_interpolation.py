@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from fp_emulator import Real, integrate
+from interpolation import HermiteInterpolator, hermite
+
+
+def test_hermite_ends_and_cubics():
+    # positions and slopes match at both ends; a cubic is reproduced exactly
+    f = lambda t: 2*t**3 - t**2 + 3*t - 1
+    df = lambda t: 6*t**2 - 2*t + 3
+    t0, t1 = 0.5, 2.0
+    h = t1 - t0
+    for s in np.linspace(0, 1, 7):
+        assert hermite(f(t0), df(t0), f(t1), df(t1), h, s) == pytest.approx(f(t0 + s*h))
+
+
+def test_coarse_steps_interpolate_the_fine_trajectory():
+    # sho in real units: rk4 with dt = 0.1 (five times the GUI's), interpolated at dt = 0.02
+    fine = integrate('sho', 0.02, [100.0, 0.0], 100, fp=Real())[:, :, 0]
+    coarse = integrate('sho', 0.1, [100.0, 0.0], 20, fp=Real())[:, :, 0]
+    interpolator = HermiteInterpolator(positions=[1], velocities=[2])
+    interpolator.push([0.0, *coarse[0]])
+    errors, linear_errors = [], []
+    for i in range(1, 21):
+        interpolator.push([0.1*i, *coarse[i]])
+        for k in range(5):
+            t = 0.1*(i-1) + 0.02*k
+            (x,) = interpolator.at(t)
+            errors.append(abs(x - fine[5*(i-1) + k, 0]))
+            linear = coarse[i-1, 0] + (coarse[i, 0] - coarse[i-1, 0]) * k / 5
+            linear_errors.append(abs(linear - fine[5*(i-1) + k, 0]))
+    # amplitude 100, i.e. 100 px: the spline stays within a fraction of a pixel (mostly the coarse
+    # step's own error, seen at the states themselves), chords do not
+    knot_errors = np.abs(coarse[:, 0] - fine[::5, 0])
+    assert max(errors) < knot_errors.max() + 0.01 < 0.2
+    assert max(linear_errors) > 10 * max(errors)
+
+
+def test_clamps_and_copies():
+    interpolator = HermiteInterpolator(positions=[1, 3], velocities=[2, 4])
+    state = np.array([0.0, 1.0, 0.0, 2.0, 0.0])
+    interpolator.push(state)
+    assert interpolator.at(5.0).tolist() == [1.0, 2.0] # one state: stays there
+    state[:] = [1.0, 3.0, 0.0, 4.0, 0.0] # the ring reusing the slot
+    interpolator.push(state)
+    assert (interpolator.t0, interpolator.t1) == (0.0, 1.0)
+    assert interpolator.at(-1.0).tolist() == [1.0, 2.0]
+    assert interpolator.at(2.0).tolist() == [3.0, 4.0]
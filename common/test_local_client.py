@@ -0,0 +1,72 @@
+import asyncio
+import os
+import pytest
+
+from fp_emulator import integrate
+from local_client import LocalClient, _StorageSysCallHandler
+from starknet_client import StarkNetCallError
+from trajectory_cache import TrajectoryCache
+
+COMPILED_PATH = os.path.join(os.path.dirname(__file__), '../simple-harmonic-oscillator/sho_compiled.json')
+ABI_PATH = os.path.join(os.path.dirname(__file__), '../simple-harmonic-oscillator/sho_contract_abi.json')
+
+DT_FP = 200
+STATE_0 = [1000000, -250000]
+
+
+@pytest.fixture(scope='module')
+def client():
+    return LocalClient(COMPILED_PATH, ABI_PATH, cache=TrajectoryCache(), constructor_inputs=[0, DT_FP] + STATE_0)
+
+
+def test_views_match_the_emulator(client):
+    # the emulator is checked against the deployed contract by test_sho; so is the local VM here
+    traj = integrate('sho', DT_FP, STATE_0, 3)
+    ret = client.call('query_next_given_coordinates', [0, DT_FP] + STATE_0)
+    assert [ret.x_nxt, ret.xd_nxt] == traj[1, :, 0].tolist()
+
+    ret = client.call('query_n_steps', [0, DT_FP] + STATE_0 + [3])
+    assert ret.traj == traj[1:, :, 0].reshape(-1).tolist()
+
+    # results are kept as the gateway would return them, so the cache and replay work unchanged
+    remote_calls = client.remote_calls
+    assert client.replay((0,) + tuple(STATE_0), DT_FP, 5) == [(DT_FP, *traj[1, :, 0].tolist())]
+    assert client.remote_calls == remote_calls
+
+
+def test_invoke_moves_the_stored_state(client):
+    assert tuple(client.call('get_state', [])) == (0, DT_FP, *STATE_0)
+    assert client.invoke('advance', [2])['code'] == 'TRANSACTION_ACCEPTED'
+    traj = integrate('sho', DT_FP, STATE_0, 2)
+    assert tuple(client.call('get_state', [])) == (2*DT_FP, DT_FP, *traj[2, :, 0].tolist())
+
+
+def test_failed_invoke_leaves_storage_alone():
+    client = LocalClient(COMPILED_PATH, constructor_inputs=[0, DT_FP] + STATE_0, max_steps=5000)
+    with pytest.raises(StarkNetCallError):
+        client.invoke('advance', [100])
+    assert tuple(client.call('get_state', [])) == (0, DT_FP, *STATE_0)
+
+
+def test_unsupported_syscalls_raise_the_client_error():
+    with pytest.raises(StarkNetCallError, match='call_contract'):
+        _StorageSysCallHandler()._call_contract(None, None)
+
+
+@pytest.mark.asyncio
+async def test_async_calls_leave_the_event_loop_free(client):
+    # while two VM runs are on their way, a task scheduled next to them keeps running
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    rets = await asyncio.gather(*[
+        client.call_async('query_n_steps', [0, DT_FP] + STATE_0 + [n]) for n in (6, 7)
+    ])
+    task.cancel()
+    assert [len(ret.traj) for ret in rets] == [12, 14]
+    assert ticks > 10
@@ -0,0 +1,95 @@
+import io
+import json
+
+from metrics import LatencyHistogram, Metrics, JsonLinesExporter, PrometheusExporter, SampledLogger, summary
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_histogram_quantiles_within_a_bucket():
+    h = LatencyHistogram()
+    assert h.quantile(0.5) is None
+    for ms in range(1, 101):
+        h.observe(ms * 1e-3)
+    # upper bucket edges: at most ~12% high, never below the exact quantile nor above the max
+    for q, exact in [(0.5, 0.050), (0.95, 0.095), (0.99, 0.099)]:
+        assert exact <= h.quantile(q) <= exact * 1.13
+    assert h.quantile(1.0) == h.max == 0.1
+    assert h.count == 100
+
+
+def test_snapshot_windows_and_rates():
+    clock = _Clock()
+    metrics = Metrics(clock=clock)
+    with metrics.time('render'):
+        clock.now += 0.02
+    metrics.count('steps', 100)
+    metrics.set_gauge('queue_depth', 7)
+    clock.now = 2.0
+    snap = metrics.snapshot()
+    assert snap['histograms']['render']['window_count'] == 1
+    assert abs(snap['histograms']['render']['max_s'] - 0.02) < 1e-12
+    assert snap['counters'] == {'steps' : 100, 'steps_per_s' : 50.0}
+    assert snap['gauges'] == {'queue_depth' : 7}
+
+    # the next window starts empty; the running totals carry on
+    metrics.count('steps', 10)
+    clock.now = 3.0
+    snap = metrics.snapshot()
+    assert snap['histograms']['render']['window_count'] == 0
+    assert snap['histograms']['render']['count'] == 1
+    assert snap['counters'] == {'steps' : 110, 'steps_per_s' : 10.0}
+    assert 'steps_per_s 10.0' in summary(snap)
+
+
+def test_tick_exports_once_per_interval(tmp_path):
+    clock = _Clock()
+    path = tmp_path / 'metrics.jsonl'
+    metrics = Metrics([JsonLinesExporter(str(path))], interval=10, clock=clock)
+    for second in range(25):
+        clock.now = second
+        metrics.count('frames')
+        metrics.tick()
+    metrics.close()
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line['time'] for line in lines] == [10, 20, 24]
+    assert lines[-1]['counters']['frames'] == 25
+
+
+def test_prometheus_text(tmp_path):
+    clock = _Clock()
+    path = tmp_path / 'rk4.prom'
+    metrics = Metrics([PrometheusExporter(str(path))], clock=clock)
+    metrics.observe('call', 0.5)
+    metrics.count('steps', 4)
+    clock.now = 2.0
+    metrics.export()
+    text = path.read_text()
+    assert '# TYPE rk4_call_seconds summary\n' in text
+    assert 'rk4_call_seconds_count 1\n' in text
+    assert 'rk4_call_seconds_sum 0.5\n' in text
+    assert 'rk4_steps_total 4\n' in text
+    assert 'rk4_steps_per_second 2.0\n' in text
+    assert not (tmp_path / 'rk4.prom.tmp').exists()
+
+
+def test_sampled_logger():
+    clock, stream = _Clock(), io.StringIO()
+    log = SampledLogger(interval=5, stream=stream, clock=clock)
+    for second in range(12):
+        clock.now = second
+        log.log('> fetched', key='fetch')
+    # other keys are sampled on their own
+    log.log('> advance', key='advance')
+    assert stream.getvalue().splitlines() == [
+        '> fetched',
+        '> fetched (4 similar lines skipped)',
+        '> fetched (4 similar lines skipped)',
+        '> advance'
+    ]
@@ -0,0 +1,34 @@
+import time
+import pytest
+from pipeline import TrajectoryFetcher
+
+
+def test_fetcher_streams_states_in_order():
+    calls = []
+
+    def fetch_batch(state, n):
+        calls.append(n)
+        time.sleep(0.01) # pretend to be the network
+        return [(state[0] + i + 1,) for i in range(n)]
+
+    fetcher = TrajectoryFetcher(fetch_batch, (0,), batch_size=8, first_batch_size=2, max_queued=4)
+    fetcher.start()
+    # samples are views into the ring, valid until the next get(): keep copies
+    states = [tuple(fetcher.get(timeout=1)) for _ in range(20)]
+    fetcher.stop()
+    fetcher.join(timeout=1)
+
+    assert states == [(i+1,) for i in range(20)]
+    assert calls[:3] == [2, 4, 8] # small first batch, then doubling up to batch_size
+    assert not fetcher.is_alive()
+
+
+def test_fetcher_reraises_producer_error():
+    def fetch_batch(state, n):
+        raise RuntimeError('gateway down')
+
+    fetcher = TrajectoryFetcher(fetch_batch, (0,), batch_size=4)
+    fetcher.start()
+    fetcher.join(timeout=1)
+    with pytest.raises(RuntimeError, match='gateway down'):
+        fetcher.get(timeout=0.01)
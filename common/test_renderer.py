@@ -0,0 +1,62 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy') # headless
+import pygame
+import pytest
+
+from renderer import SceneRenderer
+from ring_buffer import StateRing
+
+BG_COLOR = (25, 25, 112)
+BALL_COLOR = (239, 231, 200)
+
+
+@pytest.fixture
+def renderer():
+    pygame.init()
+    screen = pygame.display.set_mode( (200, 100) )
+    background = pygame.Surface( (200, 100) )
+    background.fill( BG_COLOR )
+    yield SceneRenderer(screen, background)
+    pygame.quit()
+
+
+def _frame(renderer, sample):
+    # what the GUIs do per frame: positions straight from the float view of the ring
+    renderer.begin_frame()
+    renderer.draw_spring((0, 50), (sample.real[1] - 10, 50), 5, 4, BALL_COLOR)
+    renderer.draw_ball((sample.real[1], 50), 10, BALL_COLOR)
+    renderer.end_frame()
+
+
+def test_frames_follow_the_samples(renderer):
+    ring = StateRing(4, 3, scale=100)
+    ring.put([(0, 5000, 0), (1, 15000, 0)])
+    screen = renderer.screen
+
+    _frame(renderer, ring.get())
+    assert screen.get_at((50, 50))[:3] == BALL_COLOR
+    assert screen.get_at((150, 50))[:3] == BG_COLOR
+
+    # the next frame restores the background under the previous one before drawing
+    _frame(renderer, ring.get())
+    assert screen.get_at((150, 50))[:3] == BALL_COLOR
+    assert screen.get_at((50, 50))[:3] == BG_COLOR
+    assert screen.get_at((170, 50))[:3] == BG_COLOR
+
+
+def test_message_survives_frames_over_it(renderer):
+    pygame.font.init()
+    renderer.set_message('hi', None, 24, (255, 255, 255), (100, 50))
+    message_rect = renderer._message[1]
+    before = [renderer.screen.get_at(p) for p in _points(message_rect)]
+
+    ring = StateRing(2, 3, scale=1)
+    ring.put([(0, 100, 0)])
+    _frame(renderer, ring.get())
+    renderer.begin_frame() # the ball goes away again
+    renderer.end_frame()
+    assert [renderer.screen.get_at(p) for p in _points(message_rect)] == before
+
+
+def _points(rect):
+    return [(x, y) for x in range(rect.left, rect.right, 3) for y in range(rect.top, rect.bottom, 3)]
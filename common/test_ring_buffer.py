@@ -0,0 +1,68 @@
+import threading
+import pytest
+from ring_buffer import StateRing
+
+
+def test_fifo_across_wraparound():
+    ring = StateRing(4, 2, scale=100)
+    got = []
+    for i in range(0, 30, 3):
+        batch = [(j, -j) for j in range(i, i+3)]
+        assert ring.put(batch) == 3
+        got += [tuple(ring.get()) for _ in range(3)]
+    assert got == [(j, -j) for j in range(30)]
+    assert ring.get(timeout=0) is None
+
+
+def test_sample_views_and_real_units():
+    ring = StateRing(3, 3, scale=10000)
+    ring.put([(200, 1000000, -5000)])
+    sample = ring.get()
+    t_fp, x_fp, xd_fp = sample
+    assert (t_fp, x_fp, xd_fp) == (200, 1000000, -5000) and type(x_fp) is int
+    assert sample[1:] == (1000000, -5000)
+    assert sample.real.tolist() == [0.02, 100.0, -0.5]
+    # zero-copy: both rows are views into the ring's preallocated arrays
+    assert sample.fp.base is not None and sample.real.base is not None
+    assert not hasattr(sample, '__dict__')
+
+
+def test_held_sample_is_not_overwritten():
+    ring = StateRing(2, 1)
+    ring.put([(1,), (2,)])
+    sample = ring.get()
+    # one slot free for the producer; the slot of `sample` stays untouched until the next get()
+    assert ring.put([(3,), (4,)], timeout=0) == 0
+    assert ring.get() == (2,)
+    assert sample == (1,)
+    # released once the next sample is out: the producer writes over it
+    assert ring.put([(3,), (4,)], timeout=0) == 1
+    assert sample == (3,)
+
+
+def test_memory_is_flat():
+    ring = StateRing(64, 5, scale=10000)
+    nbytes = ring.nbytes
+    assert nbytes == 64 * 5 * (8 + 8)
+
+    def produce():
+        states = [(i, i, -i, 2*i, -2*i) for i in range(100000)]
+        while states:
+            states = states[ring.put(states[:1000], timeout=1):]
+    producer = threading.Thread(target=produce)
+    producer.start()
+    for i in range(100000):
+        assert ring.get(timeout=1)[2] == -i
+    producer.join()
+    assert ring.nbytes == nbytes and len(ring) == 0
+
+
+def test_object_dtype_beyond_int64():
+    ring = StateRing(2, 2, scale=2**64, dtype=object)
+    ring.put([(2**70, -2**65)])
+    assert ring.get().real.tolist() == [64.0, -2.0]
+
+
+def test_capacity():
+    with pytest.raises(ValueError):
+        StateRing(1, 2)
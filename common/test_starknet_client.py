@@ -0,0 +1,100 @@
+import os
+import json
+import socket
+import pytest
+from starknet_client import StarkNetCallError, StarkNetClient, get_selector_from_name, pack_ensemble, unpack_ensemble, PRIME
+
+ABI_PATH = os.path.join(os.path.dirname(__file__), '../oscillator-2d/o2d_contract_abi.json')
+
+
+def test_selector():
+    # selector of `query_next_given_coordinates` as computed by starkware.starknet.public.abi
+    assert get_selector_from_name('query_next_given_coordinates') == \
+        0x2f258aeebbb56cd3b59937925733d1125e24bd041aba71b7811cb25764a9b28
+
+
+def test_encode_decode():
+    client = StarkNetClient('0x1', ABI_PATH)
+
+    # negative inputs are sent mod P; the n argument closes the input list
+    calldata = client.encode_calldata('query_n_steps', [0, 200, -5, 1, 2, 3, 2])
+    assert calldata == [0, 200, PRIME-5, 1, 2, 3, 2]
+
+    # array output is preceded by its length; felts above P/2 come back negative
+    result = [hex(8)] + [hex(e % PRIME) for e in [1, -2, 3, 4, 5, 6, 7, -8]]
+    ret = client.decode_result('query_n_steps', result)
+    assert ret.traj == [1, -2, 3, 4, 5, 6, 7, -8]
+
+    result = [hex(e % PRIME) for e in [10, -20, 30, -40]]
+    ret = client.decode_result('query_next_given_coordinates', result)
+    assert (ret.x_nxt, ret.xd_nxt, ret.y_nxt, ret.yd_nxt) == (10, -20, 30, -40)
+    client.close()
+
+
+def test_ensemble_layout():
+    states = [(1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12)]
+    flat = pack_ensemble(states)
+    assert flat == [1, 5, 9, 2, 6, 10, 3, 7, 11, 4, 8, 12]
+    assert unpack_ensemble(flat, 4) == states
+
+
+class _Response:
+    status_code = 200
+    def __init__(self, body):
+        self.body = body
+    def json(self):
+        return self.body
+
+
+def test_stored_state_is_never_cached_and_advance_is_a_transaction():
+    cache = {}
+    class Cache:
+        get = cache.get
+        put = cache.__setitem__
+
+    client = StarkNetClient('0x1', ABI_PATH, cache=Cache(), gateway_url='http://gw')
+    posts = []
+    def post(url, data, timeout):
+        posts.append((url, json.loads(data)))
+        if url.endswith('/add_transaction'):
+            return _Response({'code' : 'TRANSACTION_RECEIVED', 'transaction_hash' : '0x2'})
+        return _Response({'result' : [hex(e % PRIME) for e in [len(posts), 200, 1, -2, 3, -4]]})
+    client._session.post = post
+
+    # two polls of the same (empty) calldata must both reach the contract
+    assert client.call('get_state', []).t == 1
+    assert client.call('get_state', []).t == 2
+    assert client.lookup('get_state', []) is None and not cache
+
+    assert client.invoke('advance', [10])['transaction_hash'] == '0x2'
+    url, body = posts[-1]
+    assert url == 'http://gw/add_transaction'
+    assert body['type'] == 'INVOKE_FUNCTION' and body['calldata'] == ['10']
+    assert body['entry_point_selector'] == hex(get_selector_from_name('advance'))
+    client.close()
+
+
+@pytest.fixture
+def stalled_gateway():
+    # accepts connections (into the backlog) and never answers
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(4)
+        yield 'http://127.0.0.1:%d' % server.getsockname()[1]
+
+
+def test_stalled_gateway_fails_the_call(stalled_gateway):
+    client = StarkNetClient('0x1', ABI_PATH, feeder_gateway_url=stalled_gateway, gateway_url=stalled_gateway, timeout=0.2)
+    with pytest.raises(StarkNetCallError, match='get_state'):
+        client.call('get_state', [])
+    with pytest.raises(StarkNetCallError, match='advance'):
+        client.invoke('advance', [1])
+    client.close()
+
+
+@pytest.mark.asyncio
+async def test_stalled_gateway_fails_the_async_call(stalled_gateway):
+    client = StarkNetClient('0x1', ABI_PATH, feeder_gateway_url=stalled_gateway, timeout=0.2)
+    with pytest.raises(StarkNetCallError, match='get_state'):
+        await client.call_async('get_state', [])
+    await client.aclose()
@@ -0,0 +1,47 @@
+import os
+from trajectory_cache import TrajectoryCache, make_key, PRIME
+from starknet_client import StarkNetClient
+
+ABI_PATH = os.path.join(os.path.dirname(__file__), '../oscillator-2d/o2d_contract_abi.json')
+
+
+def test_lru_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = TrajectoryCache(path, max_entries=2)
+    keys = [make_key('h', 'f', [i, -i]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, [hex(i)])
+        cache.get(keys[0]) # keep the first entry hot
+    assert len(cache) == 2
+    assert keys[0] in cache._entries and keys[1] not in cache._entries
+
+    # evicted entries still come back from disk, as do all entries after a restart
+    assert cache.get(keys[1]) == [hex(1)]
+    cache.close()
+    cache = TrajectoryCache(path, max_entries=2)
+    assert [cache.get(key) for key in keys] == [[hex(0)], [hex(1)], [hex(2)]]
+    assert cache.get(make_key('h', 'f', [3, -3])) is None
+    cache.close()
+
+
+def test_calldata_is_keyed_mod_p():
+    assert make_key('h', 'f', [-1]) == make_key('h', 'f', [PRIME-1])
+    assert make_key('h', 'f', [1]) != make_key('h', 'g', [1])
+    assert make_key('h', 'f', [1]) != make_key('other', 'f', [1])
+
+
+def test_replay_recorded_trajectory():
+    cache = TrajectoryCache()
+    client = StarkNetClient('0x1', ABI_PATH, cache=cache)
+
+    dt_fp = 200
+    states = [(i*dt_fp, 10*i, -i, 5*i, 0) for i in range(6)]
+    assert cache.record_trajectory(client.contract_hash, dt_fp, states) == 5
+
+    # the whole orbit comes back from the cache; replay stops where the record ends
+    assert client.replay(states[0], dt_fp, 5) == states[1:]
+    assert client.replay(states[3], dt_fp, 10) == states[4:]
+    ret = client.call('query_next_given_coordinates', [0, dt_fp, 0, 0, 0, 0])
+    assert (ret.x_nxt, ret.xd_nxt, ret.y_nxt, ret.yd_nxt) == (10, -1, 5, 0)
+    assert client.remote_calls == 0
+    client.close()
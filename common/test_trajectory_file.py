@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pytest
+from fp_emulator import integrate
+from trajectory_file import TrajectoryReader, TrajectoryWriter, decode_chunk, encode_chunk
+
+
+def _o2d_states(n, dt_fp=200):
+    traj = integrate('o2d', dt_fp, [1500000, 1000000, 2500000, 500000], n)
+    return [(i*dt_fp,) + tuple(traj[i, :, 0].tolist()) for i in range(n+1)]
+
+
+def test_round_trip_and_seek(tmp_path):
+    states = _o2d_states(1000)
+    path = str(tmp_path / 'o2d.rk4t')
+    with TrajectoryWriter(path, 'o2d', 10000, 200, states[0], fields=['t', 'x', 'xd', 'y', 'yd'], checkpoint_every=64) as writer:
+        writer.extend(states[1:])
+    # delta/varint chunks take a fraction of the 8 bytes per value of an int64 array
+    assert os.path.getsize(path) < len(states) * 5 * 8 / 2
+
+    with TrajectoryReader(path) as reader:
+        assert len(reader) == len(states) and reader.n_chunks == 16
+        assert reader.header['contract'] == 'o2d' and reader.scale == 10000
+        assert reader.array().tolist() == [list(s) for s in states]
+        assert reader[-1] == states[-1] and reader[700] == states[700]
+        assert reader[130:140].tolist() == [list(s) for s in states[130:140]]
+        # by simulated time: the last state at or before it
+        assert reader.index_at(200*77 + 199) == 77
+        assert reader.at_time(-5) == states[0] and reader.at_time(10**9) == states[-1]
+
+
+def test_varying_dt_and_unfinished_file(tmp_path):
+    # adaptive runs record no dt: seeking bisects the checkpoint times; a writer that never got to close
+    # (killed GUI) leaves its full chunks readable, indexed from the chunk headers
+    ts = np.cumsum([0] + [100 + (i % 7) * 13 for i in range(299)])
+    states = [(int(t), i, -i) for i, t in enumerate(ts)]
+    path = str(tmp_path / 'adaptive.rk4t')
+    writer = TrajectoryWriter(path, 'sho', 10000, None, states[0], checkpoint_every=32, function='query_n_adaptive')
+    writer.extend(states[1:])
+    writer._file.flush()
+
+    with TrajectoryReader(path) as reader:
+        assert len(reader) == 288 # 9 full chunks
+        for i in [0, 31, 32, 100, 287]:
+            assert reader.index_at(states[i][0]) == i
+            assert reader.index_at(states[i][0] + 1) == i
+    writer.close()
+    with TrajectoryReader(path) as reader:
+        assert len(reader) == 300 and reader[299] == states[299]
+
+
+def test_values_beyond_int64():
+    states = [(0, 2**70, -3), (1, 2**70 + 5, -2**66)]
+    chunk = encode_chunk(states)
+    body = np.frombuffer(chunk[2:], dtype=np.uint8)
+    assert decode_chunk(body, 2, 3).tolist() == [list(s) for s in states]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / 'x.rk4t'
+    path.write_bytes(b'not a trajectory')
+    with pytest.raises(ValueError):
+        TrajectoryReader(str(path))
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+## content-addressed cache for contract calls: the contracts are pure views, so
+## a result is fully determined by (contract hash, function, calldata); entries
+## live in an in-memory LRU and, optionally, in an sqlite file that survives restarts
+
+PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
+
+
+def make_key(contract_hash, function, calldata):
+    # calldata is taken mod P, exactly as it goes over the wire
+    blob = json.dumps([contract_hash, function, [e % PRIME for e in calldata]], separators=(',', ':'))
+    return hashlib.sha256(blob.encode('ascii')).hexdigest()
+
+
+class TrajectoryCache:
+    """
+    Maps make_key(...) -> raw call result (the gateway's list of hex felts).
+
+    At most `max_entries` results are held in memory, least recently used first out.
+    With `path` set, every result is also written to an sqlite file and memory misses
+    fall through to it. Safe to share between the GUI and its fetcher thread.
+    """
+
+    def __init__(self, path=None, max_entries=65536):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._db = None
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT)')
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key, result):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+            result = None
+            if self._db is not None:
+                row = self._db.execute('SELECT result FROM results WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, key, result):
+        self.put_many([(key, result)])
+
+    def put_many(self, items):
+        items = [(key, list(result)) for key, result in items]
+        with self._lock:
+            for key, result in items:
+                self._remember(key, result)
+            if self._db is not None:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?)',
+                    [(key, json.dumps(result)) for key, result in items]
+                )
+                self._db.commit()
+
+    def record_trajectory(self, contract_hash, dt_fp, states, function='query_next_given_coordinates'):
+        """
+        Warm the cache from a known trajectory: `states` is a list of consecutive
+        (t_fp, var_1, ..., var_k) tuples spaced dt_fp apart, and each pair becomes the
+        single-step entry function(t, dt, vars) -> next vars.
+        """
+        items = []
+        for cur, nxt in zip(states[:-1], states[1:]):
+            calldata = [cur[0], dt_fp] + list(cur[1:])
+            items.append((
+                make_key(contract_hash, function, calldata),
+                [hex(e % PRIME) for e in nxt[1:]]
+            ))
+        self.put_many(items)
+        return len(items)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,261 @@
+import mmap
+import json
+import struct
+
+import numpy as np
+
+## compact binary recordings of trajectories (.rk4t), written by the GUIs (--record) and the contract
+## tests (RK4_RECORD_DIR), replayed by the GUIs (--replay) and read by the notebooks
+##
+## layout (little-endian):
+##   MAGIC, u32 header length, header as json: contract, function, scale, dt_fp (None for adaptive runs),
+##     fields (names of the state components, t first), initial state, checkpoint_every (k) and any metadata
+##   chunks of up to k states: varint state count, varint byte length, then the states as zigzag varints,
+##     the first one in full (the checkpoint), every other one as its difference from the one before
+##   footer, once the writer is closed: u64 offset and i64 t of every chunk, u64 chunk count, u64 state count,
+##     INDEX_MAGIC
+##
+## state i is in chunk i // k, so seeking to a step or (fixed dt) to a simulated time reads the index entry and
+## decodes at most k states; with varying dt the chunk is found by bisecting the checkpoint times. A file whose
+## writer did not get to close it (killed GUI) has no footer: the reader rebuilds the index from the chunk headers.
+## Readers map the file, and the index and chunk bytes are numpy views of the mapping, decoded a chunk at a time
+
+MAGIC = b'RK4TRAJ\x01'
+INDEX_MAGIC = b'RK4TIDX\x01'
+CHECKPOINT_EVERY = 256
+
+
+def _zigzag(v):
+    return v << 1 if v >= 0 else ((-v) << 1) - 1
+
+
+def _encode_varint(z, out):
+    while z >= 0x80:
+        out.append((z & 0x7f) | 0x80)
+        z >>= 7
+    out.append(z)
+
+
+def _decode_varint(buf, pos):
+    z = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        z |= (b & 0x7f) << shift
+        if b < 0x80:
+            return z, pos
+        shift += 7
+
+
+def encode_chunk(states):
+    """ Bytes of one chunk: count, length, then the first state in full and the deltas of the others """
+    body = bytearray()
+    previous = [0] * len(states[0])
+    for state in states:
+        for v, p in zip(state, previous):
+            _encode_varint(_zigzag(int(v) - p), body)
+        previous = [int(v) for v in state]
+    head = bytearray()
+    _encode_varint(len(states), head)
+    _encode_varint(len(body), head)
+    return bytes(head + body)
+
+
+def decode_chunk(body, n_states, n_vars):
+    """
+    States of a chunk body (a uint8 array) as an (n_states, n_vars) array: int64, decoded vectorized,
+    or Python ints (dtype object) when a value needs more than 63 bits.
+    """
+    ends = np.flatnonzero(body < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    if len(ends) != n_states * n_vars:
+        raise ValueError(f'corrupt chunk: {len(ends)} varints for {n_states} states of {n_vars}')
+    if len(ends) and (ends - starts).max() < 9:
+        # varints of up to 9 bytes (63 bits): add up the 7-bit groups at their shifts, then undo zigzag and deltas
+        position = np.arange(len(body)) - np.repeat(starts, ends - starts + 1)
+        groups = (body & 0x7f).astype(np.uint64) << (7 * position).astype(np.uint64)
+        z = np.add.reduceat(groups, starts)
+        deltas = (z >> np.uint64(1)).astype(np.int64) ^ -(z & np.uint64(1)).astype(np.int64)
+        return np.cumsum(deltas.reshape(n_states, n_vars), axis=0)
+
+    body, values, pos = bytes(body), [], 0
+    for _ in range(n_states * n_vars):
+        z, pos = _decode_varint(body, pos)
+        values.append((z >> 1) ^ -(z & 1))
+    return np.cumsum(np.array(values, dtype=object).reshape(n_states, n_vars), axis=0)
+
+
+class TrajectoryWriter:
+    """
+    Appends states (tuples of ints, t first, as the GUIs get them) to a new .rk4t file, one chunk of
+    `checkpoint_every` states at a time; the index is written by close(). `initial` is the first state,
+    recorded as such. Usable as a context manager.
+    """
+
+    def __init__(self, path, contract, scale, dt_fp, initial, fields=None, function='query_n_steps',
+                 checkpoint_every=CHECKPOINT_EVERY, **metadata):
+        self.checkpoint_every = checkpoint_every
+        self.n_vars = len(initial)
+        self.header = {
+            'contract' : contract,
+            'function' : function,
+            'scale' : scale,
+            'dt_fp' : dt_fp,
+            'fields' : list(fields) if fields is not None else ['t'] + [f'q{i}' for i in range(1, self.n_vars)],
+            'initial' : [int(v) for v in initial],
+            'checkpoint_every' : checkpoint_every,
+            **metadata
+        }
+        header = json.dumps(self.header).encode()
+        self._file = open(path, 'wb')
+        self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._offsets = []
+        self._times = []
+        self._pending = []
+        self.n_states = 0
+        self.append(initial)
+
+    def append(self, state):
+        if len(state) != self.n_vars:
+            raise ValueError(f'state of {len(state)} values in a trajectory of {self.n_vars}')
+        self._pending.append(tuple(int(v) for v in state))
+        self.n_states += 1
+        if len(self._pending) == self.checkpoint_every:
+            self._write_chunk()
+
+    def extend(self, states):
+        for state in states:
+            self.append(state)
+
+    def _write_chunk(self):
+        self._offsets.append(self._file.tell())
+        self._times.append(self._pending[0][0])
+        self._file.write(encode_chunk(self._pending))
+        self._file.flush()
+        self._pending = []
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._pending:
+            self._write_chunk()
+        n = len(self._offsets)
+        self._file.write(struct.pack(f'<{n}Q{n}qQQ', *self._offsets, *self._times, n, self.n_states) + INDEX_MAGIC)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TrajectoryReader:
+    """
+    Random access to a .rk4t file through a read-only memory map.
+
+    reader[i] is state i as a tuple of ints, reader[i:j] an array of states; index_at(t_fp) is the last
+    state at or before simulated time t_fp (O(1) with a fixed dt, O(log n) otherwise). array() decodes
+    the whole trajectory, e.g. for plotting. The last decoded chunk is kept, so stepping through states
+    in order decodes every chunk once. Usable as a context manager.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._bytes = np.frombuffer(self._map, dtype=np.uint8)
+        if bytes(self._bytes[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f'{path} is not a trajectory file')
+        (header_len,) = struct.unpack_from('<I', self._map, len(MAGIC))
+        self._data_start = len(MAGIC) + 4 + header_len
+        self.header = json.loads(bytes(self._bytes[len(MAGIC) + 4:self._data_start]))
+        self.scale = self.header['scale']
+        self.dt_fp = self.header['dt_fp']
+        self.fields = self.header['fields']
+        self.n_vars = len(self.fields)
+        self.checkpoint_every = self.header['checkpoint_every']
+        self._chunk = (None, None)
+        if bytes(self._bytes[-len(INDEX_MAGIC):]) == INDEX_MAGIC:
+            self._read_index()
+        else:
+            self._scan_index()
+
+    def _read_index(self):
+        end = len(self._map) - len(INDEX_MAGIC)
+        n_chunks, self.n_states = struct.unpack_from('<QQ', self._map, end - 16)
+        index_start = end - 16 - 16 * n_chunks
+        self._offsets = np.frombuffer(self._map, dtype='<u8', count=n_chunks, offset=index_start)
+        self._times = np.frombuffer(self._map, dtype='<i8', count=n_chunks, offset=index_start + 8 * n_chunks)
+
+    def _scan_index(self):
+        # unfinished file: walk the chunk headers, dropping a chunk cut short by the end of the file
+        offsets, times, pos, self.n_states = [], [], self._data_start, 0
+        while pos < len(self._map):
+            n, body = _decode_varint(self._map, pos)
+            length, body = _decode_varint(self._map, body)
+            if body + length > len(self._map):
+                break
+            offsets.append(pos)
+            times.append(_decode_varint(self._map, body)[0])
+            self.n_states += n
+            pos = body + length
+        self._offsets = np.array(offsets, dtype=np.uint64)
+        self._times = np.array([(z >> 1) ^ -(z & 1) for z in times], dtype=np.int64)
+
+    def __len__(self):
+        return self.n_states
+
+    @property
+    def n_chunks(self):
+        return len(self._offsets)
+
+    def chunk(self, j):
+        """ States of chunk j, (up to checkpoint_every, n_vars) """
+        if self._chunk[0] != j:
+            pos = int(self._offsets[j])
+            n, pos = _decode_varint(self._map, pos)
+            length, pos = _decode_varint(self._map, pos)
+            self._chunk = (j, decode_chunk(self._bytes[pos:pos + length], n, self.n_vars))
+        return self._chunk[1]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self.n_states)
+            if start >= stop:
+                return np.zeros((0, self.n_vars), dtype=np.int64)
+            k = self.checkpoint_every
+            parts = [self.chunk(j) for j in range(start // k, (stop - 1) // k + 1)]
+            return np.concatenate(parts)[start - start // k * k:stop - start // k * k:step]
+        if i < 0:
+            i += self.n_states
+        if not 0 <= i < self.n_states:
+            raise IndexError(f'state {i} of a trajectory of {self.n_states}')
+        return tuple(self.chunk(i // self.checkpoint_every)[i % self.checkpoint_every].tolist())
+
+    def index_at(self, t_fp):
+        """ Index of the last state at or before t_fp (0 before the start) """
+        if self.dt_fp:
+            i = (t_fp - self.header['initial'][0]) // self.dt_fp
+            return min(max(int(i), 0), self.n_states - 1)
+        j = max(int(np.searchsorted(self._times, t_fp, side='right')) - 1, 0)
+        times = self.chunk(j)[:, 0]
+        return j * self.checkpoint_every + max(int(np.searchsorted(times, t_fp, side='right')) - 1, 0)
+
+    def at_time(self, t_fp):
+        return self[self.index_at(t_fp)]
+
+    def array(self):
+        """ The whole trajectory, (n_states, n_vars) """
+        return self[:]
+
+    def close(self):
+        self._chunk = (None, None)
+        self._offsets = self._times = self._bytes = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,19 +1,32 @@
 %lang starknet
 %builtins pedersen range_check
 
-from starkware.starknet.common.storage import Storage
+# Generated by script/generator-script-for-rk4.ipynb from the `cho` spec -- edit the spec, not this file
+#   K1 = 17
+#   K2 = 10
+#   K3 = 15
+#   M1 = 1
+#   M2 = 2
+#   W = 1000
+
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
-from starkware.cairo.common.math import (signed_div_rem, sign)
+from starkware.cairo.common.math import (abs_value, signed_div_rem, unsigned_div_rem)
+from starkware.cairo.common.math_cmp import is_le
 
 const RANGE_CHECK_BOUND = 2 ** 64
 const SCALE_FP = 10000
 
+# Generated problem-specific struct for holding the coordinates for dynamics (all in fixed-point representation)
+struct Dynamics:
+    member x1  : felt
+    member x1d : felt
+    member x2  : felt
+    member x2d : felt
+end
+
 @view
-func query_next_given_coordinates {
-        storage_ptr : Storage*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
+func query_next_given_coordinates {range_check_ptr} (
         t : felt,
         dt : felt,
         x1 : felt,
@@ -27,214 +40,808 @@ func query_next_given_coordinates {
         x2d_nxt : felt
     ):
     alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_nxt : Dynamics) = rk4 (t=t, dt=dt, state=state)
+
+    return (state_nxt.x1, state_nxt.x1d, state_nxt.x2, state_nxt.x2d)
+end
+
+@view
+func query_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt,
+        n : felt
+    ) -> (
+        traj_len : felt,
+        traj : felt*
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+
+    let (local traj : felt*) = alloc()
+    rk4_n_steps (t=t, dt=dt, state=state, n=n, traj=cast(traj, Dynamics*))
+
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
+end
+
+@view
+func query_next_given_ensemble {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        states_len : felt,
+        states : felt*
+    ) -> (
+        states_nxt_len : felt,
+        states_nxt : felt*
+    ):
+    alloc_locals
+    let (local m, r) = unsigned_div_rem(states_len, Dynamics.SIZE)
+    assert r = 0
 
-    # TODO: vectorize input
-    # TODO: kindly ask Cairo team to enable vectorized function output
+    let (local states_nxt : felt*) = alloc()
+    rk4_ensemble (t=t, dt=dt, m=m, n=m, states=states, states_nxt=states_nxt)
 
-    # Algorithm
-    #   use t, state (4-vector) to calculate next state at t+dt
-    #   return next state
+    return (states_nxt_len=states_len, states_nxt=states_nxt)
+end
+
+# Generated storage of the shared trajectory: t, dt and the Dynamics state, set once by the
+# constructor and moved forward in place by advance(n); every viewer reads it with get_state()
+@storage_var
+func stored_t () -> (t : felt):
+end
+
+@storage_var
+func stored_dt () -> (dt : felt):
+end
+
+@storage_var
+func stored_state () -> (state : Dynamics):
+end
 
-    let (
-        x1_nxt,
-        x1d_nxt,
-        x2_nxt,
-        x2d_nxt
-    ) = rk4_1d_2body_fp(t=t, dt=dt, x1=x1, x1d=x1d, x2=x2, x2d=x2d)
+@constructor
+func constructor {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt
+    ):
+    stored_t.write(t)
+    stored_dt.write(dt)
+    stored_state.write(Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d))
+    return ()
+end
 
-    return (x1_nxt, x1d_nxt, x2_nxt, x2d_nxt)
+@external
+func advance {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} (
+        n : felt
+    ):
+    alloc_locals
+    let (local t) = stored_t.read()
+    let (local dt) = stored_dt.read()
+    let (local state : Dynamics) = stored_state.read()
+    local syscall_ptr : felt* = syscall_ptr
+    local pedersen_ptr : HashBuiltin* = pedersen_ptr
+    let (local state_nxt : Dynamics) = rk4_advance (t=t, dt=dt, state=state, n=n)
+
+    stored_t.write(t + n*dt)
+    stored_state.write(state_nxt)
+    return ()
 end
 
-# Problem-specific evaluation function for first-order derivative of x and xd
-func eval_2d_fp {range_check_ptr} (
+@view
+func get_state {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} () -> (
+        t : felt,
+        dt : felt,
         x1 : felt,
         x1d : felt,
         x2 : felt,
         x2d : felt
+    ):
+    alloc_locals
+    let (local t) = stored_t.read()
+    let (local dt) = stored_dt.read()
+    let (local state : Dynamics) = stored_state.read()
+    return (t, dt, state.x1, state.x1d, state.x2, state.x2d)
+end
+
+# Generated Runge-Kutta 4th-order method for Dynamics state
+func rk4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics
     ) -> (
-        x1_diff : felt,
-        v1_diff : felt,
-        x2_diff : felt,
-        v2_diff : felt
+        state_nxt : Dynamics
     ):
     alloc_locals
+    # k1 stage
+    let (local k1_state_diff : Dynamics) = eval (state)
+    let (local k1_x1, _) = signed_div_rem(k1_state_diff.x1 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_x1d, _) = signed_div_rem(k1_state_diff.x1d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_x2, _) = signed_div_rem(k1_state_diff.x2 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_x2d, _) = signed_div_rem(k1_state_diff.x2d * dt, SCALE_FP, RANGE_CHECK_BOUND)
 
-    # Spring constant. TODO: tune to produce interesting result
-    # (let the middle spring k2 to be looser so that the two masses won't collide,
-    #  because collision is not handled yet by this bambino of physics engine!)
-    const K1 = 17 * SCALE_FP
-    const K2 = 10 * SCALE_FP
-    const K3 = 15 * SCALE_FP
-    const M1 = 1 * SCALE_FP
-    const M2 = 2 * SCALE_FP
-    const W = 1000 * SCALE_FP
+    # k2 stage
+    let (local k1_x1_half, _) = signed_div_rem(k1_x1, 2, RANGE_CHECK_BOUND)
+    let (local k1_x1d_half, _) = signed_div_rem(k1_x1d, 2, RANGE_CHECK_BOUND)
+    let (local k1_x2_half, _) = signed_div_rem(k1_x2, 2, RANGE_CHECK_BOUND)
+    let (local k1_x2d_half, _) = signed_div_rem(k1_x2d, 2, RANGE_CHECK_BOUND)
+    local k2_state : Dynamics = Dynamics(
+        x1 = state.x1 + k1_x1_half,
+        x1d = state.x1d + k1_x1d_half,
+        x2 = state.x2 + k1_x2_half,
+        x2d = state.x2d + k1_x2d_half
+    )
+    let (local k2_state_diff : Dynamics) = eval (k2_state)
+    let (local k2_x1, _) = signed_div_rem(k2_state_diff.x1 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x1d, _) = signed_div_rem(k2_state_diff.x1d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x2, _) = signed_div_rem(k2_state_diff.x2 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x2d, _) = signed_div_rem(k2_state_diff.x2d * dt, SCALE_FP, RANGE_CHECK_BOUND)
 
-    let x1_diff = x1d
-    let x2_diff = x2d
+    # k3 stage
+    let (local k2_x1_half, _) = signed_div_rem(k2_x1, 2, RANGE_CHECK_BOUND)
+    let (local k2_x1d_half, _) = signed_div_rem(k2_x1d, 2, RANGE_CHECK_BOUND)
+    let (local k2_x2_half, _) = signed_div_rem(k2_x2, 2, RANGE_CHECK_BOUND)
+    let (local k2_x2d_half, _) = signed_div_rem(k2_x2d, 2, RANGE_CHECK_BOUND)
+    local k3_state : Dynamics = Dynamics(
+        x1 = state.x1 + k2_x1_half,
+        x1d = state.x1d + k2_x1d_half,
+        x2 = state.x2 + k2_x2_half,
+        x2d = state.x2d + k2_x2d_half
+    )
+    let (local k3_state_diff : Dynamics) = eval (k3_state)
+    let (local k3_x1, _) = signed_div_rem(k3_state_diff.x1 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x1d, _) = signed_div_rem(k3_state_diff.x1d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x2, _) = signed_div_rem(k3_state_diff.x2 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x2d, _) = signed_div_rem(k3_state_diff.x2d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # k4 stage
+    local k4_state : Dynamics = Dynamics(
+        x1 = state.x1 + k3_x1,
+        x1d = state.x1d + k3_x1d,
+        x2 = state.x2 + k3_x2,
+        x2d = state.x2d + k3_x2d
+    )
+    let (local k4_state_diff : Dynamics) = eval (k4_state)
+    let (local k4_x1, _) = signed_div_rem(k4_state_diff.x1 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x1d, _) = signed_div_rem(k4_state_diff.x1d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x2, _) = signed_div_rem(k4_state_diff.x2 * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x2d, _) = signed_div_rem(k4_state_diff.x2d * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # sum k, div 6, obtain state_nxt
+    let (local delta_x1, _) = signed_div_rem(k1_x1 + 2 * k2_x1 + 2 * k3_x1 + k4_x1, 6, RANGE_CHECK_BOUND)
+    let (local delta_x1d, _) = signed_div_rem(k1_x1d + 2 * k2_x1d + 2 * k3_x1d + k4_x1d, 6, RANGE_CHECK_BOUND)
+    let (local delta_x2, _) = signed_div_rem(k1_x2 + 2 * k2_x2 + 2 * k3_x2 + k4_x2, 6, RANGE_CHECK_BOUND)
+    let (local delta_x2d, _) = signed_div_rem(k1_x2d + 2 * k2_x2d + 2 * k3_x2d + k4_x2d, 6, RANGE_CHECK_BOUND)
+    local state_nxt : Dynamics = Dynamics(
+        x1 = state.x1 + delta_x1,
+        x1d = state.x1d + delta_x1d,
+        x2 = state.x2 + delta_x2,
+        x2d = state.x2d + delta_x2d
+    )
+
+    return (state_nxt)
+end
+
+# Generated function to run rk4 n times in a row, appending each Dynamics state to traj
+func rk4_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt) = rk4 (t=t, dt=dt, state=state)
+    assert [traj] = state_nxt
 
-    # a1 = ( -k1x1 + k2(x2-x1) ) /m1
-    let (local k1x1) = mul_fp (K1, x1)
-    tempvar x2mx1 = x2-x1
-    let (local k2x2mx1) = mul_fp (K2, x2mx1)
-    tempvar nominator1 = k2x2mx1 - k1x1
-    let (local v1_diff) = div_fp (nominator1, M1)
+    rk4_n_steps (t=t+dt, dt=dt, state=state_nxt, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
+end
+
+# Generated function to run rk4 once for each of n states laid out as struct-of-arrays
+# (states[0:m] holds x1 of every state, states[m:2m] holds x1d, and so on)
+func rk4_ensemble {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        m : felt,
+        n : felt,
+        states : felt*,
+        states_nxt : felt*
+    ):
+    alloc_locals
+    if n == 0:
+        return ()
+    end
+
+    local state : Dynamics = Dynamics(
+        x1  = [states],
+        x1d = [states + m],
+        x2  = [states + 2*m],
+        x2d = [states + 3*m]
+    )
+    let (local state_nxt : Dynamics) = rk4 (t=t, dt=dt, state=state)
+    assert [states_nxt]       = state_nxt.x1
+    assert [states_nxt + m]   = state_nxt.x1d
+    assert [states_nxt + 2*m] = state_nxt.x2
+    assert [states_nxt + 3*m] = state_nxt.x2d
+
+    rk4_ensemble (t=t, dt=dt, m=m, n=n-1, states=states+1, states_nxt=states_nxt+1)
+    return ()
+end
 
-    # a2 = ( -k2(x2-x1) + k3(W-x2) ) /m2
-    tempvar Wmx2 = W-x2
-    let (local k3Wmx2) = mul_fp (K3, Wmx2)
-    tempvar nominator2 = k3Wmx2 - k2x2mx1
-    let (local v2_diff) = div_fp (nominator2, M2)
+# Generated function to run rk4 n times in a row, keeping only the last Dynamics state
+func rk4_advance {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        n : felt
+    ) -> (
+        state_nxt : Dynamics
+    ):
+    if n == 0:
+        return (state)
+    end
 
-    return (x1_diff, v1_diff, x2_diff, v2_diff)
+    let (state_nxt) = rk4 (t=t, dt=dt, state=state)
+    let (state_end) = rk4_advance (t=t+dt, dt=dt, state=state_nxt, n=n-1)
+    return (state_end)
 end
 
-# Runge-Kutta 4th-order method for four-vector
-# (set to @view for testing purposes)
 @view
-func rk4_1d_2body_fp {range_check_ptr} (
+func query_next_adaptive {range_check_ptr} (
         t : felt,
         dt : felt,
         x1 : felt,
         x1d : felt,
         x2 : felt,
-        x2d : felt
+        x2d : felt,
+        tol : felt
     ) -> (
+        t_nxt : felt,
+        dt_nxt : felt,
+        err : felt,
         x1_nxt : felt,
         x1d_nxt : felt,
         x2_nxt : felt,
         x2d_nxt : felt
     ):
     alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local t_nxt, local dt_nxt, local err, local state_nxt : Dynamics, _) = dopri_step (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol)
+
+    return (t_nxt, dt_nxt, err, state_nxt.x1, state_nxt.x1d, state_nxt.x2, state_nxt.x2d)
+end
+
+@view
+func query_n_adaptive {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt,
+        tol : felt,
+        n : felt
+    ) -> (
+        dt_nxt : felt,
+        n_rejected : felt,
+        traj_len : felt,
+        traj : felt*
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+
+    let (local traj : felt*) = alloc()
+    let (local state_diff : Dynamics) = eval (state)
+    let (dt_nxt, n_rejected) = dopri_n_steps (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol, n=n, n_rejected=0, traj=traj)
+
+    return (dt_nxt=dt_nxt, n_rejected=n_rejected, traj_len=n*(Dynamics.SIZE+1), traj=traj)
+end
 
+# Generated Dormand-Prince 5(4) step for Dynamics state: the 5th-order state_nxt and err, the largest
+# component of the embedded error estimate (absolute, fixed-point). The k's are kept unrounded (scaled by
+# SCALE_FP**2) and every stage state is truncated once, which halves the signed_div_rem count.
+# The derivative at state comes in as k1_state_diff and the one at state_nxt goes out (first same as
+# last), so consecutive steps take 6 evals each instead of 7
+func dopri {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        k1_state_diff : Dynamics
+    ) -> (
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics,
+        err : felt
+    ):
+    alloc_locals
     # k1 stage
-    let (local k1_x1_, local k1_x1d_, local k1_x2_, local k1_x2d_) = eval_2d_fp (x1, x1d, x2, x2d)
-    let (local k1_x1)  = mul_fp (k1_x1_, dt)
-    let (local k1_x1d) = mul_fp (k1_x1d_, dt)
-    let (local k1_x2)  = mul_fp (k1_x2_, dt)
-    let (local k1_x2d) = mul_fp (k1_x2d_, dt)
+    local k1_x1 = k1_state_diff.x1 * dt
+    local k1_x1d = k1_state_diff.x1d * dt
+    local k1_x2 = k1_state_diff.x2 * dt
+    local k1_x2d = k1_state_diff.x2d * dt
 
     # k2 stage
-    let (local k1_x1_half)  = div_fp_ul (k1_x1,  2)
-    let (local k1_x1d_half) = div_fp_ul (k1_x1d,  2)
-    let (local k1_x2_half)  = div_fp_ul (k1_x2,  2)
-    let (local k1_x2d_half) = div_fp_ul (k1_x2d,  2)
-    local k2_x1_est  = x1  + k1_x1_half
-    local k2_x1d_est = x1d + k1_x1d_half
-    local k2_x2_est  = x2  + k1_x2_half
-    local k2_x2d_est = x2d + k1_x2d_half
-    let (local k2_x1_, local k2_x1d_, local k2_x2_, local k2_x2d_) = eval_2d_fp (k2_x1_est, k2_x1d_est, k2_x2_est, k2_x2d_est)
-    let (local k2_x1)  = mul_fp (k2_x1_, dt)
-    let (local k2_x1d) = mul_fp (k2_x1d_, dt)
-    let (local k2_x2)  = mul_fp (k2_x2_, dt)
-    let (local k2_x2d) = mul_fp (k2_x2d_, dt)
+    let (local k2_x1_delta, _) = signed_div_rem(k1_x1, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x1d_delta, _) = signed_div_rem(k1_x1d, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x2_delta, _) = signed_div_rem(k1_x2, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_x2d_delta, _) = signed_div_rem(k1_x2d, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k2_state : Dynamics = Dynamics(
+        x1 = state.x1 + k2_x1_delta,
+        x1d = state.x1d + k2_x1d_delta,
+        x2 = state.x2 + k2_x2_delta,
+        x2d = state.x2d + k2_x2d_delta
+    )
+    let (local k2_state_diff : Dynamics) = eval (k2_state)
+    local k2_x1 = k2_state_diff.x1 * dt
+    local k2_x1d = k2_state_diff.x1d * dt
+    local k2_x2 = k2_state_diff.x2 * dt
+    local k2_x2d = k2_state_diff.x2d * dt
 
     # k3 stage
-    let (local k2_x1_half)  = div_fp_ul (k2_x1,  2)
-    let (local k2_x1d_half) = div_fp_ul (k2_x1d,  2)
-    let (local k2_x2_half)  = div_fp_ul (k2_x2,  2)
-    let (local k2_x2d_half) = div_fp_ul (k2_x2d,  2)
-    local k3_x1_est  = x1  + k2_x1_half
-    local k3_x1d_est = x1d + k2_x1d_half
-    local k3_x2_est  = x2  + k2_x2_half
-    local k3_x2d_est = x2d + k2_x2d_half
-    let (local k3_x1_, local k3_x1d_, local k3_x2_, local k3_x2d_) = eval_2d_fp (k3_x1_est, k3_x1d_est, k3_x2_est, k3_x2d_est)
-    let (local k3_x1)  = mul_fp (k3_x1_, dt)
-    let (local k3_x1d) = mul_fp (k3_x1d_, dt)
-    let (local k3_x2)  = mul_fp (k3_x2_, dt)
-    let (local k3_x2d) = mul_fp (k3_x2d_, dt)
+    let (local k3_x1_delta, _) = signed_div_rem(3 * k1_x1 + 9 * k2_x1, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x1d_delta, _) = signed_div_rem(3 * k1_x1d + 9 * k2_x1d, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x2_delta, _) = signed_div_rem(3 * k1_x2 + 9 * k2_x2, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_x2d_delta, _) = signed_div_rem(3 * k1_x2d + 9 * k2_x2d, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k3_state : Dynamics = Dynamics(
+        x1 = state.x1 + k3_x1_delta,
+        x1d = state.x1d + k3_x1d_delta,
+        x2 = state.x2 + k3_x2_delta,
+        x2d = state.x2d + k3_x2d_delta
+    )
+    let (local k3_state_diff : Dynamics) = eval (k3_state)
+    local k3_x1 = k3_state_diff.x1 * dt
+    local k3_x1d = k3_state_diff.x1d * dt
+    local k3_x2 = k3_state_diff.x2 * dt
+    local k3_x2d = k3_state_diff.x2d * dt
 
     # k4 stage
-    local k4_x1_est  = x1  + k3_x1
-    local k4_x1d_est = x1d + k3_x1d
-    local k4_x2_est  = x2  + k3_x2
-    local k4_x2d_est = x2d + k3_x2d
-    let (local k4_x1_, local k4_x1d_, local k4_x2_, local k4_x2d_) = eval_2d_fp (k4_x1_est, k4_x1d_est, k4_x2_est, k4_x2d_est)
-    let (local k4_x1)  = mul_fp (k4_x1_, dt)
-    let (local k4_x1d) = mul_fp (k4_x1d_, dt)
-    let (local k4_x2)  = mul_fp (k4_x2_, dt)
-    let (local k4_x2d) = mul_fp (k4_x2d_, dt)
-
-    # sum k, mul dt, div 6
-    let (local k2_x1_mul2) = mul_fp_ul  (k2_x1, 2)
-    let (local k3_x1_mul2) = mul_fp_ul  (k3_x1, 2)
-    let (local k2_x1d_mul2) = mul_fp_ul (k2_x1d, 2)
-    let (local k3_x1d_mul2) = mul_fp_ul (k3_x1d, 2)
-    let (local k2_x2_mul2) = mul_fp_ul  (k2_x2, 2)
-    let (local k3_x2_mul2) = mul_fp_ul  (k3_x2, 2)
-    let (local k2_x2d_mul2) = mul_fp_ul (k2_x2d, 2)
-    let (local k3_x2d_mul2) = mul_fp_ul (k3_x2d, 2)
-    local k_x1_sum  = k1_x1  + k2_x1_mul2  + k3_x1_mul2  + k4_x1
-    local k_x1d_sum = k1_x1d + k2_x1d_mul2 + k3_x1d_mul2 + k4_x1d
-    local k_x2_sum  = k1_x2  + k2_x2_mul2  + k3_x2_mul2  + k4_x2
-    local k_x2d_sum = k1_x2d + k2_x2d_mul2 + k3_x2d_mul2 + k4_x2d
-    let (local x1_delta)  = div_fp_ul (k_x1_sum, 6)
-    let (local x1d_delta) = div_fp_ul (k_x1d_sum, 6)
-    let (local x2_delta)  = div_fp_ul (k_x2_sum, 6)
-    let (local x2d_delta) = div_fp_ul (k_x2d_sum, 6)
-
-    # produce final estimation
-    tempvar x1_nxt  = x1 + x1_delta
-    tempvar x1d_nxt = x1d + x1d_delta
-    tempvar x2_nxt  = x2 + x2_delta
-    tempvar x2d_nxt = x2d + x2d_delta
-
-    return (x1_nxt, x1d_nxt, x2_nxt, x2d_nxt)
-end
-
-### utility functions for fixed-point arithmetic
+    let (local k4_x1_delta, _) = signed_div_rem(44 * k1_x1 - 168 * k2_x1 + 160 * k3_x1, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x1d_delta, _) = signed_div_rem(44 * k1_x1d - 168 * k2_x1d + 160 * k3_x1d, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x2_delta, _) = signed_div_rem(44 * k1_x2 - 168 * k2_x2 + 160 * k3_x2, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_x2d_delta, _) = signed_div_rem(44 * k1_x2d - 168 * k2_x2d + 160 * k3_x2d, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k4_state : Dynamics = Dynamics(
+        x1 = state.x1 + k4_x1_delta,
+        x1d = state.x1d + k4_x1d_delta,
+        x2 = state.x2 + k4_x2_delta,
+        x2d = state.x2d + k4_x2d_delta
+    )
+    let (local k4_state_diff : Dynamics) = eval (k4_state)
+    local k4_x1 = k4_state_diff.x1 * dt
+    local k4_x1d = k4_state_diff.x1d * dt
+    local k4_x2 = k4_state_diff.x2 * dt
+    local k4_x2d = k4_state_diff.x2d * dt
+
+    # k5 stage
+    let (local k5_x1_delta, _) = signed_div_rem(19372 * k1_x1 - 76080 * k2_x1 + 64448 * k3_x1 - 1908 * k4_x1, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_x1d_delta, _) = signed_div_rem(19372 * k1_x1d - 76080 * k2_x1d + 64448 * k3_x1d - 1908 * k4_x1d, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_x2_delta, _) = signed_div_rem(19372 * k1_x2 - 76080 * k2_x2 + 64448 * k3_x2 - 1908 * k4_x2, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_x2d_delta, _) = signed_div_rem(19372 * k1_x2d - 76080 * k2_x2d + 64448 * k3_x2d - 1908 * k4_x2d, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k5_state : Dynamics = Dynamics(
+        x1 = state.x1 + k5_x1_delta,
+        x1d = state.x1d + k5_x1d_delta,
+        x2 = state.x2 + k5_x2_delta,
+        x2d = state.x2d + k5_x2d_delta
+    )
+    let (local k5_state_diff : Dynamics) = eval (k5_state)
+    local k5_x1 = k5_state_diff.x1 * dt
+    local k5_x1d = k5_state_diff.x1d * dt
+    local k5_x2 = k5_state_diff.x2 * dt
+    local k5_x2d = k5_state_diff.x2d * dt
+
+    # k6 stage
+    let (local k6_x1_delta, _) = signed_div_rem(477901 * k1_x1 - 1806240 * k2_x1 + 1495424 * k3_x1 + 46746 * k4_x1 - 45927 * k5_x1, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_x1d_delta, _) = signed_div_rem(477901 * k1_x1d - 1806240 * k2_x1d + 1495424 * k3_x1d + 46746 * k4_x1d - 45927 * k5_x1d, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_x2_delta, _) = signed_div_rem(477901 * k1_x2 - 1806240 * k2_x2 + 1495424 * k3_x2 + 46746 * k4_x2 - 45927 * k5_x2, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_x2d_delta, _) = signed_div_rem(477901 * k1_x2d - 1806240 * k2_x2d + 1495424 * k3_x2d + 46746 * k4_x2d - 45927 * k5_x2d, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k6_state : Dynamics = Dynamics(
+        x1 = state.x1 + k6_x1_delta,
+        x1d = state.x1d + k6_x1d_delta,
+        x2 = state.x2 + k6_x2_delta,
+        x2d = state.x2d + k6_x2d_delta
+    )
+    let (local k6_state_diff : Dynamics) = eval (k6_state)
+    local k6_x1 = k6_state_diff.x1 * dt
+    local k6_x1d = k6_state_diff.x1d * dt
+    local k6_x2 = k6_state_diff.x2 * dt
+    local k6_x2d = k6_state_diff.x2d * dt
+
+    # k7 stage
+    let (local k7_x1_delta, _) = signed_div_rem(12985 * k1_x1 + 64000 * k3_x1 + 92750 * k4_x1 - 45927 * k5_x1 + 18656 * k6_x1, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_x1d_delta, _) = signed_div_rem(12985 * k1_x1d + 64000 * k3_x1d + 92750 * k4_x1d - 45927 * k5_x1d + 18656 * k6_x1d, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_x2_delta, _) = signed_div_rem(12985 * k1_x2 + 64000 * k3_x2 + 92750 * k4_x2 - 45927 * k5_x2 + 18656 * k6_x2, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_x2d_delta, _) = signed_div_rem(12985 * k1_x2d + 64000 * k3_x2d + 92750 * k4_x2d - 45927 * k5_x2d + 18656 * k6_x2d, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k7_state : Dynamics = Dynamics(
+        x1 = state.x1 + k7_x1_delta,
+        x1d = state.x1d + k7_x1d_delta,
+        x2 = state.x2 + k7_x2_delta,
+        x2d = state.x2d + k7_x2d_delta
+    )
+    let (local k7_state_diff : Dynamics) = eval (k7_state)
+    local k7_x1 = k7_state_diff.x1 * dt
+    local k7_x1d = k7_state_diff.x1d * dt
+    local k7_x2 = k7_state_diff.x2 * dt
+    local k7_x2d = k7_state_diff.x2d * dt
+
+    # error estimate, k7_state being the 5th-order solution
+    let (local err_x1, _) = signed_div_rem(26341 * k1_x1 - 90880 * k3_x1 + 790230 * k4_x1 - 1086939 * k5_x1 + 895488 * k6_x1 - 534240 * k7_x1, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_x1_abs) = abs_value(err_x1)
+    let (local err_x1d, _) = signed_div_rem(26341 * k1_x1d - 90880 * k3_x1d + 790230 * k4_x1d - 1086939 * k5_x1d + 895488 * k6_x1d - 534240 * k7_x1d, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_x1d_abs) = abs_value(err_x1d)
+    let (local err_x2, _) = signed_div_rem(26341 * k1_x2 - 90880 * k3_x2 + 790230 * k4_x2 - 1086939 * k5_x2 + 895488 * k6_x2 - 534240 * k7_x2, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_x2_abs) = abs_value(err_x2)
+    let (local err_x2d, _) = signed_div_rem(26341 * k1_x2d - 90880 * k3_x2d + 790230 * k4_x2d - 1086939 * k5_x2d + 895488 * k6_x2d - 534240 * k7_x2d, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_x2d_abs) = abs_value(err_x2d)
+    let (local err_max_1) = is_le(err_x1d_abs, err_x1_abs)
+    local err_1 = err_max_1 * err_x1_abs + (1 - err_max_1) * err_x1d_abs
+    let (local err_max_2) = is_le(err_x2_abs, err_1)
+    local err_2 = err_max_2 * err_1 + (1 - err_max_2) * err_x2_abs
+    let (local err_max_3) = is_le(err_x2d_abs, err_2)
+    local err_3 = err_max_3 * err_2 + (1 - err_max_3) * err_x2d_abs
+
+    return (state_nxt=k7_state, state_nxt_diff=k7_state_diff, err=err_3)
+end
 
-@view
-func mul_fp {range_check_ptr} (
-        a : felt,
-        b : felt
+# Generated adaptive step: one dopri attempt, accepted if err <= tol (or if dt is already the smallest
+# fixed-point step); a rejected attempt returns t and state unchanged, to be retried with dt_nxt
+func dopri_step {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        tol : felt
     ) -> (
-        c : felt
+        t_nxt : felt,
+        dt_nxt : felt,
+        err : felt,
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
     ):
-    # signed_div_rem by SCALE_FP after multiplication
+    alloc_locals
+    let (local state_5th : Dynamics, local state_5th_diff : Dynamics, local err) = dopri (
+        t=t, dt=dt, state=state, k1_state_diff=state_diff)
+    let (p, q) = dopri_factor (err=err, tol=tol)
+    let (dt_scaled, _) = unsigned_div_rem(dt * p, q)
+    local dt_nxt
+    if dt_scaled == 0:
+        dt_nxt = 1
+    else:
+        dt_nxt = dt_scaled
+    end
+
+    let (accept) = is_le(err, tol)
+    if accept == 1:
+        return (t_nxt=t+dt, dt_nxt=dt_nxt, err=err, state_nxt=state_5th, state_nxt_diff=state_5th_diff)
+    end
+    if dt == 1:
+        return (t_nxt=t+dt, dt_nxt=dt_nxt, err=err, state_nxt=state_5th, state_nxt_diff=state_5th_diff)
+    end
+    return (t_nxt=t, dt_nxt=dt_nxt, err=err, state_nxt=state, state_nxt_diff=state_diff)
+end
 
-    tempvar product = a * b
-    let (c, _) = signed_div_rem(product, SCALE_FP, RANGE_CHECK_BOUND)
+# Generated step size control: dt_nxt = dt * p/q for the largest ladder entry p/q <= 0.9 * (tol/err)^(1/5),
+# the thresholds being raised to the 5th power at generation time
+func dopri_factor {range_check_ptr} (
+        err : felt,
+        tol : felt
+    ) -> (
+        p : felt,
+        q : felt
+    ):
+    let (ok_0) = is_le(err * 312500000, tol * 59049)
+    if ok_0 == 1:
+        return (p=5, q=1)
+    end
+    let (ok_1) = is_le(err * 102400000, tol * 59049)
+    if ok_1 == 1:
+        return (p=4, q=1)
+    end
+    let (ok_2) = is_le(err * 24300000, tol * 59049)
+    if ok_2 == 1:
+        return (p=3, q=1)
+    end
+    let (ok_3) = is_le(err * 3200000, tol * 59049)
+    if ok_3 == 1:
+        return (p=2, q=1)
+    end
+    let (ok_4) = is_le(err * 24300000, tol * 1889568)
+    if ok_4 == 1:
+        return (p=3, q=2)
+    end
+    let (ok_5) = is_le(err * 312500000, tol * 60466176)
+    if ok_5 == 1:
+        return (p=5, q=4)
+    end
+    let (ok_6) = is_le(err * 100000, tol * 59049)
+    if ok_6 == 1:
+        return (p=1, q=1)
+    end
+    let (ok_7) = is_le(err * 102400000, tol * 184528125)
+    if ok_7 == 1:
+        return (p=4, q=5)
+    end
+    let (ok_8) = is_le(err * 24300000, tol * 184528125)
+    if ok_8 == 1:
+        return (p=3, q=5)
+    end
+    let (ok_9) = is_le(err * 3200000, tol * 184528125)
+    if ok_9 == 1:
+        return (p=2, q=5)
+    end
+    return (p=1, q=5)
+end
 
-    return (c)
+# Generated function to take n accepted adaptive steps in a row, appending t and the Dynamics state
+# to traj after each; rejected attempts are retried from the same state and counted
+func dopri_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        tol : felt,
+        n : felt,
+        n_rejected : felt,
+        traj : felt*
+    ) -> (
+        dt_nxt : felt,
+        n_rejected_nxt : felt
+    ):
+    alloc_locals
+    if n == 0:
+        return (dt_nxt=dt, n_rejected_nxt=n_rejected)
+    end
+
+    let (local t_nxt, local dt_nxt, _, local state_nxt : Dynamics, local state_nxt_diff : Dynamics) = dopri_step (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol)
+    if t_nxt == t:
+        let (dt_end, n_rejected_end) = dopri_n_steps (
+            t=t, dt=dt_nxt, state=state, state_diff=state_diff, tol=tol, n=n, n_rejected=n_rejected+1, traj=traj)
+        return (dt_end, n_rejected_end)
+    end
+    assert [traj] = t_nxt
+    assert [cast(traj + 1, Dynamics*)] = state_nxt
+
+    let (dt_end, n_rejected_end) = dopri_n_steps (
+        t=t_nxt, dt=dt_nxt, state=state_nxt, state_diff=state_nxt_diff, tol=tol, n=n-1, n_rejected=n_rejected,
+        traj=traj+1+Dynamics.SIZE)
+    return (dt_end, n_rejected_end)
 end
 
 @view
-func div_fp {range_check_ptr} (
-        a : felt,
-        b : felt
+func query_next_verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt
     ) -> (
-        c : felt
+        x1_nxt : felt,
+        x1d_nxt : felt,
+        x2_nxt : felt,
+        x2d_nxt : felt
     ):
-    # multiply by SCALE_FP before signed_div_rem
-
-    tempvar a_scaled = a * SCALE_FP
-    let (c, _) = signed_div_rem(a_scaled, b, RANGE_CHECK_BOUND)
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local state_nxt : Dynamics, _) = verlet (t=t, dt=dt, state=state, state_diff=state_diff)
 
-    return (c)
+    return (state_nxt.x1, state_nxt.x1d, state_nxt.x2, state_nxt.x2d)
 end
 
 @view
-func mul_fp_ul {range_check_ptr} (
-        a : felt,
-        b_ul : felt
+func query_n_steps_verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt,
+        n : felt
     ) -> (
-        c : felt
+        traj_len : felt,
+        traj : felt*
     ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_diff : Dynamics) = eval (state)
 
-    let c = a * b_ul
+    let (local traj : felt*) = alloc()
+    verlet_n_steps (t=t, dt=dt, state=state, state_diff=state_diff, n=n, traj=cast(traj, Dynamics*))
 
-    return (c)
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
 end
 
 @view
-func div_fp_ul {range_check_ptr} (
-        a : felt,
-        b_ul : felt
+func query_next_yoshida4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt
     ) -> (
-        c : felt
+        x1_nxt : felt,
+        x1d_nxt : felt,
+        x2_nxt : felt,
+        x2d_nxt : felt
     ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local state_nxt : Dynamics, _) = yoshida4 (t=t, dt=dt, state=state, state_diff=state_diff)
 
-    let (c, _) = signed_div_rem(a, b_ul, RANGE_CHECK_BOUND)
+    return (state_nxt.x1, state_nxt.x1d, state_nxt.x2, state_nxt.x2d)
+end
 
-    return (c)
-end
\ No newline at end of file
+@view
+func query_n_steps_yoshida4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x1 : felt,
+        x1d : felt,
+        x2 : felt,
+        x2d : felt,
+        n : felt
+    ) -> (
+        traj_len : felt,
+        traj : felt*
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x1=x1, x1d=x1d, x2=x2, x2d=x2d) # packing
+    let (local state_diff : Dynamics) = eval (state)
+
+    let (local traj : felt*) = alloc()
+    yoshida4_n_steps (t=t, dt=dt, state=state, state_diff=state_diff, n=n, traj=cast(traj, Dynamics*))
+
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
+end
+
+# Generated velocity Verlet (kick-drift-kick) step for Dynamics state: one eval per step, the
+# accelerations at state coming in with state_diff and the ones at state_nxt going out
+func verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics
+    ) -> (
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
+    ):
+    alloc_locals
+    # kick half a step, drift a whole one
+    let (local x1d_kick, _) = signed_div_rem(state_diff.x1d * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local x1d_half = state.x1d + x1d_kick
+    let (local x1_drift, _) = signed_div_rem(x1d_half * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local x2d_kick, _) = signed_div_rem(state_diff.x2d * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local x2d_half = state.x2d + x2d_kick
+    let (local x2_drift, _) = signed_div_rem(x2d_half * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    local state_drift : Dynamics = Dynamics(
+        x1 = state.x1 + x1_drift,
+        x1d = x1d_half,
+        x2 = state.x2 + x2_drift,
+        x2d = x2d_half
+    )
+
+    # kick the other half with the accelerations at the new positions
+    let (local state_nxt_diff : Dynamics) = eval (state_drift)
+    let (local x1d_kick_nxt, _) = signed_div_rem(state_nxt_diff.x1d * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local x2d_kick_nxt, _) = signed_div_rem(state_nxt_diff.x2d * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local state_nxt : Dynamics = Dynamics(
+        x1 = state_drift.x1,
+        x1d = x1d_half + x1d_kick_nxt,
+        x2 = state_drift.x2,
+        x2d = x2d_half + x2d_kick_nxt
+    )
+
+    return (state_nxt, state_nxt_diff)
+end
+
+const YOSHIDA_W1 = 135120719 # 1/(2 - 2^(1/3)) over YOSHIDA_DEN
+const YOSHIDA_DEN = 100000000
+
+# Generated 4th-order Yoshida step: three verlet substeps of w1*dt, (1-2*w1)*dt and w1*dt (the middle
+# one going back in time), three evals per step
+func yoshida4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics
+    ) -> (
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
+    ):
+    alloc_locals
+    let (local dt_outer, _) = signed_div_rem(dt * YOSHIDA_W1, YOSHIDA_DEN, RANGE_CHECK_BOUND)
+    local dt_inner = dt - 2 * dt_outer
+
+    let (local state_1 : Dynamics, local state_1_diff : Dynamics) = verlet (t=t, dt=dt_outer, state=state, state_diff=state_diff)
+    let (local state_2 : Dynamics, local state_2_diff : Dynamics) = verlet (t=t, dt=dt_inner, state=state_1, state_diff=state_1_diff)
+    let (local state_nxt : Dynamics, local state_nxt_diff : Dynamics) = verlet (t=t, dt=dt_outer, state=state_2, state_diff=state_2_diff)
+
+    return (state_nxt, state_nxt_diff)
+end
+
+# Generated function to run verlet n times in a row, appending each Dynamics state to traj
+func verlet_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt, state_nxt_diff) = verlet (t=t, dt=dt, state=state, state_diff=state_diff)
+    assert [traj] = state_nxt
+
+    verlet_n_steps (t=t+dt, dt=dt, state=state_nxt, state_diff=state_nxt_diff, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
+end
+
+# Generated function to run yoshida4 n times in a row, appending each Dynamics state to traj
+func yoshida4_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt, state_nxt_diff) = yoshida4 (t=t, dt=dt, state=state, state_diff=state_diff)
+    assert [traj] = state_nxt
+
+    yoshida4_n_steps (t=t+dt, dt=dt, state=state_nxt, state_diff=state_nxt_diff, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
+end
+
+# Generated evaluation function for first-order derivative of state
+# (constants folded at generation time: 1 signed_div_rem per eval)
+func eval {range_check_ptr} (
+        state : Dynamics
+    ) -> (
+        state_diff : Dynamics
+    ):
+    alloc_locals
+
+    # unpack struct
+    local x1  = state.x1
+    local x1d = state.x1d
+    local x2  = state.x2
+    local x2d = state.x2d
+
+    # x1_diff = x1d
+    let x1_diff = x1d
+    # x1d_diff = -27*x1 + 10*x2
+    local x1d_diff = -27 * x1 + 10 * x2
+    # x2_diff = x2d
+    let x2_diff = x2d
+    # x2d_diff = 5*x1 - 25*x2/2 + 7500
+    let (local x2d_diff, _) = signed_div_rem(-25 * x2 + 10 * x1 + 15000 * SCALE_FP, 2, RANGE_CHECK_BOUND)
+
+    local state_diff : Dynamics = Dynamics(
+        x1  = x1_diff,
+        x1d = x1d_diff,
+        x2  = x2_diff,
+        x2d = x2d_diff
+    )
+    return (state_diff)
+end
@@ -1,91 +1,159 @@
+import os, sys
+import asyncio
 import pytest
-from starkware.starknet.testing.starknet import Starknet
-from timeit import default_timer as timer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from contract_harness import deploy, record, view
+from fp_emulator import integrate, integrate_adaptive, to_flat_traj
+from felt_codec import from_felts, to_felts
+
+SCALE_FP = 10000 # consistent with SCALE_FP in the contract
+
+# set constants for the experiment
+W = 1000 # consistent with const W set in contract
+x1_0 = 100.
+x1d_0 = 0.
+x2_0 = 900.
+x2d_0 = 0.
+t_0 = 0.
+dt = 0.01
+T = 2
+
+x1_0_fp  = int(x1_0 * SCALE_FP)
+x1d_0_fp = int(x1d_0 * SCALE_FP)
+x2_0_fp  = int(x2_0 * SCALE_FP)
+x2d_0_fp = int(x2d_0 * SCALE_FP)
+t_0_fp  = int(t_0 * SCALE_FP)
+dt_fp   = int(dt * SCALE_FP)
+N = int(T//dt)
+CAIRO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cho.cairo')
+
+
+@pytest.fixture(scope='module')
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='module')
+async def contract():
+    # deployed once for the whole module; the constructor sets the shared trajectory
+    # (t, dt and the state kept in storage) the contract starts from
+    return await deploy(CAIRO_PATH, constructor_calldata=[t_0_fp, dt_fp, x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp])
 
 
 @pytest.mark.asyncio
-async def test_dict():
-    starknet = await Starknet.empty()
-    print()
-
-    contract = await starknet.deploy("cho.cairo")
-
-    ## note: if passing negative numbers to cairo function => must mod P in python first;
-    ##       also, the return value from cairo has been mod P, so must detect neg value specifically
-    PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
-    PRIME_HALF = PRIME//2
-    SCALE_FP = 10000 # consistent with SCALE_FP in the contract
-
-    ## handling negative numbers returned by Cairo function (current testing framework does not handle this)
-    def adjust_for_negative (history):
-        return [e if e < PRIME_HALF else e-PRIME for e in history]
-
-    def adjust_for_negative_single (e):
-        return e if e < PRIME_HALF else e-PRIME
-
-    # set constants for the experiment
-    W = 1000 # consistent with const W set in contract
-    x1_0 = 100.
-    x1d_0 = 0.
-    x2_0 = 900.
-    x2d_0 = 0.
-    t_0 = 0.
-    dt = 0.01
-    T = 2
-
-    x1_0_fp  = int(x1_0 * SCALE_FP)
-    x1d_0_fp = int(x1d_0 * SCALE_FP)
-    x2_0_fp  = int(x2_0 * SCALE_FP)
-    x2d_0_fp = int(x2d_0 * SCALE_FP)
-    t_0_fp  = int(t_0 * SCALE_FP)
-    dt_fp   = int(dt * SCALE_FP)
-
-    # run rk4 integration continuously
-    t_fp = t_0_fp
-    x1_fp = x1_0_fp
-    x1d_fp = x1d_0_fp
-    x2_fp = x2_0_fp
-    x2d_fp = x2d_0_fp
-    print(f'm1 starting at x1: {x1_fp} with v1: {x1d_fp}')
-    print(f'm2 starting at x2: {x2_fp} with v2: {x2d_fp}')
-
-    x1_fp_history  = [x1_fp]
-    x1d_fp_history = [x1d_fp]
-    x2_fp_history  = [x2_fp]
-    x2d_fp_history = [x2d_fp]
-    x1_delta_history = []
-
-    N = int(T//dt)
-    for i in range(N):
-        ret = await contract.query_next_given_coordinates(
-            t   = t_fp,
+async def test_rk4_trajectory(contract):
+    ret = await view(contract.query_n_steps(
+        t   = t_0_fp,
+        dt  = dt_fp,
+        x1  = x1_0_fp,
+        x1d = x1d_0_fp,
+        x2  = x2_0_fp,
+        x2d = x2d_0_fp,
+        n   = N
+    ))
+    traj = ret.result.traj
+    assert len(traj) == N*4
+    print(f'{N} states retrieved in one call.')
+
+    x1_fp_history  = [x1_0_fp]  + traj[0::4]
+    x1d_fp_history = [x1d_0_fp] + traj[1::4]
+    x2_fp_history  = [x2_0_fp]  + traj[2::4]
+    x2d_fp_history = [x2d_0_fp] + traj[3::4]
+
+    # the first few steps must agree with single-step queries
+    rets = await asyncio.gather(*[
+        view(contract.query_next_given_coordinates(
+            t   = t_0_fp + i*dt_fp,
             dt  = dt_fp,
-            x1  = x1_fp,
-            x1d = x1d_fp,
-            x2  = x2_fp,
-            x2d = x2d_fp
-        ).call()
-
-        x1_fp  = ret.x1_nxt
-        x1d_fp = ret.x1d_nxt
-        x2_fp  = ret.x2_nxt
-        x2d_fp = ret.x2d_nxt
-
-        x1_fp_history.append (x1_fp)
-        x1d_fp_history.append(x1d_fp)
-        x2_fp_history.append (x2_fp)
-        x2d_fp_history.append(x2d_fp)
-        print(f'{i+1}th/{N} retrieved.')
-
-    x1_fp_history  = adjust_for_negative (x1_fp_history)
-    x1d_fp_history = adjust_for_negative (x1d_fp_history)
-    x2_fp_history  = adjust_for_negative (x2_fp_history)
-    x2d_fp_history = adjust_for_negative (x2d_fp_history)
-
-    print('x1_fp_history:')
-    print(f'  {x1_fp_history}')
-    print()
-
-    print('x2_fp_history:')
-    print(f'  {x2_fp_history}')
+            x1  = x1_fp_history[i],
+            x1d = x1d_fp_history[i],
+            x2  = x2_fp_history[i],
+            x2d = x2d_fp_history[i]
+        )) for i in range(3)
+    ])
+    for i, ret in enumerate(rets):
+        nxt = ret.result
+        assert (nxt.x1_nxt, nxt.x1d_nxt, nxt.x2_nxt, nxt.x2d_nxt) == \
+            (x1_fp_history[i+1], x1d_fp_history[i+1], x2_fp_history[i+1], x2d_fp_history[i+1])
+
+    # the contract must agree bit for bit with the fixed-point emulator
+    emulated = integrate('cho', dt_fp, [x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp], N)
+    for i, history in enumerate([x1_fp_history, x1d_fp_history, x2_fp_history, x2d_fp_history]):
+        assert from_felts(history).tolist() == emulated[:, i, 0].tolist()
+
+    # RK4_RECORD_DIR=... keeps the trajectory as a .rk4t file (see contract_harness.record)
+    t_fp_history = [t_0_fp + i*dt_fp for i in range(N+1)]
+    states = list(zip(t_fp_history, *[from_felts(h).tolist() for h in [x1_fp_history, x1d_fp_history, x2_fp_history, x2d_fp_history]]))
+    record('cho_rk4', CAIRO_PATH, SCALE_FP, dt_fp, states, fields=['t', 'x1', 'x1d', 'x2', 'x2d'])
+
 
+@pytest.mark.asyncio
+async def test_symplectic_integrators(contract):
+    # so must the symplectic integrators generated next to rk4
+    methods = ['verlet', 'yoshida4']
+    rets = await asyncio.gather(*[
+        view(getattr(contract, f'query_n_steps_{method}')(
+            t   = t_0_fp,
+            dt  = dt_fp,
+            x1  = x1_0_fp,
+            x1d = x1d_0_fp,
+            x2  = x2_0_fp,
+            x2d = x2d_0_fp,
+            n   = N
+        )) for method in methods
+    ])
+    for method, ret in zip(methods, rets):
+        emulated = integrate('cho', dt_fp, [x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp], N, method=method)
+        assert from_felts(ret.result.traj).tolist() == to_flat_traj(emulated)
+        print(f'{method}: {N} states match the emulator.')
+
+
+@pytest.mark.asyncio
+async def test_adaptive(contract):
+    # the adaptive (Dormand-Prince 5(4)) step covers the same T in far fewer steps; each call takes a batch
+    # of accepted steps and the next one goes on from the last returned state with the suggested dt
+    tol_fp = 10 # largest local error estimate accepted per step, fixed-point
+    n_batch = 10
+    state = (t_0_fp, x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp)
+    adaptive_dt_fp = dt_fp
+    adaptive_history = []
+    n_calls = 0
+    while state[0] < T * SCALE_FP:
+        x1_felt, x1d_felt, x2_felt, x2d_felt = to_felts(state[1:])
+        ret = await view(contract.query_n_adaptive(
+            t   = state[0],
+            dt  = adaptive_dt_fp,
+            x1  = x1_felt,
+            x1d = x1d_felt,
+            x2  = x2_felt,
+            x2d = x2d_felt,
+            tol = tol_fp,
+            n   = n_batch
+        ))
+        n_calls += 1
+        traj = from_felts(ret.result.traj).tolist()
+        adaptive_history += [tuple(traj[i:i+5]) for i in range(0, len(traj), 5)]
+        state = adaptive_history[-1]
+        adaptive_dt_fp = ret.result.dt_nxt
+    print(f'{len(adaptive_history)} adaptive steps in {n_calls} calls cover t={T} (rk4: {N} steps), final dt_fp={adaptive_dt_fp}')
+    assert len(adaptive_history) < N
+
+    emulated, _, _ = integrate_adaptive('cho', dt_fp, [x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp], tol_fp, len(adaptive_history))
+    assert adaptive_history == emulated
+
+
+@pytest.mark.asyncio
+async def test_stored_trajectory(contract):
+    # the stored trajectory moves forward in place with advance(n) transactions and is read back in one cheap
+    # get_state() call; after N steps in uneven chunks it must sit on the last state of query_n_steps
+    for n in [1, N//4, N - N//4 - 1]:
+        ret = await contract.advance(n).invoke()
+        print(f'advance({n}): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    ret = await view(contract.get_state())
+    print(f'get_state(): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    assert (ret.result.t, ret.result.dt) == (t_0_fp + N*dt_fp, dt_fp)
+    emulated = integrate('cho', dt_fp, [x1_0_fp, x1d_0_fp, x2_0_fp, x2d_0_fp], N)
+    assert from_felts([ret.result.x1, ret.result.x1d, ret.result.x2, ret.result.x2d]).tolist() == emulated[-1, :, 0].tolist()
@@ -1,247 +1,670 @@
 %lang starknet
 %builtins pedersen range_check
 
-from starkware.starknet.common.storage import Storage
+# Generated by script/generator-script-for-rk4.ipynb from the `o2d` spec -- edit the spec, not this file
+#   K1 = 6
+#   K2 = 10
+#   K3 = 13
+#   K4 = 15
+#   M = 2
+#   W = 600
+
+from starkware.cairo.common.alloc import alloc
 from starkware.cairo.common.cairo_builtins import HashBuiltin
-from starkware.cairo.common.math import (signed_div_rem, sign)
+from starkware.cairo.common.math import (abs_value, signed_div_rem, unsigned_div_rem)
+from starkware.cairo.common.math_cmp import is_le
 
 const RANGE_CHECK_BOUND = 2 ** 64
 const SCALE_FP = 10000
 
 # Generated problem-specific struct for holding the coordinates for dynamics (all in fixed-point representation)
 struct Dynamics:
-    member q1  : felt
-    member q1d : felt
-    member q2  : felt
-    member q2d : felt
+    member x  : felt
+    member xd : felt
+    member y  : felt
+    member yd : felt
 end
 
-# Generated function to compute the sum of two Dynamics structs
-func dynamics_add {range_check_ptr} (
-        state_a : Dynamics,
-        state_b : Dynamics
+@view
+func query_next_given_coordinates {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt
     ) -> (
-        state_z : Dynamics
+        x_nxt : felt,
+        xd_nxt : felt,
+        y_nxt : felt,
+        yd_nxt : felt
     ):
     alloc_locals
-    local q1_  = state_a.q1  + state_b.q1
-    local q1d_ = state_a.q1d + state_b.q1d
-    local q2_  = state_a.q2  + state_b.q2
-    local q2d_ = state_a.q2d + state_b.q2d
-    local state_z : Dynamics = Dynamics(q1=q1_, q1d=q1d_, q2=q2_, q2d=q2d_)
-    return (state_z)
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_nxt : Dynamics) = rk4 (t=t, dt=dt, state=state)
+
+    return (state_nxt.x, state_nxt.xd, state_nxt.y, state_nxt.yd)
 end
 
-# Generated function to compute a Dynamics struct multiplied by a fixed-point value
-func dynamics_mul_fp {range_check_ptr} (
-        state_a : Dynamics,
-        multiplier_fp  : felt
+@view
+func query_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt,
+        n : felt
     ) -> (
-        state_z : Dynamics
+        traj_len : felt,
+        traj : felt*
     ):
     alloc_locals
-    local q1  = state_a.q1
-    local q1d = state_a.q1d
-    local q2  = state_a.q2
-    local q2d = state_a.q2d
-    let (local q1_)  = mul_fp (q1,  multiplier_fp)
-    let (local q1d_) = mul_fp (q1d, multiplier_fp)
-    let (local q2_)  = mul_fp (q2,  multiplier_fp)
-    let (local q2d_) = mul_fp (q2d, multiplier_fp)
-    local state_z : Dynamics = Dynamics(q1=q1_, q1d=q1d_, q2=q2_, q2d=q2d_)
-    return (state_z)
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+
+    let (local traj : felt*) = alloc()
+    rk4_n_steps (t=t, dt=dt, state=state, n=n, traj=cast(traj, Dynamics*))
+
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
 end
 
-# Generated function to compute a Dynamics struct multiplied by a unit-less value
-func dynamics_mul_fp_ul {range_check_ptr} (
-        state_a : Dynamics,
-        multiplier_ul  : felt
+@view
+func query_next_given_ensemble {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        states_len : felt,
+        states : felt*
     ) -> (
-        state_z : Dynamics
+        states_nxt_len : felt,
+        states_nxt : felt*
     ):
     alloc_locals
-    local q1  = state_a.q1
-    local q1d = state_a.q1d
-    local q2  = state_a.q2
-    local q2d = state_a.q2d
-    let (local q1_)  = mul_fp_ul (q1,  multiplier_ul)
-    let (local q1d_) = mul_fp_ul (q1d, multiplier_ul)
-    let (local q2_)  = mul_fp_ul (q2,  multiplier_ul)
-    let (local q2d_) = mul_fp_ul (q2d, multiplier_ul)
-    local state_z : Dynamics = Dynamics(q1=q1_, q1d=q1d_, q2=q2_, q2d=q2d_)
-    return (state_z)
+    let (local m, r) = unsigned_div_rem(states_len, Dynamics.SIZE)
+    assert r = 0
+
+    let (local states_nxt : felt*) = alloc()
+    rk4_ensemble (t=t, dt=dt, m=m, n=m, states=states, states_nxt=states_nxt)
+
+    return (states_nxt_len=states_len, states_nxt=states_nxt)
 end
 
-# Generated function to compute a Dynamics struct divided by a unit-less value
-func dynamics_div_fp_ul {range_check_ptr} (
-        state_a : Dynamics,
-        divisor_ul  : felt
-    ) -> (
-        state_z : Dynamics
+# Generated storage of the shared trajectory: t, dt and the Dynamics state, set once by the
+# constructor and moved forward in place by advance(n); every viewer reads it with get_state()
+@storage_var
+func stored_t () -> (t : felt):
+end
+
+@storage_var
+func stored_dt () -> (dt : felt):
+end
+
+@storage_var
+func stored_state () -> (state : Dynamics):
+end
+
+@constructor
+func constructor {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt
+    ):
+    stored_t.write(t)
+    stored_dt.write(dt)
+    stored_state.write(Dynamics(x=x, xd=xd, y=y, yd=yd))
+    return ()
+end
+
+@external
+func advance {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} (
+        n : felt
     ):
     alloc_locals
-    local q1  = state_a.q1
-    local q1d = state_a.q1d
-    local q2  = state_a.q2
-    local q2d = state_a.q2d
-    let (local q1_)  = div_fp_ul (q1,  divisor_ul)
-    let (local q1d_) = div_fp_ul (q1d, divisor_ul)
-    let (local q2_)  = div_fp_ul (q2,  divisor_ul)
-    let (local q2d_) = div_fp_ul (q2d, divisor_ul)
-    local state_z : Dynamics = Dynamics(q1=q1_, q1d=q1d_, q2=q2_, q2d=q2d_)
-    return (state_z)
+    let (local t) = stored_t.read()
+    let (local dt) = stored_dt.read()
+    let (local state : Dynamics) = stored_state.read()
+    local syscall_ptr : felt* = syscall_ptr
+    local pedersen_ptr : HashBuiltin* = pedersen_ptr
+    let (local state_nxt : Dynamics) = rk4_advance (t=t, dt=dt, state=state, n=n)
+
+    stored_t.write(t + n*dt)
+    stored_state.write(state_nxt)
+    return ()
 end
 
-### Utility functions for fixed-point arithmetic
+@view
+func get_state {syscall_ptr : felt*, pedersen_ptr : HashBuiltin*, range_check_ptr} () -> (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt
+    ):
+    alloc_locals
+    let (local t) = stored_t.read()
+    let (local dt) = stored_dt.read()
+    let (local state : Dynamics) = stored_state.read()
+    return (t, dt, state.x, state.xd, state.y, state.yd)
+end
 
-func mul_fp {range_check_ptr} (
-        a : felt,
-        b : felt
+# Generated Runge-Kutta 4th-order method for Dynamics state
+func rk4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics
     ) -> (
-        c : felt
+        state_nxt : Dynamics
     ):
-    # signed_div_rem by SCALE_FP after multiplication
-    tempvar product = a * b
-    let (c, _) = signed_div_rem(product, SCALE_FP, RANGE_CHECK_BOUND)
-    return (c)
+    alloc_locals
+    # k1 stage
+    let (local k1_state_diff : Dynamics) = eval (state)
+    let (local k1_x, _) = signed_div_rem(k1_state_diff.x * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_xd, _) = signed_div_rem(k1_state_diff.xd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_y, _) = signed_div_rem(k1_state_diff.y * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k1_yd, _) = signed_div_rem(k1_state_diff.yd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # k2 stage
+    let (local k1_x_half, _) = signed_div_rem(k1_x, 2, RANGE_CHECK_BOUND)
+    let (local k1_xd_half, _) = signed_div_rem(k1_xd, 2, RANGE_CHECK_BOUND)
+    let (local k1_y_half, _) = signed_div_rem(k1_y, 2, RANGE_CHECK_BOUND)
+    let (local k1_yd_half, _) = signed_div_rem(k1_yd, 2, RANGE_CHECK_BOUND)
+    local k2_state : Dynamics = Dynamics(
+        x = state.x + k1_x_half,
+        xd = state.xd + k1_xd_half,
+        y = state.y + k1_y_half,
+        yd = state.yd + k1_yd_half
+    )
+    let (local k2_state_diff : Dynamics) = eval (k2_state)
+    let (local k2_x, _) = signed_div_rem(k2_state_diff.x * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_xd, _) = signed_div_rem(k2_state_diff.xd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_y, _) = signed_div_rem(k2_state_diff.y * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_yd, _) = signed_div_rem(k2_state_diff.yd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # k3 stage
+    let (local k2_x_half, _) = signed_div_rem(k2_x, 2, RANGE_CHECK_BOUND)
+    let (local k2_xd_half, _) = signed_div_rem(k2_xd, 2, RANGE_CHECK_BOUND)
+    let (local k2_y_half, _) = signed_div_rem(k2_y, 2, RANGE_CHECK_BOUND)
+    let (local k2_yd_half, _) = signed_div_rem(k2_yd, 2, RANGE_CHECK_BOUND)
+    local k3_state : Dynamics = Dynamics(
+        x = state.x + k2_x_half,
+        xd = state.xd + k2_xd_half,
+        y = state.y + k2_y_half,
+        yd = state.yd + k2_yd_half
+    )
+    let (local k3_state_diff : Dynamics) = eval (k3_state)
+    let (local k3_x, _) = signed_div_rem(k3_state_diff.x * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_xd, _) = signed_div_rem(k3_state_diff.xd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_y, _) = signed_div_rem(k3_state_diff.y * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_yd, _) = signed_div_rem(k3_state_diff.yd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # k4 stage
+    local k4_state : Dynamics = Dynamics(
+        x = state.x + k3_x,
+        xd = state.xd + k3_xd,
+        y = state.y + k3_y,
+        yd = state.yd + k3_yd
+    )
+    let (local k4_state_diff : Dynamics) = eval (k4_state)
+    let (local k4_x, _) = signed_div_rem(k4_state_diff.x * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_xd, _) = signed_div_rem(k4_state_diff.xd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_y, _) = signed_div_rem(k4_state_diff.y * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_yd, _) = signed_div_rem(k4_state_diff.yd * dt, SCALE_FP, RANGE_CHECK_BOUND)
+
+    # sum k, div 6, obtain state_nxt
+    let (local delta_x, _) = signed_div_rem(k1_x + 2 * k2_x + 2 * k3_x + k4_x, 6, RANGE_CHECK_BOUND)
+    let (local delta_xd, _) = signed_div_rem(k1_xd + 2 * k2_xd + 2 * k3_xd + k4_xd, 6, RANGE_CHECK_BOUND)
+    let (local delta_y, _) = signed_div_rem(k1_y + 2 * k2_y + 2 * k3_y + k4_y, 6, RANGE_CHECK_BOUND)
+    let (local delta_yd, _) = signed_div_rem(k1_yd + 2 * k2_yd + 2 * k3_yd + k4_yd, 6, RANGE_CHECK_BOUND)
+    local state_nxt : Dynamics = Dynamics(
+        x = state.x + delta_x,
+        xd = state.xd + delta_xd,
+        y = state.y + delta_y,
+        yd = state.yd + delta_yd
+    )
+
+    return (state_nxt)
+end
+
+# Generated function to run rk4 n times in a row, appending each Dynamics state to traj
+func rk4_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt) = rk4 (t=t, dt=dt, state=state)
+    assert [traj] = state_nxt
+
+    rk4_n_steps (t=t+dt, dt=dt, state=state_nxt, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
+end
+
+# Generated function to run rk4 once for each of n states laid out as struct-of-arrays
+# (states[0:m] holds x of every state, states[m:2m] holds xd, and so on)
+func rk4_ensemble {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        m : felt,
+        n : felt,
+        states : felt*,
+        states_nxt : felt*
+    ):
+    alloc_locals
+    if n == 0:
+        return ()
+    end
+
+    local state : Dynamics = Dynamics(
+        x  = [states],
+        xd = [states + m],
+        y  = [states + 2*m],
+        yd = [states + 3*m]
+    )
+    let (local state_nxt : Dynamics) = rk4 (t=t, dt=dt, state=state)
+    assert [states_nxt]       = state_nxt.x
+    assert [states_nxt + m]   = state_nxt.xd
+    assert [states_nxt + 2*m] = state_nxt.y
+    assert [states_nxt + 3*m] = state_nxt.yd
+
+    rk4_ensemble (t=t, dt=dt, m=m, n=n-1, states=states+1, states_nxt=states_nxt+1)
+    return ()
 end
 
-func div_fp {range_check_ptr} (
-        a : felt,
-        b : felt
+# Generated function to run rk4 n times in a row, keeping only the last Dynamics state
+func rk4_advance {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        n : felt
     ) -> (
-        c : felt
+        state_nxt : Dynamics
     ):
-    # multiply by SCALE_FP before signed_div_rem
-    tempvar a_scaled = a * SCALE_FP
-    let (c, _) = signed_div_rem(a_scaled, b, RANGE_CHECK_BOUND)
-    return (c)
+    if n == 0:
+        return (state)
+    end
+
+    let (state_nxt) = rk4 (t=t, dt=dt, state=state)
+    let (state_end) = rk4_advance (t=t+dt, dt=dt, state=state_nxt, n=n-1)
+    return (state_end)
 end
 
-func mul_fp_ul {range_check_ptr} (
-        a : felt,
-        b_ul : felt
+@view
+func query_next_adaptive {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt,
+        tol : felt
     ) -> (
-        c : felt
+        t_nxt : felt,
+        dt_nxt : felt,
+        err : felt,
+        x_nxt : felt,
+        xd_nxt : felt,
+        y_nxt : felt,
+        yd_nxt : felt
     ):
-    let c = a * b_ul
-    return (c)
+    alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local t_nxt, local dt_nxt, local err, local state_nxt : Dynamics, _) = dopri_step (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol)
+
+    return (t_nxt, dt_nxt, err, state_nxt.x, state_nxt.xd, state_nxt.y, state_nxt.yd)
 end
 
-func div_fp_ul {range_check_ptr} (
-        a : felt,
-        b_ul : felt
+@view
+func query_n_adaptive {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt,
+        tol : felt,
+        n : felt
     ) -> (
-        c : felt
+        dt_nxt : felt,
+        n_rejected : felt,
+        traj_len : felt,
+        traj : felt*
     ):
-    let (c, _) = signed_div_rem(a, b_ul, RANGE_CHECK_BOUND)
-    return (c)
+    alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+
+    let (local traj : felt*) = alloc()
+    let (local state_diff : Dynamics) = eval (state)
+    let (dt_nxt, n_rejected) = dopri_n_steps (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol, n=n, n_rejected=0, traj=traj)
+
+    return (dt_nxt=dt_nxt, n_rejected=n_rejected, traj_len=n*(Dynamics.SIZE+1), traj=traj)
 end
 
-# Generated Runge-Kutta 4th-order method for Dynamics state
-func rk4 {range_check_ptr} (
+# Generated Dormand-Prince 5(4) step for Dynamics state: the 5th-order state_nxt and err, the largest
+# component of the embedded error estimate (absolute, fixed-point). The k's are kept unrounded (scaled by
+# SCALE_FP**2) and every stage state is truncated once, which halves the signed_div_rem count.
+# The derivative at state comes in as k1_state_diff and the one at state_nxt goes out (first same as
+# last), so consecutive steps take 6 evals each instead of 7
+func dopri {range_check_ptr} (
         t : felt,
         dt : felt,
-        state : Dynamics
+        state : Dynamics,
+        k1_state_diff : Dynamics
     ) -> (
-        state_nxt : Dynamics
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics,
+        err : felt
     ):
     alloc_locals
     # k1 stage
-    local k1_state : Dynamics            = state
-    let (local k1_state_diff : Dynamics) = eval (k1_state)
-    let (local k1 : Dynamics)            = dynamics_mul_fp (k1_state_diff, dt)
+    local k1_x = k1_state_diff.x * dt
+    local k1_xd = k1_state_diff.xd * dt
+    local k1_y = k1_state_diff.y * dt
+    local k1_yd = k1_state_diff.yd * dt
 
     # k2 stage
-    let (local k1_half : Dynamics)       = dynamics_div_fp_ul (k1, 2)
-    let (local k2_state : Dynamics)      = dynamics_add(state, k1_half)
+    let (local k2_x_delta, _) = signed_div_rem(k1_x, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_xd_delta, _) = signed_div_rem(k1_xd, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_y_delta, _) = signed_div_rem(k1_y, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k2_yd_delta, _) = signed_div_rem(k1_yd, 5 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k2_state : Dynamics = Dynamics(
+        x = state.x + k2_x_delta,
+        xd = state.xd + k2_xd_delta,
+        y = state.y + k2_y_delta,
+        yd = state.yd + k2_yd_delta
+    )
     let (local k2_state_diff : Dynamics) = eval (k2_state)
-    let (local k2 : Dynamics)            = dynamics_mul_fp (k2_state_diff, dt)
+    local k2_x = k2_state_diff.x * dt
+    local k2_xd = k2_state_diff.xd * dt
+    local k2_y = k2_state_diff.y * dt
+    local k2_yd = k2_state_diff.yd * dt
 
     # k3 stage
-    let (local k2_half : Dynamics)       = dynamics_div_fp_ul (k2, 2)
-    let (local k3_state : Dynamics)      = dynamics_add(state, k2_half)
+    let (local k3_x_delta, _) = signed_div_rem(3 * k1_x + 9 * k2_x, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_xd_delta, _) = signed_div_rem(3 * k1_xd + 9 * k2_xd, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_y_delta, _) = signed_div_rem(3 * k1_y + 9 * k2_y, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k3_yd_delta, _) = signed_div_rem(3 * k1_yd + 9 * k2_yd, 40 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k3_state : Dynamics = Dynamics(
+        x = state.x + k3_x_delta,
+        xd = state.xd + k3_xd_delta,
+        y = state.y + k3_y_delta,
+        yd = state.yd + k3_yd_delta
+    )
     let (local k3_state_diff : Dynamics) = eval (k3_state)
-    let (local k3 : Dynamics)            = dynamics_mul_fp (k3_state_diff, dt)
+    local k3_x = k3_state_diff.x * dt
+    local k3_xd = k3_state_diff.xd * dt
+    local k3_y = k3_state_diff.y * dt
+    local k3_yd = k3_state_diff.yd * dt
 
     # k4 stage
-    let (local k4_state : Dynamics)      = dynamics_add(state, k3)
+    let (local k4_x_delta, _) = signed_div_rem(44 * k1_x - 168 * k2_x + 160 * k3_x, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_xd_delta, _) = signed_div_rem(44 * k1_xd - 168 * k2_xd + 160 * k3_xd, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_y_delta, _) = signed_div_rem(44 * k1_y - 168 * k2_y + 160 * k3_y, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k4_yd_delta, _) = signed_div_rem(44 * k1_yd - 168 * k2_yd + 160 * k3_yd, 45 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k4_state : Dynamics = Dynamics(
+        x = state.x + k4_x_delta,
+        xd = state.xd + k4_xd_delta,
+        y = state.y + k4_y_delta,
+        yd = state.yd + k4_yd_delta
+    )
     let (local k4_state_diff : Dynamics) = eval (k4_state)
-    let (local k4 : Dynamics)            = dynamics_mul_fp (k4_state_diff, dt)
+    local k4_x = k4_state_diff.x * dt
+    local k4_xd = k4_state_diff.xd * dt
+    local k4_y = k4_state_diff.y * dt
+    local k4_yd = k4_state_diff.yd * dt
+
+    # k5 stage
+    let (local k5_x_delta, _) = signed_div_rem(19372 * k1_x - 76080 * k2_x + 64448 * k3_x - 1908 * k4_x, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_xd_delta, _) = signed_div_rem(19372 * k1_xd - 76080 * k2_xd + 64448 * k3_xd - 1908 * k4_xd, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_y_delta, _) = signed_div_rem(19372 * k1_y - 76080 * k2_y + 64448 * k3_y - 1908 * k4_y, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k5_yd_delta, _) = signed_div_rem(19372 * k1_yd - 76080 * k2_yd + 64448 * k3_yd - 1908 * k4_yd, 6561 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k5_state : Dynamics = Dynamics(
+        x = state.x + k5_x_delta,
+        xd = state.xd + k5_xd_delta,
+        y = state.y + k5_y_delta,
+        yd = state.yd + k5_yd_delta
+    )
+    let (local k5_state_diff : Dynamics) = eval (k5_state)
+    local k5_x = k5_state_diff.x * dt
+    local k5_xd = k5_state_diff.xd * dt
+    local k5_y = k5_state_diff.y * dt
+    local k5_yd = k5_state_diff.yd * dt
+
+    # k6 stage
+    let (local k6_x_delta, _) = signed_div_rem(477901 * k1_x - 1806240 * k2_x + 1495424 * k3_x + 46746 * k4_x - 45927 * k5_x, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_xd_delta, _) = signed_div_rem(477901 * k1_xd - 1806240 * k2_xd + 1495424 * k3_xd + 46746 * k4_xd - 45927 * k5_xd, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_y_delta, _) = signed_div_rem(477901 * k1_y - 1806240 * k2_y + 1495424 * k3_y + 46746 * k4_y - 45927 * k5_y, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k6_yd_delta, _) = signed_div_rem(477901 * k1_yd - 1806240 * k2_yd + 1495424 * k3_yd + 46746 * k4_yd - 45927 * k5_yd, 167904 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k6_state : Dynamics = Dynamics(
+        x = state.x + k6_x_delta,
+        xd = state.xd + k6_xd_delta,
+        y = state.y + k6_y_delta,
+        yd = state.yd + k6_yd_delta
+    )
+    let (local k6_state_diff : Dynamics) = eval (k6_state)
+    local k6_x = k6_state_diff.x * dt
+    local k6_xd = k6_state_diff.xd * dt
+    local k6_y = k6_state_diff.y * dt
+    local k6_yd = k6_state_diff.yd * dt
+
+    # k7 stage
+    let (local k7_x_delta, _) = signed_div_rem(12985 * k1_x + 64000 * k3_x + 92750 * k4_x - 45927 * k5_x + 18656 * k6_x, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_xd_delta, _) = signed_div_rem(12985 * k1_xd + 64000 * k3_xd + 92750 * k4_xd - 45927 * k5_xd + 18656 * k6_xd, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_y_delta, _) = signed_div_rem(12985 * k1_y + 64000 * k3_y + 92750 * k4_y - 45927 * k5_y + 18656 * k6_y, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local k7_yd_delta, _) = signed_div_rem(12985 * k1_yd + 64000 * k3_yd + 92750 * k4_yd - 45927 * k5_yd + 18656 * k6_yd, 142464 * SCALE_FP, RANGE_CHECK_BOUND)
+    local k7_state : Dynamics = Dynamics(
+        x = state.x + k7_x_delta,
+        xd = state.xd + k7_xd_delta,
+        y = state.y + k7_y_delta,
+        yd = state.yd + k7_yd_delta
+    )
+    let (local k7_state_diff : Dynamics) = eval (k7_state)
+    local k7_x = k7_state_diff.x * dt
+    local k7_xd = k7_state_diff.xd * dt
+    local k7_y = k7_state_diff.y * dt
+    local k7_yd = k7_state_diff.yd * dt
+
+    # error estimate, k7_state being the 5th-order solution
+    let (local err_x, _) = signed_div_rem(26341 * k1_x - 90880 * k3_x + 790230 * k4_x - 1086939 * k5_x + 895488 * k6_x - 534240 * k7_x, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_x_abs) = abs_value(err_x)
+    let (local err_xd, _) = signed_div_rem(26341 * k1_xd - 90880 * k3_xd + 790230 * k4_xd - 1086939 * k5_xd + 895488 * k6_xd - 534240 * k7_xd, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_xd_abs) = abs_value(err_xd)
+    let (local err_y, _) = signed_div_rem(26341 * k1_y - 90880 * k3_y + 790230 * k4_y - 1086939 * k5_y + 895488 * k6_y - 534240 * k7_y, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_y_abs) = abs_value(err_y)
+    let (local err_yd, _) = signed_div_rem(26341 * k1_yd - 90880 * k3_yd + 790230 * k4_yd - 1086939 * k5_yd + 895488 * k6_yd - 534240 * k7_yd, 21369600 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local err_yd_abs) = abs_value(err_yd)
+    let (local err_max_1) = is_le(err_xd_abs, err_x_abs)
+    local err_1 = err_max_1 * err_x_abs + (1 - err_max_1) * err_xd_abs
+    let (local err_max_2) = is_le(err_y_abs, err_1)
+    local err_2 = err_max_2 * err_1 + (1 - err_max_2) * err_y_abs
+    let (local err_max_3) = is_le(err_yd_abs, err_2)
+    local err_3 = err_max_3 * err_2 + (1 - err_max_3) * err_yd_abs
+
+    return (state_nxt=k7_state, state_nxt_diff=k7_state_diff, err=err_3)
+end
 
-    # sum k, mul dt, div 6, obtain state_nxt
-    let (local k2_2)        = dynamics_mul_fp_ul (k2, 2)
-    let (local k3_2)        = dynamics_mul_fp_ul (k3, 2)
-    let (local sum_k1_2k2)  = dynamics_add (k1, k2_2) # wish we could overload operators..
-    let (local sum_2k3_k4)  = dynamics_add (k3_2, k4)
-    let (local k_sum)       = dynamics_add (sum_k1_2k2, sum_2k3_k4)
-    let (local state_delta) = dynamics_div_fp_ul (k_sum, 6)
-    let (local state_nxt)   = dynamics_add (state, state_delta)
+# Generated adaptive step: one dopri attempt, accepted if err <= tol (or if dt is already the smallest
+# fixed-point step); a rejected attempt returns t and state unchanged, to be retried with dt_nxt
+func dopri_step {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        tol : felt
+    ) -> (
+        t_nxt : felt,
+        dt_nxt : felt,
+        err : felt,
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
+    ):
+    alloc_locals
+    let (local state_5th : Dynamics, local state_5th_diff : Dynamics, local err) = dopri (
+        t=t, dt=dt, state=state, k1_state_diff=state_diff)
+    let (p, q) = dopri_factor (err=err, tol=tol)
+    let (dt_scaled, _) = unsigned_div_rem(dt * p, q)
+    local dt_nxt
+    if dt_scaled == 0:
+        dt_nxt = 1
+    else:
+        dt_nxt = dt_scaled
+    end
+
+    let (accept) = is_le(err, tol)
+    if accept == 1:
+        return (t_nxt=t+dt, dt_nxt=dt_nxt, err=err, state_nxt=state_5th, state_nxt_diff=state_5th_diff)
+    end
+    if dt == 1:
+        return (t_nxt=t+dt, dt_nxt=dt_nxt, err=err, state_nxt=state_5th, state_nxt_diff=state_5th_diff)
+    end
+    return (t_nxt=t, dt_nxt=dt_nxt, err=err, state_nxt=state, state_nxt_diff=state_diff)
+end
 
-    return (state_nxt)
+# Generated step size control: dt_nxt = dt * p/q for the largest ladder entry p/q <= 0.9 * (tol/err)^(1/5),
+# the thresholds being raised to the 5th power at generation time
+func dopri_factor {range_check_ptr} (
+        err : felt,
+        tol : felt
+    ) -> (
+        p : felt,
+        q : felt
+    ):
+    let (ok_0) = is_le(err * 312500000, tol * 59049)
+    if ok_0 == 1:
+        return (p=5, q=1)
+    end
+    let (ok_1) = is_le(err * 102400000, tol * 59049)
+    if ok_1 == 1:
+        return (p=4, q=1)
+    end
+    let (ok_2) = is_le(err * 24300000, tol * 59049)
+    if ok_2 == 1:
+        return (p=3, q=1)
+    end
+    let (ok_3) = is_le(err * 3200000, tol * 59049)
+    if ok_3 == 1:
+        return (p=2, q=1)
+    end
+    let (ok_4) = is_le(err * 24300000, tol * 1889568)
+    if ok_4 == 1:
+        return (p=3, q=2)
+    end
+    let (ok_5) = is_le(err * 312500000, tol * 60466176)
+    if ok_5 == 1:
+        return (p=5, q=4)
+    end
+    let (ok_6) = is_le(err * 100000, tol * 59049)
+    if ok_6 == 1:
+        return (p=1, q=1)
+    end
+    let (ok_7) = is_le(err * 102400000, tol * 184528125)
+    if ok_7 == 1:
+        return (p=4, q=5)
+    end
+    let (ok_8) = is_le(err * 24300000, tol * 184528125)
+    if ok_8 == 1:
+        return (p=3, q=5)
+    end
+    let (ok_9) = is_le(err * 3200000, tol * 184528125)
+    if ok_9 == 1:
+        return (p=2, q=5)
+    end
+    return (p=1, q=5)
 end
 
-# Problem-specific evaluation function for first-order derivative of x and xd
-func eval {range_check_ptr} (
-        state : Dynamics
+# Generated function to take n accepted adaptive steps in a row, appending t and the Dynamics state
+# to traj after each; rejected attempts are retried from the same state and counted
+func dopri_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        tol : felt,
+        n : felt,
+        n_rejected : felt,
+        traj : felt*
     ) -> (
-        state_diff : Dynamics
+        dt_nxt : felt,
+        n_rejected_nxt : felt
     ):
     alloc_locals
+    if n == 0:
+        return (dt_nxt=dt, n_rejected_nxt=n_rejected)
+    end
+
+    let (local t_nxt, local dt_nxt, _, local state_nxt : Dynamics, local state_nxt_diff : Dynamics) = dopri_step (
+        t=t, dt=dt, state=state, state_diff=state_diff, tol=tol)
+    if t_nxt == t:
+        let (dt_end, n_rejected_end) = dopri_n_steps (
+            t=t, dt=dt_nxt, state=state, state_diff=state_diff, tol=tol, n=n, n_rejected=n_rejected+1, traj=traj)
+        return (dt_end, n_rejected_end)
+    end
+    assert [traj] = t_nxt
+    assert [cast(traj + 1, Dynamics*)] = state_nxt
+
+    let (dt_end, n_rejected_end) = dopri_n_steps (
+        t=t_nxt, dt=dt_nxt, state=state_nxt, state_diff=state_nxt_diff, tol=tol, n=n-1, n_rejected=n_rejected,
+        traj=traj+1+Dynamics.SIZE)
+    return (dt_end, n_rejected_end)
+end
 
-    # unpack struct
-    local x  = state.q1
-    local xd = state.q1d
-    local y  = state.q2
-    local yd = state.q2d
-
-    # Scene setup
-    # TODO externalize these into storage vars once block time is more mangeable
-    const K1 = 6 * SCALE_FP
-    const K2 = 10 * SCALE_FP
-    const K3 = 13 * SCALE_FP
-    const K4 = 15 * SCALE_FP
-    const M = 2 * SCALE_FP
-    const W = 600 * SCALE_FP
-    const G = 98000 # 9.8 * 10000
+@view
+func query_next_verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt
+    ) -> (
+        x_nxt : felt,
+        xd_nxt : felt,
+        y_nxt : felt,
+        yd_nxt : felt
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local state_nxt : Dynamics, _) = verlet (t=t, dt=dt, state=state, state_diff=state_diff)
 
-    let x_diff = xd
-    let y_diff = yd
+    return (state_nxt.x, state_nxt.xd, state_nxt.y, state_nxt.yd)
+end
 
-    # ax = ( -k1*x + k2*(W-x) + k3*(W-x) -k4*x )/m
-    let (local k1x) = mul_fp (K1, x)
-    local Wmx = W-x
-    let (local k2Wmx) = mul_fp (K2, Wmx)
-    let (local k3Wmx) = mul_fp (K3, Wmx)
-    let (local k4x) = mul_fp (K4, x)
-    tempvar nominator_x = -k1x + k2Wmx + k3Wmx - k4x
-    let (local vx_diff) = div_fp (nominator_x, M)
-
-    # ay = ( -k1*y -k2*y + k3*(W-y) + k4*(W-y) )/m - G
-    local Wmy = W-y
-    let (local k1y) = mul_fp (K1, y)
-    let (local k2y) = mul_fp (K2, y)
-    let (local k3Wmy) = mul_fp (K3, Wmy)
-    let (local k4Wmy) = mul_fp (K4, Wmy)
-    tempvar nominator_y = -k1y - k2y + k3Wmy + k4Wmy
-    let (local vy_diff) = div_fp (nominator_y, M)
+@view
+func query_n_steps_verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt,
+        n : felt
+    ) -> (
+        traj_len : felt,
+        traj : felt*
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_diff : Dynamics) = eval (state)
 
-    local state_diff : Dynamics = Dynamics(
-        q1  = x_diff,
-        q1d = vx_diff,
-        q2  = y_diff,
-        q2d = vy_diff
-    )
+    let (local traj : felt*) = alloc()
+    verlet_n_steps (t=t, dt=dt, state=state, state_diff=state_diff, n=n, traj=cast(traj, Dynamics*))
 
-    return (state_diff)
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
 end
 
 @view
-func query_next_given_coordinates {
-        storage_ptr : Storage*,
-        pedersen_ptr : HashBuiltin*,
-        range_check_ptr
-    }(
+func query_next_yoshida4 {range_check_ptr} (
         t : felt,
         dt : felt,
         x : felt,
@@ -255,24 +678,170 @@ func query_next_given_coordinates {
         yd_nxt : felt
     ):
     alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_diff : Dynamics) = eval (state)
+    let (local state_nxt : Dynamics, _) = yoshida4 (t=t, dt=dt, state=state, state_diff=state_diff)
+
+    return (state_nxt.x, state_nxt.xd, state_nxt.y, state_nxt.yd)
+end
+
+@view
+func query_n_steps_yoshida4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        x : felt,
+        xd : felt,
+        y : felt,
+        yd : felt,
+        n : felt
+    ) -> (
+        traj_len : felt,
+        traj : felt*
+    ):
+    alloc_locals
+    local state : Dynamics = Dynamics(x=x, xd=xd, y=y, yd=yd) # packing
+    let (local state_diff : Dynamics) = eval (state)
 
-    # TODO: vectorize input
-    # TODO: structify output (not until testing framework supports this!)
-    # TODO: kindly ask Cairo team to enable vectorized function output
+    let (local traj : felt*) = alloc()
+    yoshida4_n_steps (t=t, dt=dt, state=state, state_diff=state_diff, n=n, traj=cast(traj, Dynamics*))
 
-    # Algorithm
-    #   use t, state to calculate next state at t+dt
-    #   return next state
+    return (traj_len=n*Dynamics.SIZE, traj=traj)
+end
 
-    local state : Dynamics = Dynamics(q1=x, q1d=xd, q2=y, q2d=yd) # packing
+# Generated velocity Verlet (kick-drift-kick) step for Dynamics state: one eval per step, the
+# accelerations at state coming in with state_diff and the ones at state_nxt going out
+func verlet {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics
+    ) -> (
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
+    ):
+    alloc_locals
+    # kick half a step, drift a whole one
+    let (local xd_kick, _) = signed_div_rem(state_diff.xd * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local xd_half = state.xd + xd_kick
+    let (local x_drift, _) = signed_div_rem(xd_half * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    let (local yd_kick, _) = signed_div_rem(state_diff.yd * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local yd_half = state.yd + yd_kick
+    let (local y_drift, _) = signed_div_rem(yd_half * dt, SCALE_FP, RANGE_CHECK_BOUND)
+    local state_drift : Dynamics = Dynamics(
+        x = state.x + x_drift,
+        xd = xd_half,
+        y = state.y + y_drift,
+        yd = yd_half
+    )
 
-    let (state_nxt) = rk4 (t=t, dt=dt, state=state)
+    # kick the other half with the accelerations at the new positions
+    let (local state_nxt_diff : Dynamics) = eval (state_drift)
+    let (local xd_kick_nxt, _) = signed_div_rem(state_nxt_diff.xd * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    let (local yd_kick_nxt, _) = signed_div_rem(state_nxt_diff.yd * dt, 2 * SCALE_FP, RANGE_CHECK_BOUND)
+    local state_nxt : Dynamics = Dynamics(
+        x = state_drift.x,
+        xd = xd_half + xd_kick_nxt,
+        y = state_drift.y,
+        yd = yd_half + yd_kick_nxt
+    )
+
+    return (state_nxt, state_nxt_diff)
+end
+
+const YOSHIDA_W1 = 135120719 # 1/(2 - 2^(1/3)) over YOSHIDA_DEN
+const YOSHIDA_DEN = 100000000
+
+# Generated 4th-order Yoshida step: three verlet substeps of w1*dt, (1-2*w1)*dt and w1*dt (the middle
+# one going back in time), three evals per step
+func yoshida4 {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics
+    ) -> (
+        state_nxt : Dynamics,
+        state_nxt_diff : Dynamics
+    ):
+    alloc_locals
+    let (local dt_outer, _) = signed_div_rem(dt * YOSHIDA_W1, YOSHIDA_DEN, RANGE_CHECK_BOUND)
+    local dt_inner = dt - 2 * dt_outer
+
+    let (local state_1 : Dynamics, local state_1_diff : Dynamics) = verlet (t=t, dt=dt_outer, state=state, state_diff=state_diff)
+    let (local state_2 : Dynamics, local state_2_diff : Dynamics) = verlet (t=t, dt=dt_inner, state=state_1, state_diff=state_1_diff)
+    let (local state_nxt : Dynamics, local state_nxt_diff : Dynamics) = verlet (t=t, dt=dt_outer, state=state_2, state_diff=state_2_diff)
 
-    local x_nxt  = state_nxt.q1 # unpacking
-    local xd_nxt = state_nxt.q1d
-    local y_nxt  = state_nxt.q2
-    local yd_nxt = state_nxt.q2d
+    return (state_nxt, state_nxt_diff)
+end
+
+# Generated function to run verlet n times in a row, appending each Dynamics state to traj
+func verlet_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt, state_nxt_diff) = verlet (t=t, dt=dt, state=state, state_diff=state_diff)
+    assert [traj] = state_nxt
 
-    return (x_nxt, xd_nxt, y_nxt, yd_nxt)
+    verlet_n_steps (t=t+dt, dt=dt, state=state_nxt, state_diff=state_nxt_diff, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
 end
 
+# Generated function to run yoshida4 n times in a row, appending each Dynamics state to traj
+func yoshida4_n_steps {range_check_ptr} (
+        t : felt,
+        dt : felt,
+        state : Dynamics,
+        state_diff : Dynamics,
+        n : felt,
+        traj : Dynamics*
+    ):
+    if n == 0:
+        return ()
+    end
+
+    let (state_nxt, state_nxt_diff) = yoshida4 (t=t, dt=dt, state=state, state_diff=state_diff)
+    assert [traj] = state_nxt
+
+    yoshida4_n_steps (t=t+dt, dt=dt, state=state_nxt, state_diff=state_nxt_diff, n=n-1, traj=traj+Dynamics.SIZE)
+    return ()
+end
+
+# Generated evaluation function for first-order derivative of state
+# (constants folded at generation time: 0 signed_div_rem per eval)
+func eval {range_check_ptr} (
+        state : Dynamics
+    ) -> (
+        state_diff : Dynamics
+    ):
+    alloc_locals
+
+    # unpack struct
+    local x  = state.x
+    local xd = state.xd
+    local y  = state.y
+    local yd = state.yd
+
+    # x_diff = xd
+    let x_diff = xd
+    # xd_diff = 6900 - 22*x
+    local xd_diff = -22 * x + 6900 * SCALE_FP
+    # y_diff = yd
+    let y_diff = yd
+    # yd_diff = 8400 - 22*y
+    local yd_diff = -22 * y + 8400 * SCALE_FP
+
+    local state_diff : Dynamics = Dynamics(
+        x  = x_diff,
+        xd = xd_diff,
+        y  = y_diff,
+        yd = yd_diff
+    )
+    return (state_diff)
+end
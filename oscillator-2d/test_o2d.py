@@ -1,94 +1,187 @@
+import os, sys
+import asyncio
 import pytest
-from starkware.starknet.testing.starknet import Starknet
-from timeit import default_timer as timer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from contract_harness import deploy, record, view
+from fp_emulator import integrate, integrate_adaptive, to_flat_traj
+from felt_codec import from_felts, to_felts
+from starknet_client import pack_ensemble, unpack_ensemble
+
+SCALE_FP = 10000 # consistent with SCALE_FP in the contract
+
+# set constants for the experiment
+W = 600 # consistent with const W set in contract
+
+# initial condition
+x_0 = 150.
+xd_0 = 100.
+y_0 = 250.
+yd_0 = 50.
+t_0 = 0.
+
+# simulation setup
+dt = 0.02
+T = 5
+
+x_0_fp  = int(x_0 * SCALE_FP)
+xd_0_fp = int(xd_0 * SCALE_FP)
+y_0_fp  = int(y_0 * SCALE_FP)
+yd_0_fp = int(yd_0 * SCALE_FP)
+t_0_fp  = int(t_0 * SCALE_FP)
+dt_fp   = int(dt * SCALE_FP)
+N = int(T//dt)
+CAIRO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'o2d.cairo')
+
+
+@pytest.fixture(scope='module')
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='module')
+async def contract():
+    # deployed once for the whole module; the constructor sets the shared trajectory
+    # (t, dt and the state kept in storage) the contract starts from
+    return await deploy(CAIRO_PATH, constructor_calldata=[t_0_fp, dt_fp, x_0_fp, xd_0_fp, y_0_fp, yd_0_fp])
 
 
 @pytest.mark.asyncio
-async def test_dict():
-    starknet = await Starknet.empty()
-    print()
-
-    contract = await starknet.deploy("o2d.cairo")
-
-    ## note: if passing negative numbers to cairo function => must mod P in python first;
-    ##       also, the return value from cairo has been mod P, so must detect neg value specifically
-    PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
-    PRIME_HALF = PRIME//2
-    SCALE_FP = 10000 # consistent with SCALE_FP in the contract
-
-    ## handling negative numbers returned by Cairo function (current testing framework does not handle this)
-    def adjust_for_negative (history):
-        return [e if e < PRIME_HALF else e-PRIME for e in history]
-
-    def adjust_for_negative_single (e):
-        return e if e < PRIME_HALF else e-PRIME
-
-    # set constants for the experiment
-    W = 600 # consistent with const W set in contract
-
-    # initial condition
-    x_0 = 150.
-    xd_0 = 100.
-    y_0 = 250.
-    yd_0 = 50.
-    t_0 = 0.
-
-    # simulation setup
-    dt = 0.02
-    T = 5
-
-    x_0_fp  = int(x_0 * SCALE_FP)
-    xd_0_fp = int(xd_0 * SCALE_FP)
-    y_0_fp  = int(y_0 * SCALE_FP)
-    yd_0_fp = int(yd_0 * SCALE_FP)
-    t_0_fp  = int(t_0 * SCALE_FP)
-    dt_fp   = int(dt * SCALE_FP)
-
-    # run rk4 integration continuously
-    t_fp  = t_0_fp
-    x_fp  = x_0_fp
-    xd_fp = xd_0_fp
-    y_fp  = y_0_fp
-    yd_fp = yd_0_fp
-    print(f'the lonely m starting at (x,y)=({x_fp},{y_fp}) with (v2,vy)=({xd_fp},{yd_fp})')
-
-    x_fp_history  = [x_fp]
-    xd_fp_history = [xd_fp]
-    y_fp_history  = [y_fp]
-    yd_fp_history = [yd_fp]
-
-    N = int(T//dt)
-    for i in range(N):
-        # TODO deal with negative input args
-        ret = await contract.query_next_given_coordinates(
-            t   = t_fp,
+async def test_rk4_trajectory(contract):
+    ret = await view(contract.query_n_steps(
+        t   = t_0_fp,
+        dt  = dt_fp,
+        x   = x_0_fp,
+        xd  = xd_0_fp,
+        y   = y_0_fp,
+        yd  = yd_0_fp,
+        n   = N
+    ))
+    traj = ret.result.traj
+    assert len(traj) == N*4
+    print(f'{N} states retrieved in one call.')
+
+    x_fp_history  = [x_0_fp]  + traj[0::4]
+    xd_fp_history = [xd_0_fp] + traj[1::4]
+    y_fp_history  = [y_0_fp]  + traj[2::4]
+    yd_fp_history = [yd_0_fp] + traj[3::4]
+
+    # the first few steps must agree with single-step queries
+    rets = await asyncio.gather(*[
+        view(contract.query_next_given_coordinates(
+            t   = t_0_fp + i*dt_fp,
             dt  = dt_fp,
-            x   = x_fp,
-            xd  = xd_fp,
-            y   = y_fp,
-            yd  = yd_fp
-        ).call()
-
-        x_fp  = ret.x_nxt
-        xd_fp = ret.xd_nxt
-        y_fp  = ret.y_nxt
-        yd_fp = ret.yd_nxt
-
-        x_fp_history.append (x_fp)
-        xd_fp_history.append(xd_fp)
-        y_fp_history.append (y_fp)
-        yd_fp_history.append(yd_fp)
-        print(f'{i+1}th/{N} retrieved.')
-
-    x_fp_history  = adjust_for_negative (x_fp_history)
-    xd_fp_history = adjust_for_negative (xd_fp_history)
-    y_fp_history  = adjust_for_negative (y_fp_history)
-    yd_fp_history = adjust_for_negative (yd_fp_history)
-
-    print('x_fp_history:')
-    print(f'  {x_fp_history}')
-    print()
-
-    print('y_fp_history:')
-    print(f'  {y_fp_history}')
+            x   = x_fp_history[i],
+            xd  = xd_fp_history[i],
+            y   = y_fp_history[i],
+            yd  = yd_fp_history[i]
+        )) for i in range(3)
+    ])
+    for i, ret in enumerate(rets):
+        nxt = ret.result
+        assert (nxt.x_nxt, nxt.xd_nxt, nxt.y_nxt, nxt.yd_nxt) == \
+            (x_fp_history[i+1], xd_fp_history[i+1], y_fp_history[i+1], yd_fp_history[i+1])
+
+    # the contract must agree bit for bit with the fixed-point emulator
+    emulated = integrate('o2d', dt_fp, [x_0_fp, xd_0_fp, y_0_fp, yd_0_fp], N)
+    for i, history in enumerate([x_fp_history, xd_fp_history, y_fp_history, yd_fp_history]):
+        assert from_felts(history).tolist() == emulated[:, i, 0].tolist()
+
+    # RK4_RECORD_DIR=... keeps the trajectory as a .rk4t file (see contract_harness.record)
+    t_fp_history = [t_0_fp + i*dt_fp for i in range(N+1)]
+    states = list(zip(t_fp_history, *[from_felts(h).tolist() for h in [x_fp_history, xd_fp_history, y_fp_history, yd_fp_history]]))
+    record('o2d_rk4', CAIRO_PATH, SCALE_FP, dt_fp, states, fields=['t', 'x', 'xd', 'y', 'yd'])
+
 
+@pytest.mark.asyncio
+async def test_symplectic_integrators(contract):
+    # so must the symplectic integrators generated next to rk4
+    methods = ['verlet', 'yoshida4']
+    rets = await asyncio.gather(*[
+        view(getattr(contract, f'query_n_steps_{method}')(
+            t  = t_0_fp,
+            dt = dt_fp,
+            x  = x_0_fp,
+            xd = xd_0_fp,
+            y  = y_0_fp,
+            yd = yd_0_fp,
+            n  = N
+        )) for method in methods
+    ])
+    for method, ret in zip(methods, rets):
+        emulated = integrate('o2d', dt_fp, [x_0_fp, xd_0_fp, y_0_fp, yd_0_fp], N, method=method)
+        assert from_felts(ret.result.traj).tolist() == to_flat_traj(emulated)
+        print(f'{method}: {N} states match the emulator.')
+
+
+@pytest.mark.asyncio
+async def test_ensemble(contract):
+    # one call advances a whole ensemble of states (struct-of-arrays calldata)
+    ics = [
+        (x_0_fp, xd_0_fp, y_0_fp, yd_0_fp),
+        (-x_0_fp, 0, y_0_fp, -yd_0_fp),
+        (0, -xd_0_fp, -y_0_fp, 0),
+        (W * SCALE_FP, xd_0_fp, 0, yd_0_fp),
+        (123456, -654321, -11111, 22222)
+    ]
+    ret = await view(contract.query_next_given_ensemble(
+        t      = t_0_fp,
+        dt     = dt_fp,
+        states = to_felts(pack_ensemble(ics))
+    ))
+    nxt = unpack_ensemble(from_felts(ret.result.states_nxt).tolist(), 4)
+    assert len(nxt) == len(ics)
+    print(f'{len(ics)} states advanced in one call.')
+
+    emulated = integrate('o2d', dt_fp, [list(v) for v in zip(*ics)], 1)
+    assert nxt == [tuple(emulated[1, :, j].tolist()) for j in range(len(ics))]
+
+
+@pytest.mark.asyncio
+async def test_adaptive(contract):
+    # the adaptive (Dormand-Prince 5(4)) step covers the same T in far fewer steps; each call takes a batch
+    # of accepted steps and the next one goes on from the last returned state with the suggested dt
+    tol_fp = 10 # largest local error estimate accepted per step, fixed-point
+    n_batch = 10
+    state = (t_0_fp, x_0_fp, xd_0_fp, y_0_fp, yd_0_fp)
+    adaptive_dt_fp = dt_fp
+    adaptive_history = []
+    n_calls = 0
+    while state[0] < T * SCALE_FP:
+        x_felt, xd_felt, y_felt, yd_felt = to_felts(state[1:])
+        ret = await view(contract.query_n_adaptive(
+            t   = state[0],
+            dt  = adaptive_dt_fp,
+            x   = x_felt,
+            xd  = xd_felt,
+            y   = y_felt,
+            yd  = yd_felt,
+            tol = tol_fp,
+            n   = n_batch
+        ))
+        n_calls += 1
+        traj = from_felts(ret.result.traj).tolist()
+        adaptive_history += [tuple(traj[i:i+5]) for i in range(0, len(traj), 5)]
+        state = adaptive_history[-1]
+        adaptive_dt_fp = ret.result.dt_nxt
+    print(f'{len(adaptive_history)} adaptive steps in {n_calls} calls cover t={T} (rk4: {N} steps), final dt_fp={adaptive_dt_fp}')
+    assert len(adaptive_history) < N
+
+    emulated, _, _ = integrate_adaptive('o2d', dt_fp, [x_0_fp, xd_0_fp, y_0_fp, yd_0_fp], tol_fp, len(adaptive_history))
+    assert adaptive_history == emulated
+
+
+@pytest.mark.asyncio
+async def test_stored_trajectory(contract):
+    # the stored trajectory moves forward in place with advance(n) transactions and is read back in one cheap
+    # get_state() call; after N steps in uneven chunks it must sit on the last state of query_n_steps
+    for n in [1, N//4, N - N//4 - 1]:
+        ret = await contract.advance(n).invoke()
+        print(f'advance({n}): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    ret = await view(contract.get_state())
+    print(f'get_state(): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    assert (ret.result.t, ret.result.dt) == (t_0_fp + N*dt_fp, dt_fp)
+    emulated = integrate('o2d', dt_fp, [x_0_fp, xd_0_fp, y_0_fp, yd_0_fp], N)
+    assert from_felts([ret.result.x, ret.result.xd, ret.result.y, ret.result.yd]).tolist() == emulated[-1, :, 0].tolist()
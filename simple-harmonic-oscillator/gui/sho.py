@@ -1,56 +1,42 @@
 import pygame, sys
 import numpy as np
-import subprocess
+import os
 import time
 import json
 from timeit import default_timer as timer
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../common'))
+from starknet_client import StarkNetClient
+from felt_codec import to_felts
+from metrics import Metrics, JsonLinesExporter, PrometheusExporter, SampledLogger, summary
+from pipeline import TrajectoryFetcher
+from trajectory_file import TrajectoryReader, TrajectoryWriter
+from cycle import CyclicSource
+from interpolation import HermiteInterpolator
+from frame_scheduler import FrameScheduler
+from renderer import SceneRenderer
+
 # text box initialization
 def update_message (message):
-	font = pygame.font.Font(None, 24)
-	text = font.render(message, 1, (0, 0, 0))
-	text_rect = text.get_rect(center =(WIDTH / 2, HEIGHT-50))
-	screen.fill ((255,255,255), (0, HEIGHT-100, WIDTH, 100))
-	screen.blit(text, text_rect)
-
-	pygame.display.update()
+	renderer.set_message(message, None, 24, (0, 0, 0), (WIDTH / 2, HEIGHT-50))
 
-# utility function to execute shell command and parse result
-def subprocess_run (cmd):
-	result = subprocess.run(cmd, stdout=subprocess.PIPE)
-	result = result.stdout.decode('utf-8')[:-1] # remove trailing newline
-	return result
-
-# redraw the screen and the mass at new x location
+# redraw the mass at new x location
 def update_figures(ball_x):
-	screen.fill (BG_COLOR, (0, 0, WIDTH, HEIGHT-100)) # reset screen first
-
-	# draw the point mass
-	pygame.draw.circle(
-		screen,
-		BALL_COLOR,
-		(ball_x, BALL_Y), # center coordinate
-		BALL_RADIUS,
-		0 # fill the circle
-	)
+	renderer.begin_frame()
 
 	# draw the spring for fun
 	spring_circle_first_x = SPRING_CIRCLE_RADIUS
 	spring_circle_last_x = ball_x - BALL_RADIUS - SPRING_CIRCLE_RADIUS
-	spring_circle_distance = (spring_circle_last_x - spring_circle_first_x)/(N_SPRING_CIRCLE-1)
+	renderer.draw_spring(
+		(spring_circle_first_x, BALL_Y),
+		(spring_circle_last_x, BALL_Y),
+		N_SPRING_CIRCLE, SPRING_CIRCLE_RADIUS, SPRING_COLOR
+	)
 
-	spring_circle_x = spring_circle_first_x
-	for i in range(N_SPRING_CIRCLE):
-		pygame.draw.circle(
-			screen,
-			SPRING_COLOR,
-			(spring_circle_x, BALL_Y), # center coordinate
-			SPRING_CIRCLE_RADIUS,
-			1
-		)
-		spring_circle_x += spring_circle_distance
+	# draw the point mass
+	renderer.draw_ball((ball_x, BALL_Y), BALL_RADIUS, BALL_COLOR)
 
-	pygame.display.update()
+	renderer.end_frame()
 
 # scene setup
 WIDTH = 600
@@ -68,15 +54,76 @@ BALL_X_OFFSET = 300
 BALL_Y = 300
 
 # contract setup
-CONTRACT_ADDRESS = '0x3280705f884bb08c0fd6c53f67e51d1b06c8118397f68234072a78a63b13c9c'
+# the regenerated contract is not deployed yet (the original one, at 0x3280705f884bb08c0fd6c53f67e51d1b06c8118397f68234072a78a63b13c9c,
+# has none of the views after query_next_given_coordinates): until it is, the GUIs run it locally and refuse --remote
+CONTRACT_ADDRESS = None
 SCALE_FP = 10000 # for fixed-point arithmetic
-PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
-PRIME_HALF = PRIME//2
+
+# `--metrics-jsonl FILE` ('-' for stdout) appends a json line every METRICS_INTERVAL_S with the latencies
+# (p50/p95/p99) of contract calls, decoding, fetching and rendering, steps and frames per second and the
+# fetch queue depth; `--metrics-prom FILE` keeps the same figures in a Prometheus text file. Retrieval
+# messages are sampled, at most one per LOG_INTERVAL_S
+METRICS_INTERVAL_S = 10
+LOG_INTERVAL_S = 5
+exporters = []
+if '--metrics-jsonl' in sys.argv:
+	exporters.append(JsonLinesExporter(sys.argv[sys.argv.index('--metrics-jsonl')+1]))
+if '--metrics-prom' in sys.argv:
+	exporters.append(PrometheusExporter(sys.argv[sys.argv.index('--metrics-prom')+1]))
+metrics = Metrics(exporters, interval=METRICS_INTERVAL_S)
+log = SampledLogger(LOG_INTERVAL_S)
+
+# the compiled contract (sho_compiled.json) runs in a Cairo VM inside this process (local_client.py, needs
+# cairo-lang): same results as a deployment of it, without the network; the trajectory of --shared is then stored in
+# this process, set from the initial state below, and only this viewer can move it (--drive N). `--remote` calls the
+# deployment at CONTRACT_ADDRESS instead
+REMOTE = '--remote' in sys.argv
+COMPILED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../sho_compiled.json')
+
+# `--integrator verlet|yoshida4` animates one of the contract's symplectic integrators instead of rk4
+# (one or three force evaluations per step instead of four, and an energy error that does not drift)
+INTEGRATOR = sys.argv[sys.argv.index('--integrator')+1] if '--integrator' in sys.argv else 'rk4'
+N_STEPS_FUNCTION = 'query_n_steps' if INTEGRATOR == 'rk4' else f'query_n_steps_{INTEGRATOR}'
+
+# `--adaptive TOL` integrates with the contract's adaptive step (query_n_adaptive) instead of fixed-dt rk4:
+# TOL is the largest local error accepted per step, in units of x; steps then cover varying simulated time
+# and are paced by it, and no cycle is looked for since the next step depends on dt as well as the state
+ADAPTIVE_TOL_FP = int( float(sys.argv[sys.argv.index('--adaptive')+1]) * SCALE_FP ) if '--adaptive' in sys.argv else None
+
+# `--shared` follows the trajectory stored in the contract instead of integrating a private one, so that any
+# number of viewers see the same motion, each polling it with one small get_state read; with `--drive N` this
+# viewer also moves it forward with advance(N) transactions (one driver per deployment is enough). The stored
+# trajectory starts from the constructor calldata, which --remote prints until CONTRACT_ADDRESS is set
+SHARED = '--shared' in sys.argv
+N_DRIVE = int(sys.argv[sys.argv.index('--drive')+1]) if '--drive' in sys.argv else 0
+POLL_S = 2 # between get_state reads while the stored state has not moved
+if SHARED and not N_DRIVE and not REMOTE:
+	sys.exit('> --shared runs the contract in this process, where nothing else advances it: add --drive N.')
+
+# `--record FILE` saves every state animated to a trajectory file (see trajectory_file.py); `--replay FILE`
+# animates one instead of calling StarkNet, from simulated time `--seek T` (seconds) if given
+RECORD_PATH = sys.argv[sys.argv.index('--record')+1] if '--record' in sys.argv else None
+REPLAY_PATH = sys.argv[sys.argv.index('--replay')+1] if '--replay' in sys.argv else None
+SEEK_S = float(sys.argv[sys.argv.index('--seek')+1]) if '--seek' in sys.argv else None
+
+# frames are drawn at up to FRAME_RATE, interpolated between states from their positions and velocities (cubic
+# Hermite, interpolation.py), and playback takes PLAYBACK_S of wall time per simulated second whatever the step
+# and however long frames take (frame_scheduler.py; late frames are skipped): `--speed X` plays X times faster,
+# from 0.25 to 16, changed while running with the up and down arrows. `--dt DT`
+# (simulated seconds, 0.02 by default) can be several times coarser, for as many fewer contract calls
+FRAME_RATE = 60 # refresh rate of most displays
+PLAYBACK_S = 2.5 # 0.05 s per 0.02 of simulated time
+DT = float(sys.argv[sys.argv.index('--dt')+1]) if '--dt' in sys.argv else 0.02
+SPEED = float(sys.argv[sys.argv.index('--speed')+1]) if '--speed' in sys.argv else 1
 
 pygame.init()
 screen = pygame.display.set_mode( (WIDTH, HEIGHT) )
 pygame.display.set_caption( 'SHO' )
-screen.fill( BG_COLOR )
+
+background = pygame.Surface( (WIDTH, HEIGHT) )
+background.fill( BG_COLOR )
+background.fill( (255,255,255), (0, HEIGHT-100, WIDTH, 100) ) # text box
+renderer = SceneRenderer(screen, background)
 
 AMPLITUDE = 100
 SCALE_X = (WIDTH/2.-BALL_RADIUS*2)/100
@@ -84,57 +131,141 @@ x = AMPLITUDE
 xd = 0 # stationary at start
 
 t_fp  = int( 0 * SCALE_FP )
-dt_fp = int( 0.02 * SCALE_FP )
+dt_fp = int( DT * SCALE_FP )
 x_fp  = int( x * SCALE_FP )
 xd_fp = int( xd * SCALE_FP )
 
+if REPLAY_PATH:
+	client = None # a replay calls no contract
+elif not REMOTE:
+	from local_client import LocalClient # cairo-lang is only imported in local mode
+	client = LocalClient(COMPILED_PATH, 'sho_contract_abi.json', metrics=metrics, constructor_inputs=[t_fp, dt_fp, x_fp, xd_fp])
+elif CONTRACT_ADDRESS is None:
+	# deployed with this viewer's initial state as the constructor calldata: t, dt and the state of --shared
+	sys.exit(
+		'> The regenerated sho contract has no deployment yet: run without --remote, or deploy it with\n'
+		f'  starknet deploy --contract ../sho_compiled.json --inputs {" ".join(map(str, to_felts([t_fp, dt_fp, x_fp, xd_fp])))}\n'
+		'  and set CONTRACT_ADDRESS.'
+	)
+else:
+	client = StarkNetClient(CONTRACT_ADDRESS, 'sho_contract_abi.json', metrics=metrics)
+
 update_figures(ball_x = BALL_X_OFFSET + x*SCALE_X)
 update_message(MESSAGE)
 
+# retrieve coordinates from contract in the background, N per call
+def fetch_batch (state, n):
+	t_fp, x_fp, xd_fp = state
+	ret = client.call(N_STEPS_FUNCTION, [t_fp, dt_fp, x_fp, xd_fp, n])
+	log.log(f'> {n} coordinates retrieved from StarkNet {INTEGRATOR} integrator.', key='fetch')
+
+	t_fp_s = [t_fp + (i+1)*dt_fp for i in range(n)]
+	return list(zip(t_fp_s, ret.traj[0::2], ret.traj[1::2]))
+
+# same with n accepted adaptive steps per call, each row of traj being (t_fp, x_fp, xd_fp)
+adaptive_dt_fp = dt_fp # the contract suggests the next dt after every call
+def fetch_batch_adaptive (state, n):
+	global adaptive_dt_fp
+	t_fp, x_fp, xd_fp = state
+	ret = client.call('query_n_adaptive', [t_fp, adaptive_dt_fp, x_fp, xd_fp, ADAPTIVE_TOL_FP, n])
+	log.log(f'> {n} coordinates retrieved from StarkNet adaptive integrator ({ret.n_rejected} steps rejected).', key='fetch')
+
+	adaptive_dt_fp = ret.dt_nxt
+	return [tuple(ret.traj[i:i+3]) for i in range(0, len(ret.traj), 3)]
+
+# the next stored state once it differs from `state`; n is ignored, the contract decides how far it moved
+def fetch_batch_shared (state, n):
+	if N_DRIVE:
+		log.log(f'> Sending advance({N_DRIVE}) to StarkNet.', key='advance')
+		client.invoke('advance', [N_DRIVE])
+	while True:
+		t_fp, _, x_fp, xd_fp = client.call('get_state', [])
+		if t_fp != state[0]:
+			return [(t_fp, x_fp, xd_fp)]
+		time.sleep(POLL_S)
+
+# the n recorded states after the current one; none at the end of the recording
+replay_index = 0
+def fetch_batch_replay (state, n):
+	global replay_index
+	states = replay[replay_index+1 : replay_index+1+n].tolist()
+	replay_index += len(states)
+	return [tuple(s) for s in states]
+
+N = 100
+if REPLAY_PATH:
+	replay = TrajectoryReader(REPLAY_PATH)
+	if replay.fields != ['t', 'x', 'xd']:
+		sys.exit(f'> {REPLAY_PATH} holds ({", ".join(replay.fields)}) states, not sho ones.')
+	SCALE_FP = replay.scale
+	dt_fp = replay.dt_fp or dt_fp # recorded adaptive and shared runs have no fixed dt
+	if SEEK_S is not None:
+		replay_index = replay.index_at(int(SEEK_S * SCALE_FP)) # O(1) through the checkpoint index
+	t_fp, x_fp, xd_fp = replay[replay_index]
+	fetcher = TrajectoryFetcher(fetch_batch_replay, (t_fp, x_fp, xd_fp), batch_size=N, metrics=metrics, scale=SCALE_FP)
+	print(f'> Replaying {len(replay)} recorded states of {REPLAY_PATH} from t_fp={t_fp}.')
+elif SHARED:
+	# start from the stored state, with the dt the contract was deployed with
+	t_fp, dt_fp, x_fp, xd_fp = client.call('get_state', [])
+	fetcher = TrajectoryFetcher(fetch_batch_shared, (t_fp, x_fp, xd_fp), batch_size=1, metrics=metrics, scale=SCALE_FP)
+elif ADAPTIVE_TOL_FP is None:
+	fetcher = TrajectoryFetcher(fetch_batch, (t_fp, x_fp, xd_fp), batch_size=N, metrics=metrics, scale=SCALE_FP)
+else:
+	fetcher = TrajectoryFetcher(fetch_batch_adaptive, (t_fp, x_fp, xd_fp), batch_size=N, metrics=metrics, scale=SCALE_FP)
+fetcher.start()
+
+# once the fixed-point orbit provably repeats, stop calling the contract and loop over the cycle
+source = CyclicSource(fetcher, dt_fp, scale=SCALE_FP) if ADAPTIVE_TOL_FP is None and not SHARED and not REPLAY_PATH else fetcher
+
+recorder = None
+if RECORD_PATH:
+	# a fixed dt only when every step is recorded, so that seeking by time is a division
+	fixed_dt = replay.dt_fp is not None if REPLAY_PATH else ADAPTIVE_TOL_FP is None and not SHARED
+	function = replay.header['function'] if REPLAY_PATH else 'get_state' if SHARED else 'query_n_adaptive' if ADAPTIVE_TOL_FP is not None else N_STEPS_FUNCTION
+	recorder = TrajectoryWriter(RECORD_PATH, {'name' : 'sho', 'address' : CONTRACT_ADDRESS}, SCALE_FP, dt_fp if fixed_dt else None,
+		(t_fp, x_fp, xd_fp), fields=['t', 'x', 'xd'], function=function)
+
+interpolator = HermiteInterpolator(positions=[1], velocities=[2])
+interpolator.push(np.array([t_fp, x_fp, xd_fp]) / SCALE_FP)
+
+# animate the states as they arrive: each frame shows the simulated time the scheduler maps the wall time to
+scheduler = FrameScheduler(PLAYBACK_S, FRAME_RATE, speed=SPEED, metrics=metrics)
+scheduler.start(interpolator.t1)
 while True:
-	# retrieve N sample from contract
-	N = 100
-	print(f'> Begin retrieval of {N} coordinates from StarkNet rk4 integrator.')
-
-	x_fp_s = [x_fp]
-	xd_fp_s = [xd_fp]
-	for i in range(N):
-
-		# sending side must mod P to send only positive felt values; receiving side could receive negative value
-		x_fp = x_fp if x_fp>=0 else x_fp+PRIME
-		xd_fp = xd_fp if xd_fp>=0 else xd_fp+PRIME
-
-		cmd = f"starknet call --network=alpha --address {CONTRACT_ADDRESS} --abi sho_contract_abi.json " + \
-			f"--function query_next_given_coordinates --inputs {t_fp} {dt_fp} {x_fp} {xd_fp}"
-		cmd = cmd.split(' ')
-		result = subprocess_run(cmd)
-
-		result = result.split(' ')
-		x_fp = int(result[0])
-		xd_fp = int(result[1])
-		t_fp += dt_fp
-
-		x_fp_s.append( x_fp )
-		xd_fp_s.append( xd_fp )
-		print(f'> {i+1}th/{N} coordinate retrieved from StarkNet rk4 integrator.')
-	print()
-
-	x_s = [x_fp/SCALE_FP for x_fp in x_fp_s]
-	print('> printing all retrieved coordinates: {x_s}\n')
-
-	# saving the last coordinate for next loop
-	x_fp = x_fp_s[-1]
-	xd_fp = xd_fp_s[-1]
-
-	# render animation from retrieved coordinates
-	print('>>> Begin animation rendering.')
-	for i in range(N):
-		update_figures(ball_x = BALL_X_OFFSET + x_s[i]*SCALE_X)
-		update_message(MESSAGE)
-		time.sleep(0.05)
-
-	# check for quit() event
+	# check for quit() event; the up and down arrows change the playback speed
 	for event in pygame.event.get():
 		if event.type == pygame.QUIT:
+			fetcher.stop()
+			if recorder is not None:
+				recorder.close()
+				print(f'> {recorder.n_states} states recorded to {RECORD_PATH}.')
+			if source is not fetcher:
+				print(f'> {source.report()}')
+			print(f'> {scheduler.report()}')
+			print(f'> {summary(metrics.close())}')
 			sys.exit()
+		elif event.type == pygame.KEYDOWN and event.key in (pygame.K_UP, pygame.K_DOWN):
+			speed = scheduler.faster() if event.key == pygame.K_UP else scheduler.slower()
+			print(f'> Playing at {speed:g}x.')
+
+	t = scheduler.frame()
+	metrics.set_gauge('queue_depth', fetcher.queue_depth())
+	metrics.tick()
+
+	# take in the states up to t; every one is recorded, however many a frame passes over
+	while interpolator.t1 < t:
+		state = source.get(timeout=0)
+		if state is None:
+			scheduler.hold(interpolator.t1) # still waiting for StarkNet: simulated time waits too
+			break
+		if source is not fetcher and source.cycle_proven:
+			print(f'> Cycle of {source.detector.period} steps proven at t_fp={state[0]}; playing it from memory ({source.detector.nbytes} bytes).')
+		t_fp, x_fp, xd_fp = state
+		if recorder is not None:
+			recorder.append(state)
+		interpolator.push(state.real) # float view of the ring, no conversion per state
 
+	(x,) = interpolator.at(t)
+	with metrics.time('render'):
+		update_figures(ball_x = BALL_X_OFFSET + x*SCALE_X)
+	metrics.count('frames')
@@ -1,81 +1,143 @@
+import os, sys
+import asyncio
 import pytest
-from starkware.starknet.testing.starknet import Starknet
-from timeit import default_timer as timer
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../common'))
+from contract_harness import deploy, record, view
+from fp_emulator import integrate, integrate_adaptive, to_flat_traj
+from felt_codec import from_felts, to_felts
+
+SCALE_FP = 10000 # consistent with SCALE_FP in the contract
+
+# set constants for the experiment
+x_0 = 100.
+xd_0 = 0.
+t_0 = 0.
+dt = 0.01
+T = 2
+
+t_0_fp  = int(t_0 * SCALE_FP)
+dt_fp   = int(dt * SCALE_FP)
+x_0_fp  = int(x_0 * SCALE_FP)
+xd_0_fp = int(xd_0 * SCALE_FP)
+N = int(T//dt)
+CAIRO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sho.cairo')
+
+
+@pytest.fixture(scope='module')
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope='module')
+async def contract():
+    # deployed once for the whole module; the constructor sets the shared trajectory
+    # (t, dt and the state kept in storage) the contract starts from
+    return await deploy(CAIRO_PATH, constructor_calldata=[t_0_fp, dt_fp, x_0_fp, xd_0_fp])
+
+
+@pytest.mark.asyncio
+async def test_rk4_trajectory(contract):
+    ret = await view(contract.query_n_steps(
+        t  = t_0_fp,
+        dt = dt_fp,
+        x  = x_0_fp,
+        xd = xd_0_fp,
+        n  = N
+    ))
+    traj = ret.result.traj
+    assert len(traj) == N*2
+    print(f'{N} coordinates retrieved in one call.')
+
+    x_fp_history = [x_0_fp] + traj[0::2]
+    xd_fp_history = [xd_0_fp] + traj[1::2]
+
+    # the first few steps must agree with single-step queries
+    rets = await asyncio.gather(*[
+        view(contract.query_next_given_coordinates(
+            t  = t_0_fp + i*dt_fp,
+            dt = dt_fp,
+            x  = x_fp_history[i],
+            xd = xd_fp_history[i]
+        )) for i in range(3)
+    ])
+    for i, ret in enumerate(rets):
+        nxt = ret.result
+        assert (nxt.x_nxt, nxt.xd_nxt) == (x_fp_history[i+1], xd_fp_history[i+1])
+
+    # the contract must agree bit for bit with the fixed-point emulator
+    emulated = integrate('sho', dt_fp, [x_0_fp, xd_0_fp], N)
+    for i, history in enumerate([x_fp_history, xd_fp_history]):
+        assert from_felts(history).tolist() == emulated[:, i, 0].tolist()
+
+    # RK4_RECORD_DIR=... keeps the trajectory as a .rk4t file (see contract_harness.record)
+    t_fp_history = [t_0_fp + i*dt_fp for i in range(N+1)]
+    states = list(zip(t_fp_history, *[from_felts(h).tolist() for h in [x_fp_history, xd_fp_history]]))
+    record('sho_rk4', CAIRO_PATH, SCALE_FP, dt_fp, states, fields=['t', 'x', 'xd'])
+
 
 @pytest.mark.asyncio
-async def test_dict():
-    starknet = await Starknet.empty()
-    print()
-
-    contract = await starknet.deploy("sho.cairo")
-
-    ## note: if passing negative numbers to cairo function => must mod P in python first;
-    ##       also, the return value from cairo has been mod P, so must detect neg value specifically
-    PRIME = 3618502788666131213697322783095070105623107215331596699973092056135872020481
-    PRIME_HALF = PRIME//2
-    SCALE_FP = 10000 # consistent with SCALE_FP in the contract
-
-    # set constants for the experiment
-    x_0 = 100.
-    xd_0 = 0.
-    t_0 = 0.
-    dt = 0.01
-    T = 2
-
-    t_0_fp  = int(t_0 * SCALE_FP)
-    dt_fp   = int(dt * SCALE_FP)
-    x_0_fp  = int(x_0 * SCALE_FP)
-    xd_0_fp = int(xd_0 * SCALE_FP)
-    #await contract.set_coordinate(x=x_0_fp, xd=xd_0_fp).invoke()
-
-    # run rk4 integration continuously
-    t_fp = t_0_fp
-    x_fp = x_0_fp
-    xd_fp = xd_0_fp
-    print(f'starting x: {x_fp}')
-    print(f'starting xd: {xd_fp}')
-
-    x_fp_history = [x_fp]
-    xd_fp_history = [xd_fp]
-
-    N = int(T//dt)
-    for i in range(N):
-        ret = await contract.query_next_given_coordinates(
-            t  = t_fp,
+async def test_symplectic_integrators(contract):
+    # so must the symplectic integrators generated next to rk4
+    methods = ['verlet', 'yoshida4']
+    rets = await asyncio.gather(*[
+        view(getattr(contract, f'query_n_steps_{method}')(
+            t  = t_0_fp,
             dt = dt_fp,
-            x  = x_fp,
-            xd = xd_fp
-        ).call()
-        x_fp = ret.x_nxt
-        xd_fp = ret.xd_nxt
-        x_fp_history.append(x_fp)
-        xd_fp_history.append(xd_fp)
-        print(f'{i+1}th/{N} retrieved.')
-
-    ## handling negative numbers returned by Cairo function (current testing framework does not handle this)
-    x_fp_history = [x if x < PRIME_HALF else x-PRIME for x in x_fp_history]
-    xd_fp_history = [xd if xd < PRIME_HALF else xd-PRIME for xd in xd_fp_history]
-
-    print('x_fp_history:')
-    print(x_fp_history)
-
-    print('xd_fp_history:')
-    print(xd_fp_history)
-
-    # test utility functions for fixed-point arithmetic (they must be @view for testing purposes)
-    '''
-    a = int( 1.5 * SCALE_FP )
-    b = int( 1.7 * SCALE_FP )
-    ret = await contract.mul_fp(a,b).call()
-    print(f'mul_fp({a},{b}) returns {ret.c}')
-
-    a = int( 5.0 * SCALE_FP )
-    b = int( 2.0 * SCALE_FP )
-    ret = await contract.div_fp(a,b).call()
-    print(f'div_fp({a},{b}) returns {ret.c}')
-    '''
-
-    # run rk4 integration
-    #for i in range(1):
-    #    ret = await contract.query_next(dt=1).invoke()
-    #    print(f'x={ret.x_nxt}, xd={ret.xd_nxt}')
+            x  = x_0_fp,
+            xd = xd_0_fp,
+            n  = N
+        )) for method in methods
+    ])
+    for method, ret in zip(methods, rets):
+        emulated = integrate('sho', dt_fp, [x_0_fp, xd_0_fp], N, method=method)
+        assert from_felts(ret.result.traj).tolist() == to_flat_traj(emulated)
+        print(f'{method}: {N} states match the emulator.')
+
+
+@pytest.mark.asyncio
+async def test_adaptive(contract):
+    # the adaptive (Dormand-Prince 5(4)) step covers the same T in far fewer steps; each call takes a batch
+    # of accepted steps and the next one goes on from the last returned state with the suggested dt
+    tol_fp = 10 # largest local error estimate accepted per step, fixed-point
+    n_batch = 10
+    state = (t_0_fp, x_0_fp, xd_0_fp)
+    adaptive_dt_fp = dt_fp
+    adaptive_history = []
+    n_calls = 0
+    while state[0] < T * SCALE_FP:
+        x_felt, xd_felt = to_felts(state[1:])
+        ret = await view(contract.query_n_adaptive(
+            t   = state[0],
+            dt  = adaptive_dt_fp,
+            x   = x_felt,
+            xd  = xd_felt,
+            tol = tol_fp,
+            n   = n_batch
+        ))
+        n_calls += 1
+        traj = from_felts(ret.result.traj).tolist()
+        adaptive_history += [tuple(traj[i:i+3]) for i in range(0, len(traj), 3)]
+        state = adaptive_history[-1]
+        adaptive_dt_fp = ret.result.dt_nxt
+    print(f'{len(adaptive_history)} adaptive steps in {n_calls} calls cover t={T} (rk4: {N} steps), final dt_fp={adaptive_dt_fp}')
+    assert len(adaptive_history) < N
+
+    emulated, _, _ = integrate_adaptive('sho', dt_fp, [x_0_fp, xd_0_fp], tol_fp, len(adaptive_history))
+    assert adaptive_history == emulated
+
+
+@pytest.mark.asyncio
+async def test_stored_trajectory(contract):
+    # the stored trajectory moves forward in place with advance(n) transactions and is read back in one cheap
+    # get_state() call; after N steps in uneven chunks it must sit on the last state of query_n_steps
+    for n in [1, N//4, N - N//4 - 1]:
+        ret = await contract.advance(n).invoke()
+        print(f'advance({n}): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    ret = await view(contract.get_state())
+    print(f'get_state(): {ret.call_info.cairo_usage.n_steps} Cairo steps')
+    assert (ret.result.t, ret.result.dt) == (t_0_fp + N*dt_fp, dt_fp)
+    emulated = integrate('sho', dt_fp, [x_0_fp, xd_0_fp], N)
+    assert from_felts([ret.result.x, ret.result.xd]).tolist() == emulated[-1, :, 0].tolist()